@@ -0,0 +1,74 @@
+"""
+Query performance analytics endpoints.
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from auth.dependencies import require_admin_scope
+from core.config import settings
+from core.database import get_async_engine
+from services.query_rollups import RollupGroup, RollupOrder, query_rollups
+
+router = APIRouter(dependencies=[Depends(require_admin_scope)])
+
+
+def _utc(value: Optional[datetime], default: datetime) -> datetime:
+    """Naive UTC, the form query history timestamps are stored in."""
+    if value is None:
+        return default
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+@router.get("/queries")
+async def query_performance(
+    since: Optional[datetime] = Query(
+        default=None, description="Defaults to one hour before until"
+    ),
+    until: Optional[datetime] = Query(default=None, description="Defaults to now"),
+    group_by: RollupGroup = RollupGroup.FINGERPRINT,
+    order_by: RollupOrder = RollupOrder.P95,
+    client_id: Optional[str] = Query(default=None, max_length=100),
+    fingerprint: Optional[str] = Query(default=None, max_length=32),
+    limit: int = Query(default=20, ge=1, le=1000),
+    engine: AsyncEngine = Depends(get_async_engine),
+) -> Dict[str, Any]:
+    """Counts, errors and latency percentiles from the query rollups."""
+    if not settings.rollup_enabled:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Query rollups are disabled",
+        )
+    until = _utc(until, datetime.utcnow())
+    since = _utc(since, until - timedelta(hours=1))
+    if since >= until:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="since must be before until",
+        )
+
+    async with engine.connect() as conn:
+        try:
+            groups = await query_rollups.report(
+                conn,
+                since,
+                until,
+                group_by,
+                order_by,
+                client_id=client_id,
+                fingerprint=fingerprint,
+                limit=limit,
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return {
+        "since": query_rollups.bucket_start(since).isoformat(),
+        "until": until.isoformat(),
+        "bucket_seconds": query_rollups.bucket_seconds,
+        "group_by": group_by.value,
+        "groups": groups,
+    }
@@ -0,0 +1,139 @@
+"""
+Table-level data endpoints.
+"""
+from typing import Any, Dict, List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlmodel import SQLModel
+from starlette.requests import ClientDisconnect
+
+from auth.dependencies import has_scopes, rate_limit_check, require_write_scope
+from core.admission import admission
+from core.config import settings
+from core.database import get_async_engine
+from models.api_key import ApiKey
+from services.bulk_ingest import (
+    DuplicatePolicy,
+    IngestError,
+    IngestFormat,
+    TableNotFoundError,
+    ingest,
+    ingest_target,
+    record_iterator,
+)
+from services.result_cache import query_result_cache
+
+router = APIRouter(dependencies=[Depends(rate_limit_check)])
+
+_CONTENT_TYPES = {
+    "application/x-ndjson": IngestFormat.NDJSON,
+    "application/jsonl": IngestFormat.NDJSON,
+    "text/csv": IngestFormat.CSV,
+}
+
+
+def _body_format(request: Request, requested: Optional[IngestFormat]) -> IngestFormat:
+    if requested is not None:
+        return requested
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    try:
+        return _CONTENT_TYPES[content_type.lower()]
+    except KeyError:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="Send application/x-ndjson or text/csv, or pass ?format=",
+        )
+
+
+@router.post("/{table}/bulk")
+async def bulk_ingest(
+    table: str,
+    request: Request,
+    format: Optional[IngestFormat] = Query(
+        default=None, description="Defaults from Content-Type"
+    ),
+    batch_size: Optional[int] = Query(default=None, ge=1, le=100000),
+    on_duplicate: DuplicatePolicy = DuplicatePolicy.ERROR,
+    resume_from: int = Query(
+        default=0,
+        ge=0,
+        description="committed_rows of a failed attempt; that many rows are skipped",
+    ),
+    api_key: ApiKey = Depends(require_write_scope),
+    engine: AsyncEngine = Depends(get_async_engine),
+) -> Dict[str, Any]:
+    """Insert a streamed NDJSON or CSV body into a table in batches.
+
+    The body is parsed as it arrives and every ``batch_size`` rows are
+    validated against the table's columns and committed as one multi-row
+    INSERT. If a batch fails, the batches before it stay committed and the
+    error reports ``resume_from`` for sending the same body again. Cached
+    reads of the table are invalidated as batches commit. The ingest holds
+    one of the client's admission slots throughout.
+    """
+    body_format = _body_format(request, format)
+    # The connector's own tables hold credentials and audit records
+    if table in SQLModel.metadata.tables and not has_scopes(api_key, ["admin"]):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Insufficient permissions. Required scopes: ['admin']",
+        )
+    async with admission.admit(api_key.client_id):
+        try:
+            target = await ingest_target(engine, table)
+        except TableNotFoundError as e:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+
+        batches: List[Dict[str, Any]] = []
+        committed = resume_from
+        records = record_iterator(
+            body_format, request.stream(), settings.ingest_max_record_bytes
+        )
+        try:
+            async for batch in ingest(
+                engine,
+                target,
+                records,
+                batch_size or settings.ingest_batch_size,
+                on_duplicate,
+                resume_from,
+            ):
+                batches.append(batch._asdict())
+                committed = batch.committed_rows
+                await query_result_cache.invalidate_tables([table])
+        except ClientDisconnect:
+            # Nobody is left to read a response; committed batches stay
+            if committed > resume_from:
+                await query_result_cache.invalidate_tables([table])
+            return {
+                "table": table,
+                "status": "disconnected",
+                "committed_rows": committed,
+            }
+        except (IngestError, SQLAlchemyError) as e:
+            if committed > resume_from:
+                await query_result_cache.invalidate_tables([table])
+            if isinstance(e, IntegrityError):
+                code = status.HTTP_409_CONFLICT
+            elif isinstance(e, IngestError):
+                code = status.HTTP_422_UNPROCESSABLE_ENTITY
+            else:
+                code = status.HTTP_400_BAD_REQUEST
+            error = str(getattr(e, "orig", None) or e)
+            raise HTTPException(
+                status_code=code,
+                detail={
+                    "error": error,
+                    "committed_rows": committed,
+                    "resume_from": committed,
+                    "batches": batches,
+                },
+            )
+    return {
+        "table": table,
+        "status": "committed",
+        "committed_rows": committed,
+        "batches": batches,
+    }
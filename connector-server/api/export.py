@@ -0,0 +1,143 @@
+"""
+Data export endpoints.
+"""
+from typing import Any, AsyncIterator, Dict, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+from sqlalchemy.ext.asyncio import AsyncEngine
+from starlette.background import BackgroundTask
+
+from auth.dependencies import get_api_key, rate_limit_check, require_read_scope
+from core.admission import Ticket, admission
+from core.config import settings
+from core.database import get_async_engine
+from models.api_key import ApiKey
+from services.import_export import (
+    ExportError,
+    ExportFormat,
+    KeysetSource,
+    TableNotFoundError,
+    get_encoder,
+    open_export,
+    query_source,
+    table_source,
+)
+
+router = APIRouter(
+    dependencies=[Depends(require_read_scope), Depends(rate_limit_check)]
+)
+
+
+class ExportQueryRequest(BaseModel):
+    """Query export request."""
+
+    sql: str = Field(min_length=1)
+    params: Dict[str, Any] = Field(default_factory=dict)
+    key: str = Field(min_length=1, description="Unique, ordered column to page on")
+    format: ExportFormat = ExportFormat.NDJSON
+    after: Optional[Any] = Field(
+        default=None, description="Last key received, to resume an export"
+    )
+    chunk_size: Optional[int] = Field(default=None, ge=1, le=100000)
+
+
+async def _releasing(
+    body: AsyncIterator[bytes], ticket: Ticket
+) -> AsyncIterator[bytes]:
+    """Yield ``body`` and release ``ticket`` however the stream ends.
+
+    Starlette skips a response's background task when the body raises, so
+    a page failing mid-export would otherwise keep the admission slot.
+    """
+    try:
+        async for chunk in body:
+            yield chunk
+    finally:
+        ticket.release()
+
+
+async def _export_response(
+    engine: AsyncEngine,
+    source: KeysetSource,
+    export_format: ExportFormat,
+    after: Any,
+    chunk_size: Optional[int],
+    ticket: Ticket,
+) -> StreamingResponse:
+    """Build the streaming response for an export.
+
+    The admission ticket is released once the body has been sent or has
+    failed; the background task only covers a body that never started.
+    """
+    try:
+        encoder = get_encoder(
+            export_format, resume=after is not None, column_types=source.column_types
+        )
+        body = await open_export(
+            engine, source, encoder, after, chunk_size or settings.export_chunk_size
+        )
+    except ExportError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    return StreamingResponse(
+        _releasing(body, ticket),
+        media_type=encoder.media_type,
+        headers={
+            "Content-Disposition": (
+                f'attachment; filename="{source.name}.{encoder.extension}"'
+            ),
+            # Clients resume an interrupted export with ?after=<last key value>
+            "X-Export-Key": source.key,
+        },
+        background=BackgroundTask(ticket.release),
+    )
+
+
+@router.get("/{table}")
+async def export_table(
+    table: str,
+    format: ExportFormat = ExportFormat.NDJSON,
+    key: Optional[str] = Query(default=None, description="Defaults to the primary key"),
+    after: Optional[str] = Query(default=None, description="Resume after this key"),
+    columns: Optional[str] = Query(default=None, description="Comma-separated"),
+    chunk_size: Optional[int] = Query(default=None, ge=1, le=100000),
+    api_key: ApiKey = Depends(get_api_key),
+    engine: AsyncEngine = Depends(get_async_engine),
+) -> StreamingResponse:
+    """Export a table in key order."""
+    column_list = [name.strip() for name in columns.split(",")] if columns else None
+    ticket = await admission.acquire(api_key.client_id)
+    try:
+        try:
+            source = await table_source(engine, table, key, column_list)
+        except TableNotFoundError as e:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+        except ExportError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        return await _export_response(engine, source, format, after, chunk_size, ticket)
+    except BaseException:
+        ticket.release()
+        raise
+
+
+@router.post("")
+async def export_query(
+    request: ExportQueryRequest,
+    api_key: ApiKey = Depends(get_api_key),
+    engine: AsyncEngine = Depends(get_async_engine),
+) -> StreamingResponse:
+    """Export the result of a read query in key order."""
+    try:
+        source = query_source(request.sql, request.key, request.params)
+    except ExportError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    ticket = await admission.acquire(api_key.client_id)
+    try:
+        return await _export_response(
+            engine, source, request.format, request.after, request.chunk_size, ticket
+        )
+    except BaseException:
+        ticket.release()
+        raise
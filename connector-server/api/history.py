@@ -0,0 +1,52 @@
+"""
+Query history listing endpoint.
+"""
+from typing import Any, Dict, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from auth.dependencies import has_scopes, require_read_scope
+from core.database import get_async_db
+from models.api_key import ApiKey
+from models.query_history import QueryHistoryRead
+from services.audit_logger import get_query_history
+from utils.pagination import CursorError
+
+router = APIRouter()
+
+
+@router.get("")
+async def list_query_history(
+    cursor: Optional[str] = Query(
+        default=None, description="next_cursor of the previous page"
+    ),
+    limit: int = Query(default=100, ge=1, le=1000),
+    client_id: Optional[str] = Query(
+        default=None,
+        max_length=100,
+        description="Defaults to the caller's client; other clients need admin",
+    ),
+    user_id: Optional[str] = Query(default=None, max_length=100),
+    api_key: ApiKey = Depends(require_read_scope),
+    db: AsyncSession = Depends(get_async_db),
+) -> Dict[str, Any]:
+    """Executed queries, newest first, one cursor-linked page at a time."""
+    if not has_scopes(api_key, ["admin"]):
+        if client_id not in (None, api_key.client_id):
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Insufficient permissions. Required scopes: ['admin']",
+            )
+        client_id = api_key.client_id
+
+    try:
+        page = await get_query_history(
+            db, client_id=client_id, user_id=user_id, cursor=cursor, limit=limit
+        )
+    except CursorError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return {
+        "items": [QueryHistoryRead.model_validate(item) for item in page.items],
+        "next_cursor": page.next_cursor,
+    }
@@ -0,0 +1,343 @@
+"""
+Query execution endpoints.
+"""
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence
+
+import anyio
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, Field
+from starlette.background import BackgroundTask
+
+from auth.dependencies import (
+    check_statement_scope,
+    get_api_key,
+    rate_limit_check,
+    require_admin_scope,
+)
+from core.admission import admission
+from core.config import settings
+from core.database import get_db_router, get_engine_registry
+from core.engines import EngineRegistry, UnknownTargetError
+from core.routing import DatabaseRouter, Lease
+from core.timing import timed
+from models.api_key import ApiKey
+from models.query_history import QueryHistoryCreate, QueryStatus
+from services.audit_logger import query_history_writer
+from services.query_executor import (
+    Disconnected,
+    QueryError,
+    QueryTimeoutError,
+    execute_statement,
+    open_query_stream,
+)
+from services.result_cache import CacheLookup, query_result_cache
+from services.sql_analyzer import StatementType, analyze_sql
+from utils.formatters import ndjson_rows
+
+router = APIRouter()
+
+
+class QueryRequest(BaseModel):
+    """Query execution request."""
+
+    sql: str = Field(min_length=1)
+    params: Dict[str, Any] = Field(default_factory=dict)
+    connection_id: Optional[str] = Field(
+        default=None,
+        max_length=100,
+        description="Configured target database; defaults to the primary",
+    )
+    fetch_size: Optional[int] = Field(default=None, ge=1, le=100000)
+    cache: bool = Field(
+        default=True, description="Set to false to bypass the result cache"
+    )
+    timeout_ms: Optional[int] = Field(
+        default=None,
+        ge=1,
+        le=86400000,
+        description="Execution budget; only lowers the API key's budget",
+    )
+
+
+def execution_budget(request: QueryRequest, api_key: ApiKey) -> Optional[float]:
+    """Seconds a statement may run: the tighter of the key's and the request's.
+
+    Keys without their own budget get ``query_max_execution_ms``; a budget
+    of 0 means unlimited.
+    """
+    limit = api_key.max_execution_ms
+    if limit is None:
+        limit = settings.query_max_execution_ms
+    budgets = [ms for ms in (limit, request.timeout_ms) if ms]
+    return min(budgets) / 1000 if budgets else None
+
+
+def client_disconnect(http_request: Request) -> Disconnected:
+    """Awaitable factory that completes when the client disconnects.
+
+    The JSON body has been read by then, so ``receive`` only has the
+    disconnect left to deliver.
+    """
+
+    async def wait() -> None:
+        while (await http_request.receive())["type"] != "http.disconnect":
+            pass
+
+    return wait
+
+
+def _query_error(e: QueryError) -> HTTPException:
+    if isinstance(e, QueryTimeoutError):
+        return HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail=str(e))
+    return HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+async def _cached_ndjson(
+    columns: List[str], rows: List[List[Any]], chunk_size: int
+) -> AsyncIterator[bytes]:
+    """Replay a cached result as NDJSON."""
+    for start in range(0, len(rows), chunk_size):
+        with timed("serialize"):
+            chunk = ndjson_rows(columns, rows[start : start + chunk_size])
+        yield chunk
+
+
+@router.post("", dependencies=[Depends(rate_limit_check)])
+async def run_query(
+    request: QueryRequest,
+    http_request: Request,
+    api_key: ApiKey = Depends(get_api_key),
+    db_router: DatabaseRouter = Depends(get_db_router),
+    engines: EngineRegistry = Depends(get_engine_registry),
+) -> Response:
+    """Execute a statement allowed by the API key's scopes.
+
+    Read queries stream rows back as NDJSON and may be served by a read
+    replica; other statements run in a transaction on the primary and
+    return the affected row count. With ``connection_id`` the statement
+    runs on that target instead, without the result cache. Statements are
+    cancelled on the server when they exceed the execution budget (504) or
+    the client disconnects. Database work waits for a fair-share admission
+    slot of the key's client (429 when the wait would be too long); cache
+    hits do not. Only results read from the primary are cached.
+    """
+    analysis = analyze_sql(request.sql)
+    check_statement_scope(analysis, api_key)
+    history = QueryHistoryCreate(
+        client_id=api_key.client_id,
+        connection_id=request.connection_id,
+        query=request.sql,
+        fingerprint=analysis.fingerprint,
+    )
+    budget = execution_budget(request, api_key)
+    disconnected = client_disconnect(http_request)
+    if analysis.statement_type != StatementType.READ:
+        async with admission.admit(api_key.client_id):
+            lease = await _acquire(request, analysis.statement_type, db_router, engines)
+            # Cached results only ever come from the primary database
+            tables = analysis.tables if request.connection_id is None else ()
+            try:
+                return await _run_statement(
+                    request,
+                    analysis.statement_type,
+                    tables,
+                    history,
+                    lease,
+                    budget,
+                    disconnected,
+                )
+            finally:
+                lease.release()
+
+    fetch_size = request.fetch_size or settings.query_fetch_size
+
+    lookup: Optional[CacheLookup] = None
+    if request.cache and settings.query_cache_enabled and request.connection_id is None:
+        lookup = await query_result_cache.get(request.sql, request.params)
+    if lookup is not None and lookup.columns is not None and lookup.rows is not None:
+        return StreamingResponse(
+            _cached_ndjson(lookup.columns, lookup.rows, fetch_size),
+            media_type="application/x-ndjson",
+            headers={"X-Query-Columns": ",".join(lookup.columns), "X-Cache": "HIT"},
+        )
+
+    ticket = await admission.acquire(api_key.client_id)
+    try:
+        lease = await _acquire(request, analysis.statement_type, db_router, engines)
+    except BaseException:
+        ticket.release()
+        raise
+    if lookup is not None and lease.backend is not db_router.primary:
+        # A replica may not have the writes that bumped the table versions
+        # yet (its lag is only known to the second); its rows must not be
+        # cached as current
+        lookup = None
+    try:
+        stream = await open_query_stream(
+            lease.engine,
+            request.sql,
+            request.params,
+            fetch_size,
+            buffer_rows=query_result_cache.max_rows if lookup else 0,
+            budget=budget,
+            disconnected=disconnected,
+        )
+    except QueryError as e:
+        lease.release()
+        ticket.release()
+        await query_history_writer.submit(
+            history.model_copy(
+                update={
+                    "status": QueryStatus.ERROR,
+                    "error_message": str(e),
+                }
+            )
+        )
+        raise _query_error(e)
+
+    finished = False
+
+    async def finish() -> None:
+        nonlocal finished
+        if finished:
+            return
+        finished = True
+        await stream.close()
+        lease.release()
+        ticket.release()
+        if lookup is not None and stream.completed and stream.buffered is not None:
+            await query_result_cache.set(lookup, stream.columns, stream.buffered)
+        await query_history_writer.submit(
+            history.model_copy(
+                update={
+                    "execution_time": stream.execution_time,
+                    "row_count": stream.row_count,
+                    "status": QueryStatus.ERROR
+                    if stream.error
+                    else QueryStatus.SUCCESS,
+                    "error_message": stream.error,
+                }
+            )
+        )
+
+    async def body() -> AsyncIterator[bytes]:
+        # Starlette skips the background task when the body raises, so the
+        # lease, ticket and history record are settled here however the
+        # stream ends, even when the response task is cancelled
+        try:
+            async for chunk in stream.iter_ndjson():
+                yield chunk
+        except Exception as e:
+            if stream.error is None:
+                stream.error = str(e)
+            raise
+        finally:
+            with anyio.CancelScope(shield=True):
+                await finish()
+
+    return StreamingResponse(
+        body(),
+        media_type="application/x-ndjson",
+        headers={
+            "X-Query-Columns": ",".join(stream.columns),
+            "X-Cache": "MISS" if lookup is not None else "BYPASS",
+        },
+        # Only for a client that disconnects before the body starts
+        background=BackgroundTask(finish),
+    )
+
+
+async def _acquire(
+    request: QueryRequest,
+    statement_type: StatementType,
+    db_router: DatabaseRouter,
+    engines: EngineRegistry,
+) -> Lease:
+    """Lease the requested target, or route across the primary and replicas."""
+    if request.connection_id is None:
+        return db_router.acquire(statement_type)
+    try:
+        return await engines.acquire(request.connection_id)
+    except UnknownTargetError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Unknown connection_id: {request.connection_id}",
+        )
+
+
+async def _run_statement(
+    request: QueryRequest,
+    statement_type: StatementType,
+    tables: Sequence[str],
+    history: QueryHistoryCreate,
+    lease: Lease,
+    budget: Optional[float] = None,
+    disconnected: Optional[Disconnected] = None,
+) -> JSONResponse:
+    """Execute a write/DDL statement and invalidate cached reads of its tables.
+
+    Admin statements may change session state, so their connection is
+    discarded rather than returned to the pool.
+    """
+    started = time.perf_counter()
+    try:
+        rows_affected = await execute_statement(
+            lease.engine,
+            request.sql,
+            request.params,
+            budget,
+            disconnected,
+            discard_connection=statement_type == StatementType.ADMIN,
+        )
+    except QueryError as e:
+        await query_history_writer.submit(
+            history.model_copy(
+                update={
+                    "execution_time": time.perf_counter() - started,
+                    "status": QueryStatus.ERROR,
+                    "error_message": str(e),
+                }
+            )
+        )
+        raise _query_error(e)
+
+    await query_result_cache.invalidate_tables(tables)
+    await query_history_writer.submit(
+        history.model_copy(
+            update={
+                "execution_time": time.perf_counter() - started,
+                "row_count": rows_affected,
+            }
+        )
+    )
+    return JSONResponse({"rows_affected": rows_affected})
+
+
+@router.get("/cache/stats", dependencies=[Depends(require_admin_scope)])
+async def cache_stats() -> Dict[str, Any]:
+    """Result cache hit/miss/eviction counters."""
+    return await query_result_cache.stats()
+
+
+@router.get("/replicas", dependencies=[Depends(require_admin_scope)])
+async def replica_stats(
+    db_router: DatabaseRouter = Depends(get_db_router),
+) -> List[Dict[str, Any]]:
+    """Outstanding requests and replication lag per database."""
+    return db_router.stats()
+
+
+@router.get("/admission", dependencies=[Depends(require_admin_scope)])
+async def admission_stats() -> Dict[str, Any]:
+    """Admission slots in use and requests waiting, per client."""
+    return admission.stats()
+
+
+@router.get("/connections", dependencies=[Depends(require_admin_scope)])
+async def connection_stats(
+    engines: EngineRegistry = Depends(get_engine_registry),
+) -> Dict[str, Any]:
+    """Open target engines and their pool usage."""
+    return engines.stats()
@@ -1,5 +1,6 @@
 from fastapi import APIRouter
 
+from api import analytics, database, export, history, query
 
 api_router = APIRouter()
 
@@ -9,9 +10,13 @@ async def health():
     """Health check endpoint"""
     return {"status": "healthy"}
 
+
+api_router.include_router(query.router, prefix="/query", tags=["query"])
+api_router.include_router(export.router, prefix="/export", tags=["export"])
+api_router.include_router(analytics.router, prefix="/analytics", tags=["analytics"])
+api_router.include_router(history.router, prefix="/history", tags=["history"])
+api_router.include_router(database.router, prefix="/database", tags=["database"])
+
 # TODO: Add other API endpoints
 # api_router.include_router(auth.router, prefix="/auth", tags=["authentication"])
-# api_router.include_router(database.router, prefix="/database", tags=["database"])
-# api_router.include_router(query.router, prefix="/query", tags=["query"])
-# api_router.include_router(export.router, prefix="/export", tags=["export"])
 # api_router.include_router(admin.router, prefix="/admin", tags=["admin"])
@@ -1,14 +1,70 @@
 """
 API key management functionality.
+
+Lookups are single ``select()`` statements on an ``AsyncSession``.
 """
 import hashlib
+import json
 from datetime import datetime, timedelta
-from typing import List, Optional
-
-from sqlalchemy.orm import Session
-
-
-from ..models.api_key import ApiKey
+from typing import List, NamedTuple, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlmodel import col
+
+from core.admission import Priority, admission
+from core.config import settings
+from core.redis import invalidation_bus
+from models.api_key import ApiKey
+from services.usage_tracker import last_used_buffer
+from utils.cache import TTLCache
+from utils.pagination import Page, keyset_page
+
+
+class CachedApiKey(NamedTuple):
+    """Snapshot of a verified API key held in the per-worker cache."""
+
+    id: Optional[int]
+    key_id: str
+    key_hash: str
+    client_id: str
+    scopes: str
+    created_at: Optional[datetime]
+    expires_at: Optional[datetime]
+    is_active: bool
+    rate_limit: int
+    max_execution_ms: Optional[int] = None
+
+    @classmethod
+    def from_model(cls, api_key: ApiKey) -> "CachedApiKey":
+        """Snapshot an ApiKey row."""
+        return cls(
+            api_key.id,
+            api_key.key_id,
+            api_key.key_hash,
+            api_key.client_id,
+            api_key.scopes,
+            api_key.created_at,
+            api_key.expires_at,
+            api_key.is_active,
+            api_key.rate_limit,
+            api_key.max_execution_ms,
+        )
+
+    def to_model(self) -> ApiKey:
+        """Build a detached ApiKey from the snapshot."""
+        return ApiKey(**self._asdict())
+
+    def is_expired(self) -> bool:
+        """Check expiry against the current time."""
+        return self.expires_at is not None and self.expires_at <= datetime.utcnow()
+
+
+# Keyed by key_hash; dropped on every worker when a key is revoked or updated
+api_key_cache: TTLCache[str, CachedApiKey] = TTLCache(
+    settings.api_key_cache_size, settings.api_key_cache_ttl_seconds
+)
+invalidation_bus.register("api_key", api_key_cache)
 
 
 def hash_api_key(api_key: str) -> str:
@@ -16,12 +72,13 @@ def hash_api_key(api_key: str) -> str:
     return hashlib.sha256(api_key.encode()).hexdigest()
 
 
-def create_api_key(
-    db: Session,
+async def create_api_key(
+    db: AsyncSession,
     client_id: str,
     scopes: Optional[List[str]] = None,
     expires_days: int = 365,
-    rate_limit: int = 1000
+    rate_limit: int = 1000,
+    max_execution_ms: Optional[int] = None,
 ) -> tuple[str, ApiKey]:
     """Create a new API key."""
     import secrets
@@ -29,7 +86,7 @@ def create_api_key(
 
     # Generate random API key
     alphabet = string.ascii_letters + string.digits
-    api_key = ''.join(secrets.choice(alphabet) for _ in range(32))
+    api_key = "".join(secrets.choice(alphabet) for _ in range(32))
 
     # Hash for storage
     key_hash = hash_api_key(api_key)
@@ -43,70 +100,100 @@ def create_api_key(
         key_id=key_id,
         key_hash=key_hash,
         client_id=client_id,
-        scopes=scopes or [],
+        scopes=json.dumps(scopes or []),
         expires_at=expires_at,
         rate_limit=rate_limit,
-        is_active=True
+        max_execution_ms=max_execution_ms,
+        is_active=True,
     )
 
     db.add(db_api_key)
-    db.commit()
-    db.refresh(db_api_key)
+    await db.commit()
 
     return api_key, db_api_key
 
 
-def verify_api_key(db: Session, api_key: str) -> Optional[ApiKey]:
-    """Verify an API key."""
+async def verify_api_key(db: AsyncSession, api_key: str) -> Optional[ApiKey]:
+    """Verify an API key, serving repeat lookups from the per-worker cache."""
     key_hash = hash_api_key(api_key)
-    api_key_obj = db.query(ApiKey).filter(
-        ApiKey.key_hash == key_hash,
-        ApiKey.is_active
-    ).first()
-
-    # Check expiration if key exists
-    if (api_key_obj and api_key_obj.expires_at and
-            api_key_obj.expires_at <= datetime.utcnow()):
+    cached = api_key_cache.get(key_hash)
+
+    if cached is None:
+        # Ahead of queued query work, so a busy pool cannot lock callers out
+        async with admission.admit("auth", Priority.CRITICAL):
+            api_key_obj = await db.scalar(
+                select(ApiKey).where(
+                    col(ApiKey.key_hash) == key_hash, col(ApiKey.is_active)
+                )
+            )
+        if api_key_obj is None:
+            return None
+        cached = CachedApiKey.from_model(api_key_obj)
+        api_key_cache.set(key_hash, cached)
+
+    # Expiry is checked on every hit, not only when the entry is loaded
+    if cached.is_expired():
         return None
 
-    if api_key_obj:
-        # Update last used
-        api_key_obj.last_used = datetime.utcnow()
-        db.commit()
+    # Written in bulk by the background flusher, off the request path
+    last_used_buffer.record(cached.key_id)
 
-    return api_key_obj
+    return cached.to_model()
 
 
-def get_api_keys(
-    db: Session,
+async def get_api_keys(
+    db: AsyncSession,
     client_id: Optional[str] = None,
-    skip: int = 0,
-    limit: int = 100
-) -> List[ApiKey]:
-    """Get list of API keys."""
-    query = db.query(ApiKey)
+    cursor: Optional[str] = None,
+    limit: int = 100,
+) -> Page:
+    """Get a page of API keys in id order, optionally for one client.
+
+    Cursors are bound to the ``client_id`` filter they were issued with.
+    """
+    stmt = select(ApiKey)
     if client_id:
-        query = query.filter(ApiKey.client_id == client_id)
-    return query.offset(skip).limit(limit).all()
+        stmt = stmt.where(col(ApiKey.client_id) == client_id)
+    return await keyset_page(
+        db, stmt, [ApiKey.id], f"api_keys:{client_id or ''}", cursor, limit
+    )
 
 
-def revoke_api_key(db: Session, key_id: str) -> bool:
+async def revoke_api_key(db: AsyncSession, key_id: str) -> bool:
     """Revoke an API key."""
-    api_key = db.query(ApiKey).filter(ApiKey.key_id == key_id).first()
+    api_key = await db.scalar(select(ApiKey).where(col(ApiKey.key_id) == key_id))
     if not api_key:
         return False
 
     api_key.is_active = False
-    db.commit()
+    await db.commit()
+    await invalidation_bus.ainvalidate("api_key", api_key.key_hash)
     return True
 
 
-def update_api_key_rate_limit(db: Session, key_id: str, rate_limit: int) -> bool:
+async def update_api_key_rate_limit(
+    db: AsyncSession, key_id: str, rate_limit: int
+) -> bool:
     """Update API key rate limit."""
-    api_key = db.query(ApiKey).filter(ApiKey.key_id == key_id).first()
+    api_key = await db.scalar(select(ApiKey).where(col(ApiKey.key_id) == key_id))
     if not api_key:
         return False
 
     api_key.rate_limit = rate_limit
-    db.commit()
+    await db.commit()
+    await invalidation_bus.ainvalidate("api_key", api_key.key_hash)
+    return True
+
+
+async def update_api_key_execution_budget(
+    db: AsyncSession, key_id: str, max_execution_ms: Optional[int]
+) -> bool:
+    """Update API key query execution budget; None restores the default."""
+    api_key = await db.scalar(select(ApiKey).where(col(ApiKey.key_id) == key_id))
+    if not api_key:
+        return False
+
+    api_key.max_execution_ms = max_execution_ms
+    await db.commit()
+    await invalidation_bus.ainvalidate("api_key", api_key.key_hash)
     return True
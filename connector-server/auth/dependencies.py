@@ -5,19 +5,27 @@ from typing import List
 
 from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import HTTPBearer
-from sqlalchemy.orm import Session
-
-from ..core.database import get_db
-from ..auth.api_keys import verify_api_key
-from ..models.api_key import ApiKey
-
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlmodel import SQLModel
+
+from auth.api_keys import verify_api_key
+from core.config import settings
+from core.database import get_async_db
+from core.redis import get_redis
+from core.timing import timed
+from models.api_key import ApiKey
+from services.sql_analyzer import SqlAnalysis
+from utils.rate_limiter import RateLimiter
 
 security = HTTPBearer(auto_error=False)
 
+rate_limiter = RateLimiter(
+    get_redis, redis_retry_seconds=settings.rate_limit_redis_retry_seconds
+)
+
 
 async def get_api_key(
-    request: Request,
-    db: Session = Depends(get_db)
+    request: Request, db: AsyncSession = Depends(get_async_db)
 ) -> ApiKey:
     """Extract and verify API key from request headers."""
     api_key_header = request.headers.get("X-API-Key")
@@ -29,7 +37,8 @@ async def get_api_key(
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-    api_key_obj = verify_api_key(db, api_key_header)
+    with timed("auth"):
+        api_key_obj = await verify_api_key(db, api_key_header)
     if not api_key_obj:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -40,12 +49,18 @@ async def get_api_key(
     return api_key_obj
 
 
+def has_scopes(api_key: ApiKey, required_scopes: List[str]) -> bool:
+    """Check if API key has all required scopes."""
+    granted = api_key.scopes_list
+    return all(scope in granted for scope in required_scopes)
+
+
 def check_scopes(required_scopes: List[str]):
     """Create a dependency to check if API key has required scopes."""
 
     def scope_checker(api_key: ApiKey = Depends(get_api_key)) -> ApiKey:
         """Check if API key has required scopes."""
-        if not all(scope in api_key.scopes for scope in required_scopes):
+        if not has_scopes(api_key, required_scopes):
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail=f"Insufficient permissions. Required scopes: {required_scopes}",
@@ -55,10 +70,58 @@ def check_scopes(required_scopes: List[str]):
     return scope_checker
 
 
-def rate_limit_check(api_key: ApiKey = Depends(get_api_key)):
+def check_statement_scope(analysis: SqlAnalysis, api_key: ApiKey) -> None:
+    """Check that API key may run an analyzed SQL statement.
+
+    Raises 400 for statements that are never allowed (multiple statements,
+    unknown verbs, unparseable input) and 403 when the statement type needs
+    a scope the key lacks. Any statement on the connector's own tables,
+    which hold credentials and audit records, needs the admin scope.
+    """
+    required = analysis.required_scope
+    if required is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=analysis.error
+            or (f"Statement type '{analysis.statement_type.value}' is not allowed"),
+        )
+    internal = SQLModel.metadata.tables
+    if any(name.rsplit(".", 1)[-1] in internal for name in analysis.tables):
+        required = "admin"
+    if not has_scopes(api_key, [required]):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail=(
+                f"Insufficient permissions for a {analysis.statement_type.value} "
+                f"statement. Required scopes: {[required]}"
+            ),
+        )
+
+
+def get_rate_limiter() -> RateLimiter:
+    """Get the shared rate limiter."""
+    return rate_limiter
+
+
+async def rate_limit_check(
+    request: Request,
+    api_key: ApiKey = Depends(get_api_key),
+    limiter: RateLimiter = Depends(get_rate_limiter),
+) -> ApiKey:
     """Check rate limit for API key."""
-    # This would typically integrate with Redis for rate limiting
-    # For now, just return the API key
+    result = await limiter.hit(
+        api_key.key_id,
+        api_key.rate_limit or settings.rate_limit_requests,
+        settings.rate_limit_window_seconds,
+    )
+    # Picked up by RateLimitHeadersMiddleware for every response type
+    request.state.rate_limit = result
+    if not result.allowed:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Rate limit exceeded",
+            headers=result.headers(),
+        )
     return api_key
 
 
@@ -1,25 +1,77 @@
 """
 JWT token handling utilities.
 """
+import hashlib
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import NamedTuple, Optional
 
 from fastapi import Depends, HTTPException, status
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from jose import jwt
-from sqlalchemy.orm import Session
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlmodel import col
 
-from ..core.config import settings
-from ..core.database import get_db
-from ..core.security import verify_token
-from ..models.user import User
+from core.config import settings
+from core.database import get_async_db
+from core.redis import invalidation_bus
+from core.security import TokenData, verify_token
+from core.timing import timed
+from models.user import User
+from utils.cache import TTLCache
 
 security = HTTPBearer()
 
 
+class Principal(NamedTuple):
+    """Snapshot of an authenticated user held in the per-worker cache."""
+
+    id: Optional[int]
+    username: str
+    is_active: bool
+    scopes: str
+
+    @classmethod
+    def from_model(cls, user: User) -> "Principal":
+        """Snapshot a User row."""
+        return cls(user.id, user.username, user.is_active, user.scopes)
+
+    def to_model(self) -> User:
+        """Build a detached User from the snapshot; it has no password hash."""
+        return User(hashed_password="", **self._asdict())
+
+
+# Keyed by a digest of the raw token; entries live until the token's exp.
+# Token claims never change, so these need no invalidation.
+token_cache: TTLCache[str, TokenData] = TTLCache(settings.token_cache_size, 3600)
+
+# Keyed by username; dropped on every worker when the user is updated
+principal_cache: TTLCache[str, Principal] = TTLCache(
+    settings.token_cache_size, settings.principal_cache_ttl_seconds
+)
+invalidation_bus.register("principal", principal_cache)
+
+
+def verify_token_cached(token: str, credentials_exception) -> TokenData:
+    """Verify a JWT, skipping the signature check for recently verified tokens."""
+    digest = hashlib.sha256(token.encode()).hexdigest()
+    token_data = token_cache.get(digest)
+    if token_data is not None:
+        return token_data
+
+    token_data = verify_token(token, credentials_exception)
+    ttl: Optional[float] = None
+    if token_data.expires_at is not None:
+        ttl = (token_data.expires_at - datetime.utcnow()).total_seconds()
+        if ttl <= 0:
+            raise credentials_exception
+        ttl = min(ttl, token_cache.ttl)
+    token_cache.set(digest, token_data, ttl)
+    return token_data
+
+
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db),
 ) -> User:
     """Get current authenticated user from JWT token."""
     credentials_exception = HTTPException(
@@ -28,18 +80,37 @@ async def get_current_user(
         headers={"WWW-Authenticate": "Bearer"},
     )
 
-    token = credentials.credentials
-    token_data = verify_token(token, credentials_exception)
+    with timed("auth"):
+        token = credentials.credentials
+        token_data = verify_token_cached(token, credentials_exception)
+
+        username = token_data.client_id
+        if username is None:
+            raise credentials_exception
 
-    user = db.query(User).filter(User.username == token_data.client_id).first()
-    if user is None:
-        raise credentials_exception
+        principal = principal_cache.get(username)
+        if principal is None:
+            # Only the principal's columns; no ORM identity map work
+            row = (
+                await db.execute(
+                    select(
+                        col(User.id),
+                        col(User.username),
+                        col(User.is_active),
+                        col(User.scopes),
+                    ).where(col(User.username) == username)
+                )
+            ).first()
+            if row is None:
+                raise credentials_exception
+            principal = Principal(*row)
+            principal_cache.set(principal.username, principal)
 
-    return user
+        return principal.to_model()
 
 
 async def get_current_active_user(
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
 ) -> User:
     """Get current active user."""
     if not current_user.is_active:
@@ -56,10 +127,8 @@ def create_access_token_for_user(user: User, expires_delta: Optional[timedelta]
             minutes=settings.access_token_expire_minutes
         )
 
-    to_encode = {
-        "sub": user.username,
-        "scopes": user.scopes,
-        "exp": expire
-    }
+    to_encode = {"sub": user.username, "scopes": user.scopes_list, "exp": expire}
+
+    from jose import jwt
 
     return jwt.encode(to_encode, settings.secret_key, algorithm=settings.algorithm)
@@ -1,82 +1,104 @@
 """
 User management functionality.
+
+Every lookup is a single ``select()`` on an ``AsyncSession``; relationships
+are ``lazy="raise"`` so nothing triggers hidden queries.
 """
-from typing import List, Optional
+from typing import Optional
 
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlmodel import col
 
+from core.redis import invalidation_bus
+from core.security import password_hasher
+from models.user import User
+from utils.pagination import Page, keyset_page
 
-from ..core.security import get_password_hash, verify_password
-from ..models.user import User
 
+async def authenticate_user(
+    db: AsyncSession, username: str, password: str
+) -> Optional[User]:
+    """Authenticate a user.
 
-def authenticate_user(db: Session, username: str, password: str) -> Optional[User]:
-    """Authenticate a user."""
-    user = db.query(User).filter(User.username == username).first()
+    Raises PasswordHashingBusy when the hashing pool is saturated.
+    """
+    user = await get_user_by_username(db, username)
     if not user:
         return None
-    if not verify_password(password, user.hashed_password):
+    if not await password_hasher.verify(password, user.hashed_password):
         return None
     return user
 
 
-def get_user(db: Session, user_id: int) -> Optional[User]:
+async def get_user(db: AsyncSession, user_id: int) -> Optional[User]:
     """Get user by ID."""
-    return db.query(User).filter(User.id == user_id).first()
+    return await db.scalar(select(User).where(col(User.id) == user_id))
 
 
-def get_user_by_username(db: Session, username: str) -> Optional[User]:
+async def get_user_by_username(db: AsyncSession, username: str) -> Optional[User]:
     """Get user by username."""
-    return db.query(User).filter(User.username == username).first()
+    return await db.scalar(select(User).where(col(User.username) == username))
+
 
+async def get_users(
+    db: AsyncSession, cursor: Optional[str] = None, limit: int = 100
+) -> Page:
+    """Get a page of users in id order.
 
-def get_users(db: Session, skip: int = 0, limit: int = 100) -> List[User]:
-    """Get list of users."""
-    return db.query(User).offset(skip).limit(limit).all()
+    Pass the previous page's ``next_cursor`` to continue; raises
+    CursorError for a cursor that was not issued by this listing.
+    """
+    return await keyset_page(db, select(User), [User.id], "users", cursor, limit)
 
 
-def create_user(
-    db: Session,
+async def create_user(
+    db: AsyncSession,
     username: str,
     password: str,
     email: Optional[str] = None,
-    is_active: bool = True
+    is_active: bool = True,
 ) -> User:
     """Create a new user."""
-    hashed_password = get_password_hash(password)
+    hashed_password = await password_hasher.hash(password)
     db_user = User(
         username=username,
         email=email,
         hashed_password=hashed_password,
-        is_active=is_active
+        is_active=is_active,
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    # The primary key comes back with the INSERT; no refresh needed
+    await db.commit()
     return db_user
 
 
-def update_user(db: Session, user_id: int, **kwargs) -> Optional[User]:
+async def update_user(db: AsyncSession, user_id: int, **kwargs) -> Optional[User]:
     """Update user information."""
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await get_user(db, user_id)
     if not user:
         return None
 
+    username = user.username
     for key, value in kwargs.items():
         if hasattr(user, key):
             setattr(user, key, value)
 
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    # Deactivation and scope changes must not wait for the cache TTL
+    await invalidation_bus.ainvalidate("principal", username)
+    if user.username != username:
+        await invalidation_bus.ainvalidate("principal", user.username)
     return user
 
 
-def delete_user(db: Session, user_id: int) -> bool:
+async def delete_user(db: AsyncSession, user_id: int) -> bool:
     """Delete a user."""
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await get_user(db, user_id)
     if not user:
         return False
 
-    db.delete(user)
-    db.commit()
+    await db.delete(user)
+    await db.commit()
+    await invalidation_bus.ainvalidate("principal", user.username)
     return True
@@ -0,0 +1,7 @@
+"""
+Load and latency benchmarks for the connector API.
+
+``python -m benchmarks.run`` seeds a database, boots ``main:app`` under
+uvicorn in a subprocess (``benchmarks.server``) and drives it over HTTP.
+Without ``--database-url``/``--redis-url`` it uses SQLite and fakeredis.
+"""
@@ -0,0 +1,127 @@
+"""
+Compare OFFSET and keyset (cursor) pages of query history at depth.
+
+    python -m benchmarks.pagination --rows 1000100 --offsets 0 100000 1000000
+
+Seeds a SQLite file with ``--rows`` history records, then fetches the page
+at each offset both ways through an ``AsyncSession``: ``offset`` with
+``ORDER BY executed_at DESC, id DESC OFFSET n`` and ``keyset`` with
+``get_query_history`` and the cursor of the row just before it. Keyset
+pages seek on ``idx_executed_at`` and should take the same time at any
+depth; OFFSET pages grow linearly with ``n``.
+"""
+import argparse
+import asyncio
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlmodel import SQLModel, col
+
+import models  # noqa: F401  (registers the tables)
+from models.query_history import QueryHistory
+from services.audit_logger import get_query_history
+from utils.pagination import encode_cursor
+
+SCOPE = "query_history::"
+
+
+def seed(path: Path, rows: int) -> None:
+    """Create the schema and ``rows`` history records, two per second."""
+    engine = create_engine(f"sqlite:///{path}")
+    SQLModel.metadata.create_all(engine)
+    engine.dispose()
+
+    start = datetime(2024, 1, 1)
+    db = sqlite3.connect(path)
+    with db:
+        db.executemany(
+            "INSERT INTO query_history (client_id, query, row_count, status,"
+            " executed_at) VALUES ('bench', 'SELECT 1', 1, 'SUCCESS', ?)",
+            ((str(start + timedelta(seconds=i // 2)),) for i in range(rows)),
+        )
+    db.close()
+
+
+async def best_of(fetch: Callable[[], Awaitable[int]], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await fetch()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+async def measure(
+    path: Path, offsets: List[int], page_size: int, repeat: int
+) -> Dict[int, Dict[str, float]]:
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    order = (col(QueryHistory.executed_at).desc(), col(QueryHistory.id).desc())
+    results = {}
+    try:
+        async with AsyncSession(engine) as db:
+            for offset in offsets:
+
+                async def by_offset() -> int:
+                    stmt = select(QueryHistory).order_by(*order)
+                    items = await db.scalars(stmt.offset(offset).limit(page_size))
+                    return len(items.all())
+
+                cursor = None
+                if offset:
+                    before = (
+                        await db.execute(
+                            select(col(QueryHistory.executed_at), col(QueryHistory.id))
+                            .order_by(*order)
+                            .offset(offset - 1)
+                            .limit(1)
+                        )
+                    ).one()
+                    cursor = encode_cursor(SCOPE, list(before))
+
+                async def by_keyset() -> int:
+                    page = await get_query_history(db, cursor=cursor, limit=page_size)
+                    return len(page.items)
+
+                # Same rows both ways, or the timings are not comparable
+                assert await by_offset() == await by_keyset()
+                results[offset] = {
+                    "offset_ms": round(await best_of(by_offset, repeat) * 1000, 2),
+                    "keyset_ms": round(await best_of(by_keyset, repeat) * 1000, 2),
+                }
+                db.expunge_all()
+    finally:
+        await engine.dispose()
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> Dict[int, Dict[str, float]]:
+    parser = argparse.ArgumentParser(description="Pagination depth benchmark")
+    parser.add_argument("--rows", type=int, default=1000100)
+    parser.add_argument("--offsets", type=int, nargs="+", default=[0, 100000, 1000000])
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+    if max(args.offsets) >= args.rows:
+        parser.error("every offset must be below --rows")
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory) / "pagination.db"
+        seed(path, args.rows)
+        results = asyncio.run(measure(path, args.offsets, args.page_size, args.repeat))
+    for offset, stats in results.items():
+        print(
+            f"offset={offset:<9} OFFSET {stats['offset_ms']:>9.2f}ms  "
+            f"keyset {stats['keyset_ms']:>7.2f}ms",
+            flush=True,
+        )
+    return results
+
+
+if __name__ == "__main__":
+    main()
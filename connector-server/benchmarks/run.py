@@ -0,0 +1,322 @@
+"""
+Drive the API at fixed concurrency levels and compare against a baseline.
+
+    python -m benchmarks.run --output bench-results.json \\
+        --baseline benchmarks/baseline.json
+
+Each scenario runs closed-loop: ``concurrency`` clients each send their
+next request as soon as the previous one completes. Requests started
+during the warm-up are not measured. The load generator shares one CPU
+core, so compare runs made on the same machine.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+import httpx
+
+from benchmarks.stand_ins import ITEMS_TABLE, seed, sqlite_url
+
+SERVER_ROOT = Path(__file__).resolve().parent.parent
+
+
+class Scenario(NamedTuple):
+    """One request shape; ``body`` builds a JSON body per request."""
+
+    method: str
+    path: str
+    authenticated: bool
+    body: Optional[Callable[[random.Random, int], Dict[str, Any]]] = None
+
+
+SCENARIOS: Dict[str, Scenario] = {
+    "health": Scenario("GET", "/health", authenticated=False),
+    # Cheap admin endpoint: dominated by API key verification and scope checks
+    "auth": Scenario("GET", "/api/v1/query/connections", authenticated=True),
+    "query": Scenario(
+        "POST",
+        "/api/v1/query",
+        authenticated=True,
+        body=lambda rng, rows: {
+            "sql": f"SELECT id, name, price, tags FROM {ITEMS_TABLE} "
+            "WHERE id > :after ORDER BY id LIMIT 50",
+            "params": {"after": rng.randrange(max(rows - 50, 1))},
+            "cache": False,
+        },
+    ),
+    "export": Scenario(
+        "GET", f"/api/v1/export/{ITEMS_TABLE}?chunk_size=500", authenticated=True
+    ),
+}
+
+
+def summarize(latencies: List[float], errors: int, seconds: float) -> Dict[str, Any]:
+    """Latency percentiles in milliseconds and throughput in requests/second."""
+    if len(latencies) >= 2:
+        cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+        p50, p95, p99 = cuts[49], cuts[94], cuts[98]
+    else:
+        p50 = p95 = p99 = latencies[0] if latencies else 0.0
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / seconds, 1),
+        "p50_ms": round(p50 * 1000, 3),
+        "p95_ms": round(p95 * 1000, 3),
+        "p99_ms": round(p99 * 1000, 3),
+    }
+
+
+async def run_level(
+    client: httpx.AsyncClient,
+    scenario: Scenario,
+    concurrency: int,
+    duration: float,
+    warmup: float,
+    headers: Dict[str, str],
+    rows: int,
+) -> Dict[str, Any]:
+    """Run one scenario at one concurrency level."""
+    latencies: List[float] = []
+    errors = 0
+    rng = random.Random(concurrency)
+    measure_from = time.perf_counter() + warmup
+    deadline = measure_from + duration
+
+    async def worker() -> None:
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            body = scenario.body(rng, rows) if scenario.body else None
+            started = time.perf_counter()
+            try:
+                response = await client.request(
+                    scenario.method, scenario.path, json=body, headers=headers
+                )
+                ok = response.status_code < 400
+            except httpx.HTTPError:
+                ok = False
+            if started >= measure_from:
+                if ok:
+                    latencies.append(time.perf_counter() - started)
+                else:
+                    errors += 1
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, errors, duration)
+
+
+def compare(
+    results: Dict[str, Any],
+    baseline: Dict[str, Any],
+    p95_tolerance: float,
+    throughput_tolerance: float,
+) -> List[str]:
+    """Regressions of ``results`` against ``baseline``; empty when none."""
+    regressions = []
+    for name, levels in results["scenarios"].items():
+        for level, current in levels.items():
+            if current["errors"]:
+                regressions.append(
+                    f"{name} c={level}: {current['errors']} failed requests"
+                )
+            base = baseline.get("scenarios", {}).get(name, {}).get(level)
+            if base is None:
+                continue
+            if current["p95_ms"] > base["p95_ms"] * (1 + p95_tolerance):
+                regressions.append(
+                    f"{name} c={level}: p95 {current['p95_ms']:.1f}ms vs "
+                    f"baseline {base['p95_ms']:.1f}ms"
+                )
+            if current["throughput_rps"] < base["throughput_rps"] * (
+                1 - throughput_tolerance
+            ):
+                regressions.append(
+                    f"{name} c={level}: {current['throughput_rps']:.0f} req/s vs "
+                    f"baseline {base['throughput_rps']:.0f} req/s"
+                )
+    return regressions
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def _wait_until_up(base_url: str, server: subprocess.Popen) -> None:
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        for _ in range(300):
+            if server.poll() is not None:
+                raise RuntimeError("Benchmark server exited during startup")
+            try:
+                if (await client.get("/health")).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.1)
+    raise RuntimeError("Benchmark server did not become healthy")
+
+
+async def _benchmark(args: argparse.Namespace, base_url: str, api_key: str) -> Dict:
+    scenarios: Dict[str, Dict[str, Any]] = {}
+    limits = httpx.Limits(
+        max_connections=max(args.levels), max_keepalive_connections=None
+    )
+    async with httpx.AsyncClient(
+        base_url=base_url, limits=limits, timeout=60
+    ) as client:
+        for name in args.scenarios:
+            scenario = SCENARIOS[name]
+            headers = {"X-API-Key": api_key} if scenario.authenticated else {}
+            for level in args.levels:
+                stats = await run_level(
+                    client,
+                    scenario,
+                    level,
+                    args.duration,
+                    args.warmup,
+                    headers,
+                    args.rows,
+                )
+                scenarios.setdefault(name, {})[str(level)] = stats
+                print(
+                    f"{name:<8} c={level:<4} {stats['throughput_rps']:>9.1f} req/s  "
+                    f"p50={stats['p50_ms']:.2f}ms p95={stats['p95_ms']:.2f}ms "
+                    f"p99={stats['p99_ms']:.2f}ms errors={stats['errors']}",
+                    flush=True,
+                )
+    return scenarios
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Connector API load benchmark",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "--levels",
+        default="1,8,32",
+        type=lambda v: [int(x) for x in v.split(",")],
+        help="Comma-separated concurrency levels",
+    )
+    parser.add_argument(
+        "--scenarios", default=",".join(SCENARIOS), type=lambda v: v.split(",")
+    )
+    parser.add_argument(
+        "--duration",
+        type=float,
+        default=5.0,
+        help="Measured seconds per scenario and level",
+    )
+    parser.add_argument("--warmup", type=float, default=1.0)
+    parser.add_argument(
+        "--rows", type=int, default=2000, help="Rows seeded into the benchmark table"
+    )
+    parser.add_argument(
+        "--database-url", help="MySQL URL to benchmark against instead of SQLite"
+    )
+    parser.add_argument("--redis-url", help="Redis URL to use instead of fakeredis")
+    parser.add_argument("--output", type=Path, help="Write results JSON here")
+    parser.add_argument("--baseline", type=Path, help="Baseline results JSON")
+    parser.add_argument(
+        "--p95-tolerance",
+        type=float,
+        default=0.5,
+        help="Allowed fractional p95 increase over the baseline",
+    )
+    parser.add_argument(
+        "--throughput-tolerance",
+        type=float,
+        default=0.3,
+        help="Allowed fractional throughput drop from the baseline",
+    )
+    args = parser.parse_args(argv)
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    # The seeding code below and the server subprocess read these settings
+    if args.database_url:
+        os.environ["CONNECTOR_DATABASE_URL"] = args.database_url
+    if args.redis_url:
+        os.environ["CONNECTOR_REDIS_URL"] = args.redis_url
+
+    from sqlalchemy.ext.asyncio import create_async_engine
+    from sqlalchemy.pool import NullPool
+
+    with tempfile.TemporaryDirectory() as workdir:
+        sqlite_path: Optional[str] = None
+        if args.database_url:
+            seed_url = args.database_url.replace("mysql://", "mysql+asyncmy://")
+        else:
+            sqlite_path = os.path.join(workdir, "bench.db")
+            seed_url = sqlite_url(sqlite_path)
+
+        async def seed_database() -> Dict[str, str]:
+            engine = create_async_engine(seed_url, poolclass=NullPool)
+            try:
+                return await seed(engine, args.rows)
+            finally:
+                await engine.dispose()
+
+        credentials = asyncio.run(seed_database())
+
+        port = _free_port()
+        command = [sys.executable, "-m", "benchmarks.server", "--port", str(port)]
+        if sqlite_path:
+            command += ["--sqlite", sqlite_path]
+        if not args.redis_url:
+            command.append("--fakeredis")
+        server = subprocess.Popen(command, cwd=SERVER_ROOT, env=os.environ.copy())
+        base_url = f"http://127.0.0.1:{port}"
+        try:
+            asyncio.run(_wait_until_up(base_url, server))
+            scenarios = asyncio.run(_benchmark(args, base_url, credentials["api_key"]))
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+
+    results = {
+        "meta": {
+            "recorded_at": datetime.utcnow().isoformat() + "Z",
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "database": "mysql" if args.database_url else "sqlite",
+            "redis": "redis" if args.redis_url else "fakeredis",
+            "duration_seconds": args.duration,
+            "rows": args.rows,
+        },
+        "scenarios": scenarios,
+    }
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2) + "\n")
+        print(f"Results written to {args.output}")
+
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text())
+        regressions = compare(
+            results, baseline, args.p95_tolerance, args.throughput_tolerance
+        )
+        if regressions:
+            print("Regressions against the baseline:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print("No regressions against the baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
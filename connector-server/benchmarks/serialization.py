@@ -0,0 +1,138 @@
+"""
+Compare row encoders on a wide synthetic result.
+
+    python -m benchmarks.serialization --rows 100000
+
+``pydantic`` is FastAPI's default path for a list endpoint (a model per
+row, ``jsonable_encoder``, ``json.dumps``), ``json`` is the stdlib encoder
+with ``json_default`` and ``orjson`` is ``ndjson_rows``. Time and peak
+traced memory are measured in separate passes, since tracing slows the
+encoders down.
+"""
+import argparse
+import json
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel
+
+from utils.formatters import json_default, ndjson_rows
+
+COLUMNS = [
+    "id",
+    "user_id",
+    "name",
+    "status",
+    "amount",
+    "ratio",
+    "payload",
+    "created_at",
+    "note",
+]
+
+
+class RowModel(BaseModel):
+    """Schema a validated list endpoint would declare for these rows."""
+
+    id: int
+    user_id: int
+    name: str
+    status: str
+    amount: Decimal
+    ratio: float
+    payload: bytes
+    created_at: datetime
+    note: Optional[str]
+
+
+def make_rows(count: int) -> List[Tuple[Any, ...]]:
+    start = datetime(2024, 1, 1, 12, 0, 0)
+    return [
+        (
+            i,
+            i % 997,
+            f"row-{i}",
+            ("ok", "error")[i % 7 == 0],
+            Decimal(i) / 100,
+            i / 3,
+            f"blob-{i}".encode(),
+            start + timedelta(seconds=i),
+            None if i % 3 else "checked",
+        )
+        for i in range(count)
+    ]
+
+
+def encode_pydantic(rows: List[Tuple[Any, ...]]) -> bytes:
+    models = [RowModel.model_validate(dict(zip(COLUMNS, row))) for row in rows]
+    return json.dumps(jsonable_encoder(models)).encode()
+
+
+def encode_json(rows: List[Tuple[Any, ...]]) -> bytes:
+    return "".join(
+        json.dumps(dict(zip(COLUMNS, row)), default=json_default) + "\n" for row in rows
+    ).encode()
+
+
+def encode_orjson(rows: List[Tuple[Any, ...]]) -> bytes:
+    return ndjson_rows(COLUMNS, rows)
+
+
+ENCODERS: Dict[str, Callable[[List[Tuple[Any, ...]]], bytes]] = {
+    "pydantic": encode_pydantic,
+    "json": encode_json,
+    "orjson": encode_orjson,
+}
+
+
+def measure(
+    encoder: Callable[[List[Tuple[Any, ...]]], bytes],
+    rows: List[Tuple[Any, ...]],
+    repeat: int = 3,
+) -> Dict[str, float]:
+    """Best-of-``repeat`` encode time and peak traced memory for one encoder."""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        output = encoder(rows)
+        best = min(best, time.perf_counter() - started)
+    size = len(output)
+    del output
+
+    tracemalloc.start()
+    try:
+        encoder(rows)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        "seconds": round(best, 4),
+        "peak_mib": round(peak / 2**20, 1),
+        "output_mib": round(size / 2**20, 1),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> Dict[str, Dict[str, float]]:
+    parser = argparse.ArgumentParser(description="Row serialization benchmark")
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    rows = make_rows(args.rows)
+    results = {}
+    for name, encoder in ENCODERS.items():
+        results[name] = stats = measure(encoder, rows, args.repeat)
+        print(
+            f"{name:<9} {stats['seconds'] * 1000:>8.1f}ms  "
+            f"peak={stats['peak_mib']:.1f}MiB  output={stats['output_mib']:.1f}MiB",
+            flush=True,
+        )
+    return results
+
+
+if __name__ == "__main__":
+    main()
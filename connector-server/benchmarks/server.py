@@ -0,0 +1,40 @@
+"""
+Run ``main:app`` under uvicorn for a benchmark, optionally on stand-ins.
+
+    python -m benchmarks.server --port 3100 --sqlite /tmp/bench.db
+"""
+import argparse
+import os
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--port", type=int, required=True)
+    parser.add_argument("--sqlite", help="SQLite file instead of MySQL")
+    parser.add_argument(
+        "--fakeredis", action="store_true", help="In-process Redis stand-in"
+    )
+    args = parser.parse_args()
+
+    # Settings are read at import time
+    os.environ.setdefault("CONNECTOR_RATE_LIMIT_WINDOW_SECONDS", "1")
+    if args.sqlite:
+        os.environ["CONNECTOR_DB_POOL_WARMUP"] = "false"
+
+    import uvicorn
+
+    import main as app_module
+    from benchmarks import stand_ins
+
+    stand_ins.install(args.sqlite, args.fakeredis)
+    uvicorn.run(
+        app_module.app,
+        host="127.0.0.1",
+        port=args.port,
+        log_level="warning",
+        access_log=False,
+    )
+
+
+if __name__ == "__main__":
+    main()
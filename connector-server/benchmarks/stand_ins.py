@@ -0,0 +1,75 @@
+"""
+Local SQLite/fakeredis stand-ins and seed data for benchmark runs.
+"""
+import json
+from typing import Dict, Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+ITEMS_TABLE = "bench_items"
+
+
+def sqlite_url(path: str) -> str:
+    return f"sqlite+aiosqlite:///{path}"
+
+
+def install(sqlite_path: Optional[str], use_fakeredis: bool) -> None:
+    """Point the app's engine, sessions and Redis clients at the stand-ins.
+
+    Must run before the server starts; it presets the lazily created
+    singletons that the lifespan and the dependencies hand out.
+    """
+    import core.database as database
+    import core.redis as redis_module
+    from core.routing import DatabaseRouter
+
+    if sqlite_path is not None:
+        engine = database._create_engine(sqlite_url(sqlite_path), "primary")
+        database._async_engine = engine
+        database._db_router = DatabaseRouter(engine)
+
+    if use_fakeredis:
+        from fakeredis import FakeAsyncRedis
+
+        redis_module._redis = FakeAsyncRedis()
+
+
+async def seed(engine: AsyncEngine, rows: int) -> Dict[str, str]:
+    """Create the schema and benchmark rows; returns the API key to use."""
+    from sqlalchemy.ext.asyncio import AsyncSession
+    from sqlmodel import SQLModel
+
+    import models  # noqa: F401  (registers the tables)
+    from auth.api_keys import create_api_key
+
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+        await conn.execute(text(f"DROP TABLE IF EXISTS {ITEMS_TABLE}"))
+        await conn.execute(
+            text(
+                f"CREATE TABLE {ITEMS_TABLE} (id INTEGER PRIMARY KEY, "
+                "name VARCHAR(64) NOT NULL, price DECIMAL(10, 2) NOT NULL, "
+                "tags VARCHAR(255))"
+            )
+        )
+        await conn.execute(
+            text(
+                f"INSERT INTO {ITEMS_TABLE} (id, name, price, tags) "
+                "VALUES (:id, :name, :price, :tags)"
+            ),
+            [
+                {
+                    "id": i,
+                    "name": f"item-{i}",
+                    "price": round(i * 0.37 % 500, 2),
+                    "tags": json.dumps(["bench", f"group-{i % 10}"]),
+                }
+                for i in range(1, rows + 1)
+            ],
+        )
+    async with AsyncSession(engine) as session:
+        api_key, _ = await create_api_key(
+            session, "benchmark", scopes=["read", "admin"], rate_limit=10000
+        )
+    return {"api_key": api_key}
@@ -0,0 +1,190 @@
+"""
+Measure worker startup: import time of ``main`` and time to first request.
+
+    python -m benchmarks.startup --max-import-ms 2500 --max-first-request-ms 4000
+
+The import breakdown comes from ``python -X importtime -c "import main"``,
+with self time summed per top-level package and the median taken over
+``--repeat`` fresh interpreters. Time to first request is measured from
+spawning ``benchmarks.server`` (SQLite and fakeredis stand-ins) until
+``/health`` answers, which covers imports, app construction and the
+lifespan. The run fails if either median exceeds its threshold, or if a
+module that should load on first use (``DEFERRED_MODULES``) is imported
+by ``import main``.
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from benchmarks.run import SERVER_ROOT, _free_port
+
+# Loaded on first use (token, password hash, server run), never at import
+DEFERRED_MODULES = ("jose", "passlib", "asyncmy", "uvicorn")
+
+_PROBE = (
+    "import sys, json, main, core.database as d; "
+    "print(json.dumps({'modules': sorted(m for m in %r if m in sys.modules), "
+    "'engine_created': d._async_engine is not None}))"
+) % (DEFERRED_MODULES,)
+
+
+def parse_importtime(output: str) -> Dict[str, int]:
+    """Sum ``-X importtime`` self times (microseconds) per top-level package."""
+    totals: Dict[str, int] = defaultdict(int)
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line[len("import time:") :].split("|")
+        totals[name.strip().split(".")[0]] += int(self_us)
+    return dict(totals)
+
+
+def import_breakdown(repeat: int) -> Dict[str, Any]:
+    """Median total and per-package import time of ``main``, in milliseconds."""
+    runs = []
+    for _ in range(repeat):
+        completed = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", "import main"],
+            cwd=SERVER_ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        runs.append(parse_importtime(completed.stderr))
+    packages = {
+        name: round(statistics.median(run.get(name, 0) for run in runs) / 1000, 1)
+        for name in set().union(*runs)
+    }
+    total = statistics.median(sum(run.values()) for run in runs)
+    return {
+        "total_ms": round(total / 1000, 1),
+        "packages": dict(sorted(packages.items(), key=lambda item: -item[1])),
+    }
+
+
+def first_request(repeat: int) -> float:
+    """Median milliseconds from spawning a server to its first ``/health``."""
+    timings = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for i in range(repeat):
+            port = _free_port()
+            started = time.perf_counter()
+            server = subprocess.Popen(
+                [
+                    sys.executable,
+                    "-m",
+                    "benchmarks.server",
+                    "--port",
+                    str(port),
+                    "--sqlite",
+                    str(Path(workdir) / f"startup{i}.db"),
+                    "--fakeredis",
+                ],
+                cwd=SERVER_ROOT,
+                # Background tasks complain about the empty database; ignore
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+            try:
+                with httpx.Client(base_url=f"http://127.0.0.1:{port}") as client:
+                    while True:
+                        if server.poll() is not None:
+                            raise RuntimeError("Server exited during startup")
+                        try:
+                            if client.get("/health").status_code == 200:
+                                break
+                        except httpx.TransportError:
+                            time.sleep(0.005)
+                timings.append(time.perf_counter() - started)
+            finally:
+                server.terminate()
+                server.wait(timeout=30)
+    return round(statistics.median(timings) * 1000, 1)
+
+
+def eager_imports() -> Dict[str, Any]:
+    """Deferred modules and engines that ``import main`` creates anyway."""
+    completed = subprocess.run(
+        [sys.executable, "-c", _PROBE],
+        cwd=SERVER_ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(completed.stdout)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Worker startup benchmark",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--top", type=int, default=12, help="Packages to list in the import breakdown"
+    )
+    parser.add_argument(
+        "--max-import-ms",
+        type=float,
+        default=2500,
+        help="Fail above this median import time of main",
+    )
+    parser.add_argument(
+        "--max-first-request-ms",
+        type=float,
+        default=4000,
+        help="Fail above this median time to first request",
+    )
+    parser.add_argument("--output", type=Path, help="Write results JSON here")
+    args = parser.parse_args(argv)
+
+    imports = import_breakdown(args.repeat)
+    print(f"import main: {imports['total_ms']:.1f}ms", flush=True)
+    for name, ms in list(imports["packages"].items())[: args.top]:
+        print(f"  {name:<24} {ms:>8.1f}ms")
+    first_ms = first_request(args.repeat)
+    print(f"first request: {first_ms:.1f}ms", flush=True)
+    eager = eager_imports()
+
+    results = {
+        "import": imports,
+        "first_request_ms": first_ms,
+        "eager": eager,
+    }
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2) + "\n")
+        print(f"Results written to {args.output}")
+
+    regressions = []
+    if imports["total_ms"] > args.max_import_ms:
+        regressions.append(
+            f"import main took {imports['total_ms']}ms > {args.max_import_ms}ms"
+        )
+    if first_ms > args.max_first_request_ms:
+        regressions.append(
+            f"first request took {first_ms}ms > {args.max_first_request_ms}ms"
+        )
+    if eager["modules"]:
+        regressions.append(f"imported at startup: {', '.join(eager['modules'])}")
+    if eager["engine_created"]:
+        regressions.append("database engine created at import")
+    if regressions:
+        print("Startup regressions:")
+        for regression in regressions:
+            print(f"  {regression}")
+        return 1
+    print("Startup within thresholds")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,323 @@
+"""
+Fair-share admission control for database work.
+
+Each worker admits at most ``slots`` requests doing database work at
+once, normally its share of the primary pool. No client_id may hold more
+than ``per_client`` of them, so one client's exports cannot take every
+connection. Requests that have to wait are admitted in weighted fair
+queuing order across clients. Every admission advances the client's
+virtual finish tag by ``1 / weight``, and the waiting client with the
+lowest tag goes next. A client with a deep backlog therefore takes
+turns with the others instead of being served first come, first served.
+
+``Priority.CRITICAL`` work (API key lookups, database health checks) is
+admitted ahead of all normal work and may also use the ``reserved``
+slots that normal work cannot. A request is rejected with
+``AdmissionRejected`` (429 with Retry-After) in three cases: the queue is
+full, its expected wait already exceeds ``max_wait``, or it has waited
+that long. This happens well before ``pool_timeout`` would expire.
+"""
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from enum import IntEnum
+from typing import Any, AsyncIterator, Deque, Dict, Mapping, Optional
+
+from .config import settings
+from .database import pool_budget
+
+
+class Priority(IntEnum):
+    """Admission class; lower values are admitted first."""
+
+    CRITICAL = 0
+    NORMAL = 1
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request is not admitted; retry after ``retry_after`` s."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+    def headers(self) -> Dict[str, str]:
+        """Retry-After header in whole seconds."""
+        return {"Retry-After": str(max(1, math.ceil(self.retry_after)))}
+
+
+class Ticket:
+    """Admitted work; ``release`` once its database work is done."""
+
+    __slots__ = ("client_id", "priority", "admitted_at", "_controller", "_released")
+
+    def __init__(
+        self, controller: "AdmissionController", client_id: str, priority: Priority
+    ):
+        self._controller = controller
+        self.client_id = client_id
+        self.priority = priority
+        self.admitted_at = time.monotonic()
+        self._released = False
+
+    def release(self) -> None:
+        """Free the slot for the next waiter; idempotent."""
+        if not self._released:
+            self._released = True
+            self._controller._release(self)
+
+
+class _Waiter:
+    __slots__ = ("client_id", "priority", "start", "finish", "future")
+
+    def __init__(self, client_id: str, priority: Priority, start: float, finish: float):
+        self.client_id = client_id
+        self.priority = priority
+        self.start = start
+        self.finish = finish
+        self.future: "asyncio.Future[Ticket]" = (
+            asyncio.get_running_loop().create_future()
+        )
+
+
+class AdmissionController:
+    """Per-worker concurrency caps and weighted fair queuing for DB work."""
+
+    def __init__(
+        self,
+        slots: int,
+        per_client: int = 8,
+        reserved: int = 2,
+        max_queue: int = 1000,
+        max_wait: float = 5.0,
+        weights: Optional[Mapping[str, float]] = None,
+        enabled: bool = True,
+    ):
+        self.slots = slots
+        self.per_client = per_client
+        # Normal work always keeps at least one slot
+        self.reserved = min(reserved, slots - 1)
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.weights = dict(weights or {})
+        self.enabled = enabled
+        self.active = 0
+        # Of which normal priority; only these are limited to normal_slots
+        self._normal_active = 0
+        self._client_active: Dict[str, int] = {}
+        self._client_finish: Dict[str, float] = {}
+        self._virtual = 0.0
+        self._critical: Deque[_Waiter] = deque()
+        # Per-client FIFO queues; tags only grow within a client
+        self._waiting: Dict[str, Deque[_Waiter]] = {}
+        self._queued = 0
+        # Moving average of how long admitted work holds its slot
+        self._hold_seconds = 0.0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    @property
+    def normal_slots(self) -> int:
+        return self.slots - self.reserved
+
+    async def acquire(
+        self, client_id: str, priority: Priority = Priority.NORMAL
+    ) -> Ticket:
+        """Wait for a slot for ``client_id``'s request.
+
+        Raises ``AdmissionRejected`` instead of waiting longer than
+        ``max_wait``.
+        """
+        if not self.enabled:
+            return self._admit(client_id, priority, 0.0)
+        start = max(self._virtual, self._client_finish.get(client_id, 0.0))
+        finish = start
+        if priority == Priority.NORMAL:
+            # Charged on arrival, so a rejected or abandoned request still
+            # counts against the client's share
+            finish = start + 1 / self.weights.get(client_id, 1.0)
+            self._client_finish[client_id] = finish
+            if not self._queued and self._has_room(client_id):
+                return self._admit(client_id, priority, start)
+        elif not self._critical and self.active < self.slots:
+            return self._admit(client_id, priority, start)
+
+        waiter = _Waiter(client_id, priority, start, finish)
+        if priority == Priority.CRITICAL:
+            self._critical.append(waiter)
+        else:
+            self._waiting.setdefault(client_id, deque()).append(waiter)
+            self._queued += 1
+        # Waiters of capped clients do not hold up a client with room
+        self._dispatch()
+        if waiter.future.done():
+            return waiter.future.result()
+        if priority == Priority.NORMAL:
+            try:
+                self._check_queue(client_id)
+            except AdmissionRejected:
+                self._discard(waiter)
+                raise
+        try:
+            return await asyncio.wait_for(asyncio.shield(waiter.future), self.max_wait)
+        except asyncio.TimeoutError:
+            if waiter.future.done():
+                return waiter.future.result()
+            self._discard(waiter)
+            self.timed_out += 1
+            self.rejected += 1
+            raise AdmissionRejected(
+                "Timed out waiting for a database slot", self._expected_wait(client_id)
+            )
+        except BaseException:
+            # Cancelled, e.g. by a client disconnect; possibly just admitted
+            if waiter.future.done() and not waiter.future.cancelled():
+                waiter.future.result().release()
+            else:
+                self._discard(waiter)
+            raise
+
+    @asynccontextmanager
+    async def admit(
+        self, client_id: str, priority: Priority = Priority.NORMAL
+    ) -> AsyncIterator[Ticket]:
+        """Hold a slot for the duration of a ``with`` block."""
+        ticket = await self.acquire(client_id, priority)
+        try:
+            yield ticket
+        finally:
+            ticket.release()
+
+    def _has_room(self, client_id: str) -> bool:
+        return (
+            self._normal_room()
+            and self._client_active.get(client_id, 0) < self.per_client
+        )
+
+    def _normal_room(self) -> bool:
+        return self._normal_active < self.normal_slots and self.active < self.slots
+
+    def _expected_wait(self, client_id: str) -> float:
+        """Seconds until a new request of ``client_id`` would be admitted."""
+        hold = self._hold_seconds or 0.1
+        queued = len(self._waiting.get(client_id, ()))
+        # The client's own backlog drains at most per_client at a time
+        return max(
+            self._queued * hold / self.normal_slots,
+            queued * hold / self.per_client,
+        )
+
+    def _check_queue(self, client_id: str) -> None:
+        """Reject a just-queued request that would wait too long anyway."""
+        expected = self._expected_wait(client_id)
+        if self._queued > self.max_queue:
+            message = "Too many requests waiting for the database"
+        elif self._hold_seconds and expected > self.max_wait:
+            message = f"Expected wait of {expected:.1f}s exceeds the admission limit"
+        else:
+            return
+        self.rejected += 1
+        raise AdmissionRejected(message, expected)
+
+    def _admit(self, client_id: str, priority: Priority, start: float) -> Ticket:
+        self.active += 1
+        if priority == Priority.NORMAL:
+            self._normal_active += 1
+        self._client_active[client_id] = self._client_active.get(client_id, 0) + 1
+        self._virtual = max(self._virtual, start)
+        self.admitted += 1
+        return Ticket(self, client_id, priority)
+
+    def _release(self, ticket: Ticket) -> None:
+        self.active -= 1
+        if ticket.priority == Priority.NORMAL:
+            self._normal_active -= 1
+        client_id = ticket.client_id
+        remaining = self._client_active[client_id] - 1
+        if remaining:
+            self._client_active[client_id] = remaining
+        else:
+            del self._client_active[client_id]
+            # An idle client restarts at the current virtual time
+            if (
+                client_id not in self._waiting
+                and self._client_finish.get(client_id, 0.0) <= self._virtual
+            ):
+                self._client_finish.pop(client_id, None)
+        held = time.monotonic() - ticket.admitted_at
+        self._hold_seconds = (
+            held if not self._hold_seconds else 0.8 * self._hold_seconds + 0.2 * held
+        )
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        """Hand free slots to waiters: critical first, then lowest finish tag."""
+        while self._critical and self.active < self.slots:
+            waiter = self._critical.popleft()
+            waiter.future.set_result(
+                self._admit(waiter.client_id, waiter.priority, waiter.start)
+            )
+        while self._queued and self._normal_room():
+            eligible = [
+                queue[0]
+                for client_id, queue in self._waiting.items()
+                if self._client_active.get(client_id, 0) < self.per_client
+            ]
+            if not eligible:
+                return
+            waiter = min(eligible, key=lambda w: w.finish)
+            self._pop(waiter)
+            waiter.future.set_result(
+                self._admit(waiter.client_id, waiter.priority, waiter.start)
+            )
+
+    def _pop(self, waiter: _Waiter) -> None:
+        queue = self._waiting[waiter.client_id]
+        queue.remove(waiter)
+        if not queue:
+            del self._waiting[waiter.client_id]
+        self._queued -= 1
+
+    def _discard(self, waiter: _Waiter) -> None:
+        waiter.future.cancel()
+        if waiter.priority == Priority.CRITICAL:
+            self._critical.remove(waiter)
+        else:
+            self._pop(waiter)
+
+    def stats(self) -> Dict[str, Any]:
+        """Slot usage, queue depth per client and admission counters."""
+        return {
+            "enabled": self.enabled,
+            "slots": self.slots,
+            "reserved": self.reserved,
+            "per_client": self.per_client,
+            "active": self.active,
+            "queued": self._queued + len(self._critical),
+            "clients": {
+                client_id: {
+                    "active": self._client_active.get(client_id, 0),
+                    "queued": len(self._waiting.get(client_id, ())),
+                }
+                for client_id in sorted({*self._client_active, *self._waiting})
+            },
+            "hold_seconds": round(self._hold_seconds, 4),
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+        }
+
+
+admission = AdmissionController(
+    # The primary's pool only; the rest of the budget belongs to the replicas
+    slots=pool_budget.per_engine,
+    per_client=settings.admission_client_slots,
+    reserved=settings.admission_reserved_slots,
+    max_queue=settings.admission_max_queue,
+    max_wait=settings.admission_max_wait_ms / 1000,
+    weights=settings.admission_client_weights,
+    enabled=settings.admission_enabled,
+)
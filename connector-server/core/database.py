@@ -1,63 +1,257 @@
 """
 Database connection management for the connector API.
 """
-from typing import AsyncGenerator
+import asyncio
+import logging
+from typing import Any, AsyncGenerator, NamedTuple, Optional
 
 from sqlalchemy import text
-from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.pool import AsyncAdaptedQueuePool
-
-from .config import settings
-
-# Convert sync URL to async URL for asyncmy
-async_database_url = settings.database_url.replace("mysql://", "mysql+asyncmy://")
-
-# Async SQLAlchemy setup
-async_engine = create_async_engine(
-    async_database_url,
-    poolclass=AsyncAdaptedQueuePool,
-    pool_size=10,
-    max_overflow=20,
-    pool_timeout=30,
-    pool_recycle=3600,
-    echo=settings.debug,
+from sqlalchemy.ext.asyncio import (
+    AsyncConnection,
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
 )
+from sqlalchemy.ext.declarative import declarative_base
 
-AsyncSessionLocal = async_sessionmaker(
-    bind=async_engine,
-    class_=AsyncSession,
-)
+from .config import Settings, settings
+from .engines import EngineRegistry
+from .metrics import InstrumentedAsyncQueuePool, instrument_engine
+from .routing import DatabaseRouter
+from .timing import time_statements
+
+logger = logging.getLogger(__name__)
+
+
+class PoolBudget(NamedTuple):
+    """Per-process share of the global database connection budget."""
+
+    max_connections: int
+    reserved: int
+    processes: int
+    per_process: int
+    engines: int
+    per_engine: int
+    pool_size: int
+    max_overflow: int
+
+    def describe(self) -> str:
+        """One-line report for the startup log."""
+        return (
+            f"{self.max_connections} connections - {self.reserved} reserved "
+            f"over {self.processes} processes = {self.per_process} per worker, "
+            f"{self.per_engine} for each of {self.engines} engines "
+            f"(pool_size={self.pool_size}, max_overflow={self.max_overflow})"
+        )
+
+
+def compute_pool_budget(config: Settings) -> PoolBudget:
+    """Split ``max_connections`` evenly across every worker of every replica.
+
+    Each process gets the same share, divided again between the primary
+    and read replica engines, so that all pools at full overflow never
+    exceed the limit; ``db_pool_overflow_share`` of each engine's share is
+    only opened under load.
+    """
+    processes = config.api_workers * config.api_replicas
+    engines = 1 + len(config.database_replica_urls)
+    usable = config.max_connections - config.db_reserved_connections
+    per_process = usable // processes
+    per_engine = per_process // engines
+    if per_engine < 1:
+        raise ValueError(
+            f"max_connections={config.max_connections} minus "
+            f"{config.db_reserved_connections} reserved cannot give each of "
+            f"{processes} worker processes a connection to each of {engines} "
+            "database engines"
+        )
+    pool_size = max(per_engine - int(per_engine * config.db_pool_overflow_share), 1)
+    return PoolBudget(
+        config.max_connections,
+        config.db_reserved_connections,
+        processes,
+        per_process,
+        engines,
+        per_engine,
+        pool_size,
+        per_engine - pool_size,
+    )
+
+
+pool_budget = compute_pool_budget(settings)
+
+
+def _async_url(url: str) -> str:
+    """Convert a sync MySQL URL to the asyncmy driver."""
+    return url.replace("mysql://", "mysql+asyncmy://")
+
+
+def _create_engine(url: str, name: str) -> AsyncEngine:
+    """Instrumented engine with this process's per-engine pool budget."""
+    engine = create_async_engine(
+        _async_url(url),
+        poolclass=InstrumentedAsyncQueuePool,
+        pool_logging_name=name,
+        pool_size=pool_budget.pool_size,
+        max_overflow=pool_budget.max_overflow,
+        pool_timeout=settings.connection_timeout,
+        pool_recycle=settings.db_pool_recycle_seconds,
+        echo=settings.debug,
+    )
+    instrument_engine(engine, name)
+    time_statements(engine)
+    return engine
+
+
+async_database_url = _async_url(settings.database_url)
+
+# Created on first use (normally by the app lifespan), not at import, so
+# importing this module neither loads the MySQL driver nor builds pools
+_async_engine: Optional[AsyncEngine] = None
+_db_router: Optional[DatabaseRouter] = None
+_engine_registry: Optional[EngineRegistry] = None
+_session_factory: Optional[async_sessionmaker] = None
 
 Base = declarative_base()
 
 
+def get_async_engine() -> AsyncEngine:
+    """Get the async engine for raw connection-level work such as streaming."""
+    global _async_engine
+    if _async_engine is None:
+        _async_engine = _create_engine(settings.database_url, "primary")
+    return _async_engine
+
+
+def get_db_router() -> DatabaseRouter:
+    """Get the router that picks the primary or a replica per statement."""
+    global _db_router
+    if _db_router is None:
+        _db_router = DatabaseRouter(
+            get_async_engine(),
+            [
+                _create_engine(url, f"replica{i}")
+                for i, url in enumerate(settings.database_replica_urls)
+            ],
+            max_lag=settings.replica_max_lag_seconds,
+        )
+    return _db_router
+
+
+def get_engine_registry() -> EngineRegistry:
+    """Get the registry of engines for other databases by connection_id."""
+    global _engine_registry
+    if _engine_registry is None:
+        _engine_registry = EngineRegistry(
+            settings.database_targets,
+            max_engines=settings.target_max_engines,
+            idle_timeout=settings.target_idle_seconds,
+        )
+    return _engine_registry
+
+
+def get_session_factory() -> async_sessionmaker:
+    """Get the AsyncSession factory bound to the primary engine."""
+    global _session_factory
+    if _session_factory is None:
+        _session_factory = async_sessionmaker(
+            bind=get_async_engine(),
+            class_=AsyncSession,
+            # Objects stay usable after commit without a refresh round trip
+            expire_on_commit=False,
+        )
+    return _session_factory
+
+
 async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
     """Get async database session."""
-    async with AsyncSessionLocal() as session:
+    async with get_session_factory()() as session:
         try:
             yield session
         finally:
             await session.close()
 
 
+async def close_database() -> None:
+    """Dispose every engine created so far; later use creates new ones."""
+    global _async_engine, _db_router, _engine_registry, _session_factory
+    if _db_router is not None:
+        await _db_router.dispose()
+    if _engine_registry is not None:
+        await _engine_registry.dispose_all()
+    if _async_engine is not None:
+        await _async_engine.dispose()
+    _async_engine = _db_router = _engine_registry = _session_factory = None
+
+
+_LAZY_ATTRIBUTES = {
+    "async_engine": get_async_engine,
+    "db_router": get_db_router,
+    "engine_registry": get_engine_registry,
+    "AsyncSessionLocal": get_session_factory,
+}
+
+
+def __getattr__(name: str) -> Any:
+    """Keep ``from core.database import async_engine`` and friends working."""
+    if name in _LAZY_ATTRIBUTES:
+        return _LAZY_ATTRIBUTES[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# Enough for the first burst of requests without a connect storm at startup
+WARM_UP_CONNECTIONS = 4
+
+
+async def warm_up_pool(engine: AsyncEngine, connections: int) -> int:
+    """Open ``connections`` pooled connections at once, then return them.
+
+    Holding them concurrently forces distinct connections, so the first
+    requests find connected (and TLS-negotiated) sockets in the pool.
+    Returns how many connections were opened.
+    """
+
+    async def open_connection() -> AsyncConnection:
+        return await engine.connect().start()
+
+    results = await asyncio.gather(
+        *(open_connection() for _ in range(connections)), return_exceptions=True
+    )
+    opened = [conn for conn in results if isinstance(conn, AsyncConnection)]
+    for conn in opened:
+        await conn.close()
+    errors = [e for e in results if isinstance(e, BaseException)]
+    if errors:
+        logger.warning(
+            "Database pool warm-up opened %d of %d connections: %s",
+            len(opened),
+            connections,
+            errors[0],
+        )
+    return len(opened)
+
+
 async def create_database():
     """Create all database tables asynchronously."""
-    async with async_engine.begin() as conn:
+    async with get_async_engine().begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
 
 
 async def drop_database():
     """Drop all database tables asynchronously."""
-    async with async_engine.begin() as conn:
+    async with get_async_engine().begin() as conn:
         await conn.run_sync(Base.metadata.drop_all)
 
 
 async def test_connection() -> bool:
-    """Test async database connection."""
+    """Test async database connection, ahead of any queued query work."""
+    from .admission import Priority, admission  # Imports this module
+
     try:
-        async with async_engine.begin() as conn:
-            await conn.execute(text("SELECT 1"))
+        async with admission.admit("health", Priority.CRITICAL):
+            async with get_async_engine().begin() as conn:
+                await conn.execute(text("SELECT 1"))
         return True
     except Exception:
         return False
@@ -71,29 +265,3 @@ async def get_database_info() -> dict:
         ),
         "engine_type": "async",
     }
-
-
-# Legacy sync functions for backward compatibility
-def get_db():
-    """Get database session (deprecated - use get_async_db)."""
-    raise DeprecationWarning("Use get_async_db() for async operations")
-
-
-def create_database_sync():
-    """Create all database tables (deprecated - use create_database)."""
-    raise DeprecationWarning("Use create_database() for async operations")
-
-
-def drop_database_sync():
-    """Drop all database tables (deprecated - use drop_database)."""
-    raise DeprecationWarning("Use drop_database() for async operations")
-
-
-def test_connection_sync() -> bool:
-    """Test database connection (deprecated - use test_connection)."""
-    raise DeprecationWarning("Use test_connection() for async operations")
-
-
-def get_database_info_sync() -> dict:
-    """Get database connection information (deprecated - use get_database_info)."""
-    raise DeprecationWarning("Use get_database_info() for async operations")
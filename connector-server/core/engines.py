@@ -0,0 +1,206 @@
+"""
+Lazily created engines for the databases named by ``connection_id``.
+
+Each configured target gets its own ``AsyncEngine`` and pool limits, but
+only once a request uses it. Engines nobody has used for ``idle_timeout``
+are disposed, and opening more than ``max_engines`` disposes the least
+recently used idle one, so hundreds of configured targets cost sockets
+only for the ones in use. Engines with checked-out connections (such as
+an open result stream) or outstanding leases are never disposed.
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Mapping, Optional
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+from .config import DatabaseTarget, settings
+from .routing import Backend, Lease
+from .timing import TimedAsyncQueuePool, time_statements
+
+logger = logging.getLogger(__name__)
+
+
+class UnknownTargetError(KeyError):
+    """The connection_id is not a configured target."""
+
+
+def create_target_engine(name: str, target: DatabaseTarget) -> AsyncEngine:
+    """Engine for one target with its own pool limits."""
+    engine = create_async_engine(
+        target.url.replace("mysql://", "mysql+asyncmy://"),
+        poolclass=TimedAsyncQueuePool,
+        pool_size=target.pool_size,
+        max_overflow=target.max_overflow,
+        pool_timeout=settings.connection_timeout,
+        pool_recycle=settings.db_pool_recycle_seconds,
+        pool_logging_name=f"target:{name}",
+        echo=settings.debug,
+    )
+    time_statements(engine)
+    return engine
+
+
+class _OpenEngine:
+    """A live engine, its request counter and its connection counters."""
+
+    __slots__ = (
+        "engine",
+        "backend",
+        "created_at",
+        "last_used",
+        "in_use",
+        "connections",
+    )
+
+    def __init__(self, name: str, engine: AsyncEngine):
+        self.engine = engine
+        self.backend = Backend(name, engine)
+        self.created_at = self.last_used = time.monotonic()
+        self.in_use = 0
+        self.connections = 0
+
+    @property
+    def busy(self) -> bool:
+        # Requests hold a lease before their first checkout
+        return self.in_use > 0 or self.backend.outstanding > 0
+
+
+class EngineRegistry:
+    """Per-worker registry of target engines with LRU and idle disposal."""
+
+    def __init__(
+        self,
+        targets: Mapping[str, DatabaseTarget],
+        max_engines: int = 32,
+        idle_timeout: float = 300.0,
+        engine_factory: Callable[[str, DatabaseTarget], AsyncEngine] = (
+            create_target_engine
+        ),
+    ):
+        self.targets = dict(targets)
+        self.max_engines = max_engines
+        self.idle_timeout = idle_timeout
+        self._engine_factory = engine_factory
+        self._open: "OrderedDict[str, _OpenEngine]" = OrderedDict()
+        self.created = 0
+        self.disposed = 0
+
+    async def acquire(self, connection_id: str) -> Lease:
+        """Lease on the engine for ``connection_id``, creating it on first use.
+
+        The engine is not disposed while the lease is held.
+        """
+        entry = self._open.get(connection_id)
+        if entry is None:
+            if connection_id not in self.targets:
+                raise UnknownTargetError(connection_id)
+            # Creation does not await, so concurrent requests cannot race it
+            entry = self._create(connection_id)
+            await self._evict_over_capacity(keep=connection_id)
+        else:
+            self._open.move_to_end(connection_id)
+        entry.last_used = time.monotonic()
+        return Lease(entry.backend)
+
+    def _create(self, connection_id: str) -> _OpenEngine:
+        engine = self._engine_factory(connection_id, self.targets[connection_id])
+        entry = _OpenEngine(connection_id, engine)
+
+        def on_checkout(*args: Any) -> None:
+            entry.in_use += 1
+            entry.last_used = time.monotonic()
+
+        def on_checkin(*args: Any) -> None:
+            entry.in_use -= 1
+            entry.last_used = time.monotonic()
+
+        def on_connect(*args: Any) -> None:
+            entry.connections += 1
+
+        def on_close(*args: Any) -> None:
+            entry.connections -= 1
+
+        sync_engine = engine.sync_engine
+        event.listen(sync_engine, "checkout", on_checkout)
+        event.listen(sync_engine, "checkin", on_checkin)
+        event.listen(sync_engine, "connect", on_connect)
+        event.listen(sync_engine, "close", on_close)
+        self._open[connection_id] = entry
+        self.created += 1
+        logger.info("Opened engine for target %s", connection_id)
+        return entry
+
+    async def _evict_over_capacity(self, keep: str) -> None:
+        excess = len(self._open) - self.max_engines
+        # Oldest first; engines still serving a request are skipped
+        candidates = [
+            name
+            for name, entry in self._open.items()
+            if not entry.busy and name != keep
+        ]
+        for name in candidates[:excess]:
+            await self._dispose(name)
+
+    async def evict_idle(self) -> int:
+        """Dispose engines idle for longer than ``idle_timeout``."""
+        cutoff = time.monotonic() - self.idle_timeout
+        idle = [
+            name
+            for name, entry in self._open.items()
+            if not entry.busy and entry.last_used < cutoff
+        ]
+        for name in idle:
+            await self._dispose(name)
+        return len(idle)
+
+    async def _dispose(self, connection_id: str) -> None:
+        entry = self._open.pop(connection_id, None)
+        if entry is None:
+            return
+        await entry.engine.dispose()
+        self.disposed += 1
+        logger.info("Disposed engine for target %s", connection_id)
+
+    async def run(self, interval: float) -> None:
+        """Dispose idle engines periodically until cancelled."""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.evict_idle()
+            except Exception as e:
+                logger.warning("Idle engine disposal failed: %s", e)
+
+    def stats(self) -> Dict[str, Any]:
+        """Open engines and per-target pool usage."""
+        now = time.monotonic()
+        targets: Dict[str, Optional[Dict[str, Any]]] = {}
+        for name in self.targets:
+            entry = self._open.get(name)
+            if entry is None:
+                targets[name] = None
+                continue
+            pool = entry.engine.sync_engine.pool
+            targets[name] = {
+                "pool": pool.status(),
+                "outstanding": entry.backend.outstanding,
+                "in_use": entry.in_use,
+                "connections": entry.connections,
+                "idle_seconds": round(now - entry.last_used, 3),
+                "age_seconds": round(now - entry.created_at, 3),
+            }
+        return {
+            "open_engines": len(self._open),
+            "max_engines": self.max_engines,
+            "created": self.created,
+            "disposed": self.disposed,
+            "targets": targets,
+        }
+
+    async def dispose_all(self) -> None:
+        """Dispose every open engine, e.g. at shutdown."""
+        for name in list(self._open):
+            await self._dispose(name)
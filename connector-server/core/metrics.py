@@ -0,0 +1,202 @@
+"""
+Prometheus metrics for database pools, queries and replica routing.
+
+With several uvicorn workers each process keeps its own pool, so metric
+values are written to ``PROMETHEUS_MULTIPROC_DIR`` when that is set and
+``render_metrics`` merges every worker's files at scrape time; gauges sum
+over live workers only. Without it, the process-local registry is used.
+"""
+import os
+import time
+from typing import Any, Tuple
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, Pool
+
+from services.sql_analyzer import analyze_sql
+
+from .timing import TimedAsyncQueuePool
+
+_LATENCY_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+)
+
+POOL_CHECKOUT_WAIT = Histogram(
+    "connector_db_pool_checkout_wait_seconds",
+    "Time spent obtaining a connection from the pool, including connecting",
+    ["pool"],
+    buckets=_LATENCY_BUCKETS,
+)
+POOL_IN_USE = Gauge(
+    "connector_db_pool_in_use_connections",
+    "Connections currently checked out",
+    ["pool"],
+    multiprocess_mode="livesum",
+)
+POOL_IDLE = Gauge(
+    "connector_db_pool_idle_connections",
+    "Connections idle in the pool",
+    ["pool"],
+    multiprocess_mode="livesum",
+)
+POOL_OVERFLOW = Gauge(
+    "connector_db_pool_overflow_connections",
+    "Connections open beyond pool_size",
+    ["pool"],
+    multiprocess_mode="livesum",
+)
+CONNECTION_AGE = Histogram(
+    "connector_db_connection_age_seconds",
+    "Age of database connections when they are closed",
+    ["pool"],
+    buckets=(1, 10, 60, 300, 900, 1800, 3600, 7200, 14400),
+)
+CONNECTIONS_OPENED = Counter(
+    "connector_db_connections_opened",
+    "DBAPI connections opened",
+    ["pool"],
+)
+CONNECTIONS_RECYCLED = Counter(
+    "connector_db_connections_recycled",
+    "Connections replaced because they exceeded pool_recycle",
+    ["pool"],
+)
+CONNECTIONS_INVALIDATED = Counter(
+    "connector_db_connections_invalidated",
+    "Connections discarded after an error or explicit invalidation",
+    ["pool"],
+)
+QUERY_DURATION = Histogram(
+    "connector_db_query_duration_seconds",
+    "Statement execution time by statement type",
+    ["pool", "statement_type"],
+    buckets=_LATENCY_BUCKETS,
+)
+QUERIES_ROUTED = Counter(
+    "connector_db_queries_routed",
+    "Query endpoint statements by the database they were routed to",
+    ["target"],
+)
+REPLICA_LAG = Gauge(
+    "connector_db_replica_lag_seconds",
+    "Last measured replication lag; -1 when unknown or unreachable",
+    ["replica"],
+    multiprocess_mode="livemostrecent",
+)
+
+
+class InstrumentedAsyncQueuePool(TimedAsyncQueuePool):
+    """Timed pool that also records checkout waits in a histogram.
+
+    The pool is labelled by ``pool_logging_name``.
+    """
+
+    def _checkout_finished(self, seconds: float) -> None:
+        super()._checkout_finished(seconds)
+        POOL_CHECKOUT_WAIT.labels(self._metrics_label()).observe(seconds)
+
+    def _metrics_label(self) -> str:
+        return self.logging_name or "default"
+
+
+def instrument_engine(engine: AsyncEngine, name: str) -> None:
+    """Attach pool and query metrics to an engine under the label ``name``."""
+    sync_engine = engine.sync_engine
+
+    def update_gauges(returning: int = 0) -> None:
+        pool: Pool = sync_engine.pool
+        if isinstance(pool, AsyncAdaptedQueuePool):
+            POOL_IN_USE.labels(name).set(pool.checkedout() - returning)
+            POOL_IDLE.labels(name).set(pool.checkedin() + returning)
+            POOL_OVERFLOW.labels(name).set(max(pool.overflow(), 0))
+
+    @event.listens_for(sync_engine, "connect")
+    def on_connect(dbapi_connection: Any, record: Any) -> None:
+        record.info["connected_at"] = time.monotonic()
+        CONNECTIONS_OPENED.labels(name).inc()
+        # record_info outlives the DBAPI connection; a second connect on the
+        # same record is a recycle unless an invalidation caused it
+        if record.record_info.get("connected") and not record.record_info.pop(
+            "invalidated", False
+        ):
+            CONNECTIONS_RECYCLED.labels(name).inc()
+        record.record_info["connected"] = True
+
+    @event.listens_for(sync_engine, "invalidate")
+    def on_invalidate(dbapi_connection: Any, record: Any, exception: Any) -> None:
+        record.record_info["invalidated"] = True
+        CONNECTIONS_INVALIDATED.labels(name).inc()
+
+    @event.listens_for(sync_engine, "close")
+    def on_close(dbapi_connection: Any, record: Any) -> None:
+        connected_at = record.info.get("connected_at")
+        if connected_at is not None:
+            CONNECTION_AGE.labels(name).observe(time.monotonic() - connected_at)
+
+    @event.listens_for(sync_engine, "checkout")
+    def on_checkout(dbapi_connection: Any, record: Any, proxy: Any) -> None:
+        update_gauges()
+
+    @event.listens_for(sync_engine, "checkin")
+    def on_checkin(dbapi_connection: Any, record: Any) -> None:
+        # Fires before the pool counts the connection as returned
+        update_gauges(returning=1)
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_execute(conn: Any, cursor: Any, statement: str, *args: Any) -> None:
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_execute(conn: Any, cursor: Any, statement: str, *args: Any) -> None:
+        started = conn.info["query_started"].pop()
+        QUERY_DURATION.labels(
+            name, analyze_sql(statement).statement_type.value
+        ).observe(time.perf_counter() - started)
+
+    @event.listens_for(sync_engine, "handle_error")
+    def on_error(context: Any) -> None:
+        # after_cursor_execute is skipped when the statement fails
+        if context.connection is not None:
+            stack = context.connection.info.get("query_started")
+            if stack:
+                stack.pop()
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    """Render all metrics in Prometheus text format, merged across workers."""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+
+def mark_worker_exited() -> None:
+    """Drop this worker's live gauges from the multiprocess files."""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        multiprocess.mark_process_dead(os.getpid())
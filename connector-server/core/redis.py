@@ -0,0 +1,37 @@
+"""
+Redis connection management for the connector API.
+"""
+from typing import Optional
+
+from redis.asyncio import Redis
+
+from utils.cache import InvalidationBus
+
+from .config import settings
+
+_redis: Optional[Redis] = None
+
+
+def get_redis() -> Redis:
+    """Get the shared async Redis client, creating it on first use."""
+    global _redis
+    if _redis is None:
+        _redis = Redis.from_url(
+            settings.redis_url,
+            password=settings.redis_password,
+            socket_timeout=settings.redis_socket_timeout,
+            socket_connect_timeout=settings.redis_socket_timeout,
+        )
+    return _redis
+
+
+async def close_redis() -> None:
+    """Close the shared Redis client."""
+    global _redis
+    if _redis is not None:
+        await _redis.aclose()
+        _redis = None
+
+
+# Cross-worker cache invalidation; each worker runs invalidation_bus.listen()
+invalidation_bus = InvalidationBus(get_redis)
@@ -0,0 +1,155 @@
+"""
+Read/write routing across a primary database and read replicas.
+
+Writes, DDL and anything not known to be a plain read go to the primary.
+Reads go to the replica with the fewest outstanding requests among those
+whose replication lag is known and within ``max_lag``; when none qualify
+they fall back to the primary. Lag is polled in the background, so a
+replica is only used after its first successful check.
+"""
+import asyncio
+import itertools
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from services.sql_analyzer import StatementType
+
+from .metrics import QUERIES_ROUTED, REPLICA_LAG
+
+logger = logging.getLogger(__name__)
+
+LagProbe = Callable[[AsyncEngine], Awaitable[Optional[float]]]
+
+
+async def replica_lag(engine: AsyncEngine) -> Optional[float]:
+    """Seconds a MySQL replica is behind its source.
+
+    Returns None when the server is not replicating or the SQL thread is
+    stopped, which makes the replica ineligible.
+    """
+    async with engine.connect() as conn:
+        row = (await conn.execute(text("SHOW REPLICA STATUS"))).mappings().first()
+    if row is None or row.get("Seconds_Behind_Source") is None:
+        return None
+    return float(row["Seconds_Behind_Source"])
+
+
+class Backend:
+    """One database server and the requests currently routed to it."""
+
+    def __init__(self, name: str, engine: AsyncEngine):
+        self.name = name
+        self.engine = engine
+        self.outstanding = 0
+        self.lag: Optional[float] = None
+        self.error: Optional[str] = None
+
+
+class Lease:
+    """A routed request; ``release`` once its connection is returned."""
+
+    __slots__ = ("backend", "_released")
+
+    def __init__(self, backend: Backend):
+        self.backend = backend
+        self._released = False
+        backend.outstanding += 1
+
+    @property
+    def engine(self) -> AsyncEngine:
+        return self.backend.engine
+
+    @property
+    def target(self) -> str:
+        return self.backend.name
+
+    def release(self) -> None:
+        """Stop counting this request against its backend; idempotent."""
+        if not self._released:
+            self._released = True
+            self.backend.outstanding -= 1
+
+
+class DatabaseRouter:
+    """Chooses the engine for each statement by type, load and lag."""
+
+    def __init__(
+        self,
+        primary: AsyncEngine,
+        replicas: Sequence[AsyncEngine] = (),
+        max_lag: float = 5.0,
+        lag_probe: LagProbe = replica_lag,
+    ):
+        self.primary = Backend("primary", primary)
+        self.replicas = [
+            Backend(f"replica{i}", engine) for i, engine in enumerate(replicas)
+        ]
+        self.max_lag = max_lag
+        self._lag_probe = lag_probe
+        # Rotates the scan start so idle replicas share ties
+        self._offset = itertools.count()
+
+    def acquire(self, statement_type: StatementType) -> Lease:
+        """Route a statement; reads may go to a replica, all else to the primary."""
+        backend = self.primary
+        if statement_type == StatementType.READ:
+            backend = self._choose_replica() or self.primary
+        QUERIES_ROUTED.labels(backend.name).inc()
+        return Lease(backend)
+
+    def _choose_replica(self) -> Optional[Backend]:
+        eligible = [
+            r for r in self.replicas if r.lag is not None and r.lag <= self.max_lag
+        ]
+        if not eligible:
+            return None
+        start = next(self._offset) % len(eligible)
+        rotated = eligible[start:] + eligible[:start]
+        return min(rotated, key=lambda r: r.outstanding)
+
+    async def check_lag(self, timeout: float = 5.0) -> None:
+        """Probe every replica; unreachable replicas become ineligible."""
+        await asyncio.gather(*(self._check(r, timeout) for r in self.replicas))
+
+    async def _check(self, replica: Backend, timeout: float) -> None:
+        try:
+            lag = await asyncio.wait_for(self._lag_probe(replica.engine), timeout)
+        except Exception as e:
+            if replica.error is None:
+                logger.warning("Replica %s unavailable: %s", replica.name, e)
+            replica.lag, replica.error = None, str(e) or type(e).__name__
+        else:
+            if replica.error is not None:
+                logger.info("Replica %s available again", replica.name)
+            replica.lag, replica.error = lag, None
+        REPLICA_LAG.labels(replica.name).set(
+            replica.lag if replica.lag is not None else -1
+        )
+
+    async def run(self, interval: float) -> None:
+        """Poll replica lag until cancelled."""
+        while True:
+            await self.check_lag(timeout=interval)
+            await asyncio.sleep(interval)
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """Per-backend load and lag for the admin endpoint."""
+        return [
+            {
+                "name": b.name,
+                "outstanding": b.outstanding,
+                "lag_seconds": b.lag,
+                "eligible": b is self.primary
+                or (b.lag is not None and b.lag <= self.max_lag),
+                "error": b.error,
+            }
+            for b in [self.primary, *self.replicas]
+        ]
+
+    async def dispose(self) -> None:
+        """Close the replica pools; the primary engine is owned elsewhere."""
+        for replica in self.replicas:
+            await replica.engine.dispose()
@@ -1,39 +1,148 @@
 """
 Security utilities for the database connector API.
 """
+import asyncio
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import TYPE_CHECKING, Any, Callable, Optional, TypeVar
 
-from jose import JWTError, jwt
-from passlib.context import CryptContext
 from pydantic import BaseModel
 
 from .config import settings
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+if TYPE_CHECKING:
+    from passlib.context import CryptContext
+
+# passlib and jose are imported on first use; workers that never hash a
+# password or decode a token do not pay for loading them
+_pwd_context: Optional["CryptContext"] = None
+
+T = TypeVar("T")
+
+
+class PasswordHashingBusy(Exception):
+    """Raised when the password hashing pool cannot take more work."""
 
 
 class Token(BaseModel):
     """JWT Token model."""
+
     access_token: str
     token_type: str
 
 
 class TokenData(BaseModel):
     """Token data model."""
+
     client_id: Optional[str] = None
     scopes: list[str] = []
+    expires_at: Optional[datetime] = None
+
+
+def get_pwd_context() -> "CryptContext":
+    """Get the bcrypt password context, creating it on first use."""
+    global _pwd_context
+    if _pwd_context is None:
+        from passlib.context import CryptContext
+
+        _pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    return _pwd_context
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against its hash."""
-    return pwd_context.verify(plain_password, hashed_password)
+    return get_pwd_context().verify(plain_password, hashed_password)
 
 
 def get_password_hash(password: str) -> str:
     """Hash a password."""
-    return pwd_context.hash(password)
+    return get_pwd_context().hash(password)
+
+
+class PasswordHasher:
+    """Run bcrypt on a dedicated, bounded thread pool.
+
+    bcrypt takes tens of milliseconds per call and would stall the event
+    loop if run inline. The pool keeps that work off the loop and caps how
+    much of it can pile up: at most ``max_workers`` calls run at once and
+    ``max_pending`` more may wait, each for up to ``timeout`` seconds.
+    Anything beyond that raises ``PasswordHashingBusy`` straight away.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 4,
+        max_pending: int = 64,
+        timeout: float = 5.0,
+        context: Optional["CryptContext"] = None,
+    ):
+        self._context = context
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._in_flight = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    @property
+    def context(self) -> "CryptContext":
+        """The given context, or the shared bcrypt context."""
+        if self._context is None:
+            self._context = get_pwd_context()
+        return self._context
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        """Verify a password against its hash off the event loop."""
+        return await self._run(self.context.verify, plain_password, hashed_password)
+
+    async def hash(self, password: str) -> str:
+        """Hash a password off the event loop."""
+        return await self._run(self.context.hash, password)
+
+    async def _run(self, func: Callable[..., T], *args: Any) -> T:
+        if self._in_flight >= self.max_workers + self.max_pending:
+            self.rejected += 1
+            raise PasswordHashingBusy("Too many concurrent password checks")
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                self.max_workers, thread_name_prefix="password-hash"
+            )
+        loop = asyncio.get_running_loop()
+        future = self._executor.submit(func, *args)
+        self._in_flight += 1
+        # A call that timed out keeps its place until its thread is done
+        future.add_done_callback(lambda done: self._call_done(loop, done))
+        try:
+            # Timing out cancels the call if it has not started yet
+            return await asyncio.wait_for(asyncio.wrap_future(future), self.timeout)
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            raise PasswordHashingBusy("Timed out waiting for password hashing")
+
+    def _call_done(self, loop: asyncio.AbstractEventLoop, future: Future) -> None:
+        # Runs on the worker thread; the count belongs to the event loop
+        try:
+            loop.call_soon_threadsafe(self._release)
+        except RuntimeError:
+            # The loop has closed, so nothing is counting any more
+            pass
+
+    def _release(self) -> None:
+        self._in_flight -= 1
+
+    def shutdown(self) -> None:
+        """Stop the pool; queued calls are cancelled."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+password_hasher = PasswordHasher(
+    max_workers=settings.password_hash_workers,
+    max_pending=settings.password_hash_max_pending,
+    timeout=settings.password_hash_timeout_seconds,
+)
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
@@ -44,6 +153,8 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     else:
         expire = datetime.utcnow() + timedelta(minutes=15)
     to_encode.update({"exp": expire})
+    from jose import jwt
+
     encoded_jwt = jwt.encode(
         to_encode, settings.secret_key, algorithm=settings.algorithm
     )
@@ -52,6 +163,8 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
 
 def verify_token(token: str, credentials_exception) -> TokenData:
     """Verify and decode a JWT token."""
+    from jose import JWTError, jwt
+
     try:
         payload = jwt.decode(
             token, settings.secret_key, algorithms=[settings.algorithm]
@@ -60,7 +173,12 @@ def verify_token(token: str, credentials_exception) -> TokenData:
         scopes: list = payload.get("scopes", [])
         if client_id is None:
             raise credentials_exception
-        token_data = TokenData(client_id=str(client_id), scopes=scopes)
+        exp = payload.get("exp")
+        token_data = TokenData(
+            client_id=str(client_id),
+            scopes=scopes,
+            expires_at=datetime.utcfromtimestamp(exp) if exp is not None else None,
+        )
     except JWTError:
         raise credentials_exception
     return token_data
@@ -72,17 +190,19 @@ def generate_api_key() -> str:
     import string
 
     alphabet = string.ascii_letters + string.digits
-    return ''.join(secrets.choice(alphabet) for _ in range(32))
+    return "".join(secrets.choice(alphabet) for _ in range(32))
 
 
 def hash_api_key(api_key: str) -> str:
     """Hash an API key for storage."""
     import hashlib
+
     return hashlib.sha256(api_key.encode()).hexdigest()
 
 
 def validate_api_key_format(api_key: str) -> bool:
     """Validate API key format."""
     import re
+
     # API keys should be alphanumeric, 32-64 characters
-    return bool(re.match(r'^[a-zA-Z0-9]{32,64}$', api_key))
+    return bool(re.match(r"^[a-zA-Z0-9]{32,64}$", api_key))
@@ -0,0 +1,156 @@
+"""
+Per-request phase timings reported in the ``Server-Timing`` header.
+
+``ServerTimingMiddleware`` puts a ``RequestTimings`` in a context variable
+for sampled requests; hot-path code adds to it with ``timed`` or
+``record``. Both are a single context variable lookup when the request is
+not sampled. The context reaches SQLAlchemy's sync event hooks because its
+greenlets inherit the caller's context.
+
+Phases may nest: ``auth`` includes the pool wait and SQL of the key or
+user lookup, which are also counted under ``pool`` and ``sql``.
+"""
+import time
+from contextlib import nullcontext
+from contextvars import ContextVar
+from typing import Any, ContextManager, Dict, Optional
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+PHASES = ("auth", "pool", "sql", "fetch", "serialize")
+
+
+class RequestTimings:
+    """Accumulated seconds and event counts per phase for one request."""
+
+    __slots__ = ("started", "durations", "counts")
+
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self.durations: Dict[str, float] = {}
+        self.counts: Dict[str, int] = {}
+
+    def add(self, phase: str, seconds: float) -> None:
+        self.durations[phase] = self.durations.get(phase, 0.0) + seconds
+        self.counts[phase] = self.counts.get(phase, 0) + 1
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def header(self) -> str:
+        """``Server-Timing`` value: phases so far plus ``app`` time until now."""
+        metrics = [
+            f"{phase};dur={self.durations[phase] * 1000:.3f}"
+            for phase in PHASES
+            if phase in self.durations
+        ]
+        metrics.append(f"app;dur={self.elapsed() * 1000:.3f}")
+        return ", ".join(metrics)
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Milliseconds and counts per phase, for the structured log line."""
+        return {
+            phase: {
+                "ms": round(self.durations[phase] * 1000, 3),
+                "count": self.counts[phase],
+            }
+            for phase in PHASES
+            if phase in self.durations
+        }
+
+
+_current: ContextVar[Optional[RequestTimings]] = ContextVar(
+    "request_timings", default=None
+)
+
+
+def start_request(timings: Optional[RequestTimings] = None) -> Any:
+    """Begin timing the current request; returns a token for ``end_request``."""
+    return _current.set(RequestTimings() if timings is None else timings)
+
+
+def end_request(token: Any) -> None:
+    _current.reset(token)
+
+
+def current_timings() -> Optional[RequestTimings]:
+    """Timings of the current request, or None when it is not sampled."""
+    return _current.get()
+
+
+def record(phase: str, seconds: float) -> None:
+    """Add a measured duration to the current request, if sampled."""
+    timings = _current.get()
+    if timings is not None:
+        timings.add(phase, seconds)
+
+
+class _PhaseTimer:
+    """Context manager adding the time spent inside it to one phase."""
+
+    __slots__ = ("timings", "phase", "started")
+
+    def __init__(self, timings: RequestTimings, phase: str):
+        self.timings = timings
+        self.phase = phase
+
+    def __enter__(self) -> None:
+        self.started = time.perf_counter()
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.timings.add(self.phase, time.perf_counter() - self.started)
+
+
+_UNSAMPLED = nullcontext()
+
+
+def timed(phase: str) -> ContextManager[None]:
+    """Time the enclosed block as ``phase`` of the current request."""
+    timings = _current.get()
+    if timings is None:
+        return _UNSAMPLED
+    return _PhaseTimer(timings, phase)
+
+
+class TimedAsyncQueuePool(AsyncAdaptedQueuePool):
+    """Async queue pool that reports checkout waits as the ``pool`` phase.
+
+    Pool events only fire once a connection has been obtained, so the wait
+    (including connecting) is measured around ``_do_get``.
+    """
+
+    def _do_get(self) -> Any:
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            self._checkout_finished(time.perf_counter() - started)
+
+    def _checkout_finished(self, seconds: float) -> None:
+        record("pool", seconds)
+
+
+def time_statements(engine: AsyncEngine) -> None:
+    """Report statement execution on ``engine`` as the ``sql`` phase."""
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_execute(conn: Any, *args: Any) -> None:
+        if _current.get() is not None:
+            conn.info["timing_started"] = time.perf_counter()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_execute(conn: Any, *args: Any) -> None:
+        started = conn.info.pop("timing_started", None)
+        if started is not None:
+            record("sql", time.perf_counter() - started)
+
+    @event.listens_for(sync_engine, "handle_error")
+    def on_error(context: Any) -> None:
+        started = context.connection is not None and context.connection.info.pop(
+            "timing_started", None
+        )
+        if started:
+            record("sql", time.perf_counter() - started)
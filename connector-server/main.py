@@ -1,15 +1,93 @@
+import asyncio
+import hmac
+import logging
+from contextlib import asynccontextmanager, suppress
 from datetime import datetime
-from fastapi import FastAPI
+
+from fastapi import FastAPI, Request, Response, status
 from fastapi.middleware.cors import CORSMiddleware
-import uvicorn
+from fastapi.responses import JSONResponse
 
-from core.config import settings
 from api.router import api_router
+from core.admission import AdmissionRejected
+from core.config import settings
+from core.database import (
+    WARM_UP_CONNECTIONS,
+    close_database,
+    get_async_engine,
+    get_db_router,
+    get_engine_registry,
+    pool_budget,
+    warm_up_pool,
+)
+from core.metrics import mark_worker_exited, render_metrics
+from core.redis import close_redis, invalidation_bus
+from core.security import PasswordHashingBusy, password_hasher
+from middleware.rate_limit import RateLimitHeadersMiddleware
+from middleware.server_timing import ServerTimingMiddleware
+from services.audit_logger import query_history_writer
+from services.history_retention import history_retention
+from services.usage_tracker import last_used_buffer
+
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Create per-worker clients and start and stop background tasks.
+
+    Engines are built here rather than at import, so importing the app
+    (tests, tooling, the supervisor's parent process) opens nothing.
+    """
+    logger.info("Database pool budget: %s", pool_budget.describe())
+    db_router = get_db_router()
+    engine_registry = get_engine_registry()
+    if settings.db_pool_warmup:
+        await warm_up_pool(
+            get_async_engine(), min(pool_budget.pool_size, WARM_UP_CONNECTIONS)
+        )
+    tasks = [
+        asyncio.create_task(invalidation_bus.listen()),
+        asyncio.create_task(last_used_buffer.run(settings.last_used_flush_seconds)),
+    ]
+    if db_router.replicas:
+        tasks.append(
+            asyncio.create_task(db_router.run(settings.replica_lag_check_seconds))
+        )
+    if engine_registry.targets:
+        tasks.append(
+            asyncio.create_task(
+                engine_registry.run(min(settings.target_idle_seconds, 60))
+            )
+        )
+    tasks.append(
+        asyncio.create_task(
+            history_retention.run(settings.history_retention_interval_seconds)
+        )
+    )
+    query_history_writer.start()
+    yield
+    await query_history_writer.stop()
+    for task in tasks:
+        task.cancel()
+    for task in tasks:
+        with suppress(asyncio.CancelledError):
+            await task
+    try:
+        await last_used_buffer.flush()
+    except Exception as e:
+        logger.warning("Final API key last_used flush failed: %s", e)
+    await close_database()
+    await close_redis()
+    password_hasher.shutdown()
+    mark_worker_exited()
+
 
 app = FastAPI(
     title="Database Connector API",
     description="Secure API for database operations",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 # CORS
@@ -21,10 +99,40 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Rate limit headers set by auth.dependencies.rate_limit_check
+app.add_middleware(RateLimitHeadersMiddleware)
+
+# Outermost, so the app time covers the other middleware too
+app.add_middleware(
+    ServerTimingMiddleware,
+    sample_rate=settings.server_timing_sample_rate,
+    log=settings.server_timing_log,
+)
+
 # Include API routes
 app.include_router(api_router, prefix="/api/v1")
 
 
+@app.exception_handler(AdmissionRejected)
+async def admission_rejected_handler(request: Request, exc: AdmissionRejected):
+    """Turn a client away early rather than let it time out on the pool."""
+    return JSONResponse(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        content={"detail": str(exc)},
+        headers=exc.headers(),
+    )
+
+
+@app.exception_handler(PasswordHashingBusy)
+async def password_hashing_busy_handler(request: Request, exc: PasswordHashingBusy):
+    """Shed login load instead of queueing it without bound."""
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": str(exc)},
+        headers={"Retry-After": "1"},
+    )
+
+
 @app.get("/")
 async def root():
     """
@@ -42,30 +150,20 @@ async def root():
             "docs": "/docs",
             "redoc": "/redoc",
             "openapi": "/openapi.json",
-            "api_health": "/api/v1/health"
+            "api_health": "/api/v1/health",
         },
         "services": {
-            "mysql": {
-                "host": "localhost",
-                "port": 3307,
-                "database": "connector_db"
-            },
-            "redis": {
-                "host": "localhost",
-                "port": 6380
-            },
-            "api": {
-                "host": "localhost",
-                "port": 3003
-            }
+            "mysql": {"host": "localhost", "port": 3307, "database": "connector_db"},
+            "redis": {"host": "localhost", "port": 6380},
+            "api": {"host": "localhost", "port": 3003},
         },
         "features": [
             "JWT Authentication",
             "API Key Management",
             "Rate Limiting",
             "CORS Protection",
-            "SQL Injection Prevention"
-        ]
+            "SQL Injection Prevention",
+        ],
     }
 
 
@@ -73,7 +171,32 @@ async def root():
 async def health_check():
     return {"status": "healthy"}
 
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics(request: Request):
+    """Prometheus scrape endpoint, aggregated across workers.
+
+    Pool, query and admission metrics describe the deployment, so the
+    scraper must present ``metrics_token``; without one configured the
+    endpoint does not exist.
+    """
+    if settings.metrics_token is None:
+        return Response(status_code=status.HTTP_404_NOT_FOUND)
+    expected = f"Bearer {settings.metrics_token}"
+    if not hmac.compare_digest(
+        request.headers.get("authorization", "").encode(), expected.encode()
+    ):
+        return Response(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+
 if __name__ == "__main__":
+    import uvicorn
+
     uvicorn.run(
         "main:app",
         host="0.0.0.0",
@@ -0,0 +1,32 @@
+"""
+Middleware that attaches X-RateLimit-* headers to responses.
+"""
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+
+class RateLimitHeadersMiddleware:
+    """Copy the rate limit result stored by ``rate_limit_check`` into headers.
+
+    Works as raw ASGI middleware so the headers also reach streaming and
+    other responses that endpoints return directly.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_headers(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                result = scope.get("state", {}).get("rate_limit")
+                if result is not None:
+                    headers = MutableHeaders(scope=message)
+                    for name, value in result.headers().items():
+                        headers.setdefault(name, value)
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
@@ -0,0 +1,64 @@
+"""
+Middleware that times sampled requests and reports a Server-Timing header.
+"""
+import json
+import logging
+import random
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from core.timing import RequestTimings, end_request, start_request
+
+logger = logging.getLogger("connector.timing")
+
+
+class ServerTimingMiddleware:
+    """Collect per-phase timings for a sample of requests.
+
+    The header carries what is known when the response starts; for
+    streamed bodies, row fetching and serialization happen afterwards and
+    are only included in the log line, written once the body and any
+    background task have finished.
+    """
+
+    def __init__(self, app: ASGIApp, sample_rate: float = 1.0, log: bool = False):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.log = log
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not (
+            self.sample_rate >= 1.0 or random.random() < self.sample_rate
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        timings = RequestTimings()
+        token = start_request(timings)
+        status_code = 0
+
+        async def send_with_timing(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                MutableHeaders(scope=message).append("Server-Timing", timings.header())
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            end_request(token)
+            if self.log:
+                logger.info(
+                    json.dumps(
+                        {
+                            "event": "request_timing",
+                            "method": scope["method"],
+                            "path": scope["path"],
+                            "status": status_code,
+                            "total_ms": round(timings.elapsed() * 1000, 3),
+                            "phases": timings.as_dict(),
+                        }
+                    )
+                )
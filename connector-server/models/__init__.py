@@ -1,7 +1,6 @@
 """
 Database models for the connector server.
 """
-from .user import User, UserCreate, UserRead, UserUpdate
 from .api_key import ApiKey, ApiKeyCreate, ApiKeyRead, ApiKeyUpdate
 from .query_history import (
     QueryHistory,
@@ -10,6 +9,8 @@ from .query_history import (
     QueryHistoryUpdate,
     QueryStatus,
 )
+from .query_rollup import QueryRollup
+from .user import User, UserCreate, UserRead, UserUpdate
 
 __all__ = [
     # User models
@@ -28,4 +29,6 @@ __all__ = [
     "QueryHistoryRead",
     "QueryHistoryUpdate",
     "QueryStatus",
+    # Query Rollup models
+    "QueryRollup",
 ]
@@ -3,28 +3,36 @@ API Key model for the database connector.
 """
 from datetime import datetime
 from typing import List, Optional
+
+from sqlalchemy import Index
 from sqlmodel import Field, SQLModel
 
 
 class ApiKey(SQLModel, table=True):
     """API Key model with SQLModel."""
+
     __tablename__ = "api_keys"
+    # Per-client listings page by id (keyset pagination)
+    __table_args__ = (Index("idx_client_id", "client_id", "id"),)
 
     id: Optional[int] = Field(default=None, primary_key=True, index=True)
     key_id: str = Field(max_length=16, unique=True, nullable=False, index=True)
     key_hash: str = Field(max_length=128, unique=True, nullable=False, index=True)
-    client_id: str = Field(max_length=100, nullable=False, index=True)
+    client_id: str = Field(max_length=100, nullable=False)
     scopes: str = Field(default="[]", max_length=1000)  # JSON array of scopes
     created_at: Optional[datetime] = Field(default_factory=datetime.utcnow)
     expires_at: Optional[datetime] = None
     is_active: bool = Field(default=True)
     rate_limit: int = Field(default=1000)
+    # Query execution budget; None uses settings.query_max_execution_ms
+    max_execution_ms: Optional[int] = None
     last_used: Optional[datetime] = None
 
     @property
     def scopes_list(self) -> List[str]:
         """Get scopes as a list."""
         import json
+
         try:
             return json.loads(self.scopes) if self.scopes else []
         except json.JSONDecodeError:
@@ -34,6 +42,7 @@ class ApiKey(SQLModel, table=True):
     def scopes_list(self, value: List[str]):
         """Set scopes from a list."""
         import json
+
         self.scopes = json.dumps(value)
 
     def is_expired(self) -> bool:
@@ -44,20 +53,23 @@ class ApiKey(SQLModel, table=True):
 
     class Config:
         """Pydantic configuration."""
-        validate_assignment = True
+
         arbitrary_types_allowed = True
 
 
 class ApiKeyCreate(SQLModel):
     """API Key creation schema."""
+
     client_id: str = Field(min_length=1, max_length=100)
     scopes: List[str] = Field(default_factory=list)
     expires_at: Optional[datetime] = None
     rate_limit: int = Field(default=1000, ge=1, le=10000)
+    max_execution_ms: Optional[int] = Field(default=None, ge=0, le=86400000)
 
 
 class ApiKeyRead(SQLModel):
     """API Key read schema."""
+
     id: int
     key_id: str
     client_id: str
@@ -66,13 +78,16 @@ class ApiKeyRead(SQLModel):
     expires_at: Optional[datetime]
     is_active: bool
     rate_limit: int
+    max_execution_ms: Optional[int]
     last_used: Optional[datetime]
 
 
 class ApiKeyUpdate(SQLModel):
     """API Key update schema."""
+
     client_id: Optional[str] = Field(default=None, min_length=1, max_length=100)
     scopes: Optional[List[str]] = None
     expires_at: Optional[datetime] = None
     is_active: Optional[bool] = None
     rate_limit: Optional[int] = Field(default=None, ge=1, le=10000)
+    max_execution_ms: Optional[int] = Field(default=None, ge=0, le=86400000)
@@ -3,7 +3,9 @@ Query History model for the database connector.
 """
 from datetime import datetime
 from enum import Enum as PyEnum
-from typing import Optional, TYPE_CHECKING
+from typing import TYPE_CHECKING, Optional
+
+from sqlalchemy import Index
 from sqlmodel import Field, Relationship, SQLModel
 
 if TYPE_CHECKING:
@@ -12,40 +14,54 @@ if TYPE_CHECKING:
 
 class QueryStatus(str, PyEnum):
     """Query execution status."""
+
     SUCCESS = "success"
     ERROR = "error"
 
 
 class QueryHistory(SQLModel, table=True):
     """Query History model with SQLModel."""
+
     __tablename__ = "query_history"
+    # Listings page newest first by (executed_at, id), optionally per
+    # client or user
+    __table_args__ = (
+        Index("idx_executed_at", "executed_at", "id"),
+        Index("idx_client_executed_at", "client_id", "executed_at", "id"),
+        Index("idx_user_id", "user_id", "executed_at", "id"),
+    )
 
     id: Optional[int] = Field(default=None, primary_key=True, index=True)
-    user_id: Optional[str] = Field(
-        max_length=100, index=True, foreign_key="users.username"
-    )
+    user_id: Optional[str] = Field(max_length=100, foreign_key="users.username")
+    client_id: Optional[str] = Field(default=None, max_length=100)
     connection_id: Optional[str] = Field(max_length=100)
     query: str = Field(nullable=False)
+    fingerprint: Optional[str] = Field(default=None, max_length=32, index=True)
     execution_time: Optional[float] = None
     row_count: int = Field(default=0)
     status: QueryStatus = Field(default=QueryStatus.SUCCESS)
     error_message: Optional[str] = None
-    executed_at: datetime = Field(default_factory=datetime.utcnow, index=True)
+    executed_at: datetime = Field(default_factory=datetime.utcnow)
 
     # Relationship
-    user: Optional["User"] = Relationship(back_populates="query_history")
+    user: Optional["User"] = Relationship(
+        back_populates="query_history", sa_relationship_kwargs={"lazy": "raise"}
+    )
 
     class Config:
         """Pydantic configuration."""
-        validate_assignment = True
+
         arbitrary_types_allowed = True
 
 
 class QueryHistoryCreate(SQLModel):
     """Query History creation schema."""
+
     user_id: Optional[str] = Field(default=None, max_length=100)
+    client_id: Optional[str] = Field(default=None, max_length=100)
     connection_id: Optional[str] = Field(default=None, max_length=100)
     query: str = Field(min_length=1)
+    fingerprint: Optional[str] = Field(default=None, max_length=32)
     execution_time: Optional[float] = Field(default=None, ge=0)
     row_count: int = Field(default=0, ge=0)
     status: QueryStatus = Field(default=QueryStatus.SUCCESS)
@@ -54,10 +70,13 @@ class QueryHistoryCreate(SQLModel):
 
 class QueryHistoryRead(SQLModel):
     """Query History read schema."""
+
     id: int
     user_id: Optional[str]
+    client_id: Optional[str]
     connection_id: Optional[str]
     query: str
+    fingerprint: Optional[str]
     execution_time: Optional[float]
     row_count: int
     status: QueryStatus
@@ -67,6 +86,7 @@ class QueryHistoryRead(SQLModel):
 
 class QueryHistoryUpdate(SQLModel):
     """Query History update schema."""
+
     user_id: Optional[str] = Field(default=None, max_length=100)
     connection_id: Optional[str] = Field(default=None, max_length=100)
     query: Optional[str] = Field(default=None, min_length=1)
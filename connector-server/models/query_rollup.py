@@ -0,0 +1,34 @@
+"""
+Query performance rollup model for the database connector.
+"""
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import Double, Index, UniqueConstraint
+from sqlmodel import Field, SQLModel
+
+
+class QueryRollup(SQLModel, table=True):
+    """Query history totals for one time bucket and one client or fingerprint.
+
+    ``dimension`` is ``client`` or ``fingerprint``; every history record is
+    counted once under each. ``key`` is an empty string rather than NULL
+    for records without a client or fingerprint, so the unique key covers
+    them too.
+    """
+
+    __tablename__ = "query_rollups"
+    __table_args__ = (
+        UniqueConstraint("bucket_start", "dimension", "key", name="uq_query_rollup"),
+        Index("idx_query_rollup_key", "dimension", "key", "bucket_start"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    bucket_start: datetime = Field(nullable=False)
+    dimension: str = Field(max_length=16, nullable=False)
+    key: str = Field(default="", max_length=100)
+    count: int = Field(default=0)
+    error_count: int = Field(default=0)
+    total_time: float = Field(default=0.0, sa_type=Double)
+    max_time: float = Field(default=0.0, sa_type=Double)
+    sketch: bytes = Field(nullable=False)  # Serialized LatencySketch
@@ -1,7 +1,8 @@
 """
 User model for the database connector.
 """
-from typing import List, Optional, TYPE_CHECKING
+from typing import TYPE_CHECKING, List, Optional
+
 from sqlmodel import Field, Relationship, SQLModel
 
 if TYPE_CHECKING:
@@ -10,6 +11,7 @@ if TYPE_CHECKING:
 
 class User(SQLModel, table=True):
     """User model with SQLModel."""
+
     __tablename__ = "users"
 
     id: Optional[int] = Field(default=None, primary_key=True, index=True)
@@ -20,7 +22,10 @@ class User(SQLModel, table=True):
     scopes: str = Field(default="", max_length=500)  # Comma-separated scopes
 
     # Relationships
-    query_history: List["QueryHistory"] = Relationship(back_populates="user")
+    # lazy="raise": implicit loads would need IO that AsyncSession cannot do
+    query_history: List["QueryHistory"] = Relationship(
+        back_populates="user", sa_relationship_kwargs={"lazy": "raise"}
+    )
 
     @property
     def scopes_list(self) -> List[str]:
@@ -34,12 +39,13 @@ class User(SQLModel, table=True):
 
     class Config:
         """Pydantic configuration."""
-        validate_assignment = True
+
         arbitrary_types_allowed = True
 
 
 class UserCreate(SQLModel):
     """User creation schema."""
+
     username: str = Field(min_length=3, max_length=50)
     email: str = Field(min_length=5, max_length=100)
     password: str = Field(min_length=8, max_length=128)
@@ -48,6 +54,7 @@ class UserCreate(SQLModel):
 
 class UserRead(SQLModel):
     """User read schema."""
+
     id: int
     username: str
     email: Optional[str]
@@ -57,6 +64,7 @@ class UserRead(SQLModel):
 
 class UserUpdate(SQLModel):
     """User update schema."""
+
     username: Optional[str] = Field(default=None, min_length=3, max_length=50)
     email: Optional[str] = Field(default=None, min_length=5, max_length=100)
     password: Optional[str] = Field(default=None, min_length=8, max_length=128)
@@ -0,0 +1,242 @@
+"""
+Audit logging service: batched, non-blocking writes of query history.
+"""
+import asyncio
+import logging
+import random
+import time
+from datetime import datetime
+from enum import Enum
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from sqlmodel import col
+
+from core.config import settings
+from core.database import get_async_engine
+from models.query_history import QueryHistory, QueryHistoryCreate
+from services.query_rollups import QueryRollups, query_rollups
+from utils.pagination import Page, keyset_page
+
+logger = logging.getLogger(__name__)
+
+
+class OverflowPolicy(str, Enum):
+    """What to do with a record when the queue is full."""
+
+    DROP = "drop"
+    SAMPLE = "sample"
+    BLOCK = "block"
+
+
+class QueryHistoryWriter:
+    """Buffer query history records and bulk-insert them in the background.
+
+    Handlers call ``submit`` and return immediately; a single task drains
+    the bounded queue and writes up to ``batch_size`` records per multi-row
+    INSERT, or whatever has accumulated after ``flush_interval`` seconds.
+    When the queue is full the overflow policy decides between dropping the
+    record, keeping a random sample of records (waiting for space) and
+    waiting for space for every record, each wait bounded by
+    ``block_timeout``.
+
+    With ``rollups`` set, each batch is then folded into the query rollups
+    in a transaction of its own, retried with exponential backoff when a
+    concurrent writer races it for a rollup row. The history is committed
+    first, so a rollup failure never loses history records.
+    """
+
+    rollup_attempts = 3
+    rollup_backoff = 0.05
+
+    def __init__(
+        self,
+        engine_factory: Callable[[], AsyncEngine],
+        max_queue: int = 10000,
+        batch_size: int = 500,
+        flush_interval: float = 0.2,
+        overflow_policy: OverflowPolicy = OverflowPolicy.DROP,
+        sample_rate: float = 0.1,
+        block_timeout: float = 0.1,
+        rollups: Optional[QueryRollups] = None,
+    ):
+        self._engine_factory = engine_factory
+        self._rollups = rollups
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow_policy = overflow_policy
+        self.sample_rate = sample_rate
+        self.block_timeout = block_timeout
+        # None is the shutdown sentinel
+        self._queue: asyncio.Queue[Optional[Dict[str, Any]]] = asyncio.Queue(max_queue)
+        self._task: Optional[asyncio.Task[None]] = None
+        self.submitted = 0
+        self.flushed = 0
+        self.dropped = 0
+        self.failed = 0
+        self.rollup_failed = 0
+
+    def stats(self) -> Dict[str, int]:
+        """Counters for monitoring."""
+        return {
+            "submitted": self.submitted,
+            "flushed": self.flushed,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "rollup_failed": self.rollup_failed,
+            "queued": self._queue.qsize(),
+        }
+
+    async def submit(self, record: QueryHistoryCreate) -> bool:
+        """Queue a record; returns False if it was dropped."""
+        row = record.model_dump()
+        row["executed_at"] = datetime.utcnow()
+        self.submitted += 1
+        try:
+            self._queue.put_nowait(row)
+            return True
+        except asyncio.QueueFull:
+            pass
+
+        if self.overflow_policy == OverflowPolicy.DROP or (
+            self.overflow_policy == OverflowPolicy.SAMPLE
+            and random.random() >= self.sample_rate
+        ):
+            self.dropped += 1
+            return False
+        try:
+            await asyncio.wait_for(self._queue.put(row), self.block_timeout)
+            return True
+        except asyncio.TimeoutError:
+            self.dropped += 1
+            return False
+
+    def start(self) -> None:
+        """Start the background flusher on the running loop."""
+        if self._task is None or self._task.done():
+            # asyncio queues bind to the first loop that waits on them, so
+            # move anything submitted earlier onto a queue for this loop
+            queue: asyncio.Queue[Optional[Dict[str, Any]]] = asyncio.Queue(
+                self._queue.maxsize
+            )
+            while not self._queue.empty():
+                queue.put_nowait(self._queue.get_nowait())
+            self._queue = queue
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the flusher and write out everything still queued."""
+        if self._task is not None:
+            if not self._task.done():
+                # Let the flusher finish its current batch instead of cancelling
+                await self._queue.put(None)
+                await self._task
+            self._task = None
+        while not self._queue.empty():
+            batch = [
+                self._queue.get_nowait()
+                for _ in range(min(self.batch_size, self._queue.qsize()))
+            ]
+            await self._write([row for row in batch if row is not None])
+
+    async def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            batch: List[Dict[str, Any]] = []
+            deadline: Optional[float] = None
+            while len(batch) < self.batch_size:
+                try:
+                    row = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    timeout = None if deadline is None else deadline - time.monotonic()
+                    if timeout is not None and timeout <= 0:
+                        break
+                    try:
+                        row = await asyncio.wait_for(self._queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                if row is None:
+                    stopping = True
+                    break
+                batch.append(row)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+            await self._write(batch)
+
+    async def _write(self, batch: List[Dict[str, Any]]) -> None:
+        if not batch:
+            return
+        try:
+            async with self._engine_factory().begin() as conn:
+                await conn.execute(insert(QueryHistory).values(batch))
+        except Exception as e:
+            self.failed += len(batch)
+            logger.warning("Writing %d query history records failed: %s", len(batch), e)
+            return
+        self.flushed += len(batch)
+        if self._rollups is not None:
+            await self._apply_rollups(self._rollups, batch)
+
+    async def _apply_rollups(
+        self, rollups: QueryRollups, batch: List[Dict[str, Any]]
+    ) -> None:
+        for attempt in range(1, self.rollup_attempts + 1):
+            try:
+                async with self._engine_factory().begin() as conn:
+                    await rollups.apply(conn, batch)
+                return
+            except (IntegrityError, OperationalError) as e:
+                # Duplicate rollup key or deadlock against another writer
+                failure: Exception = e
+                if attempt < self.rollup_attempts:
+                    await asyncio.sleep(self.rollup_backoff * 2 ** (attempt - 1))
+                    continue
+            except Exception as e:
+                failure = e
+            break
+        self.rollup_failed += len(batch)
+        logger.warning(
+            "Rolling up %d query history records failed: %s", len(batch), failure
+        )
+
+
+query_history_writer = QueryHistoryWriter(
+    get_async_engine,
+    max_queue=settings.history_queue_size,
+    batch_size=settings.history_batch_size,
+    flush_interval=settings.history_flush_ms / 1000,
+    overflow_policy=OverflowPolicy(settings.history_overflow_policy),
+    sample_rate=settings.history_sample_rate,
+    block_timeout=settings.history_block_timeout_ms / 1000,
+    rollups=query_rollups if settings.rollup_enabled else None,
+)
+
+
+async def get_query_history(
+    db: AsyncSession,
+    client_id: Optional[str] = None,
+    user_id: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = 100,
+) -> Page:
+    """Get a page of query history, newest first.
+
+    Cursors are bound to the filters they were issued with; raises
+    CursorError otherwise.
+    """
+    stmt = select(QueryHistory)
+    if client_id:
+        stmt = stmt.where(col(QueryHistory.client_id) == client_id)
+    if user_id:
+        stmt = stmt.where(col(QueryHistory.user_id) == user_id)
+    return await keyset_page(
+        db,
+        stmt,
+        [QueryHistory.executed_at, QueryHistory.id],
+        f"query_history:{client_id or ''}:{user_id or ''}",
+        cursor,
+        limit,
+        descending=True,
+    )
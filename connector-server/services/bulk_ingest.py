@@ -0,0 +1,451 @@
+"""
+Bulk ingest service: streamed NDJSON/CSV parsed into batched inserts.
+"""
+import base64
+import binascii
+import codecs
+import csv
+import time
+from datetime import date, datetime
+from datetime import time as time_of_day
+from decimal import Decimal, InvalidOperation
+from enum import Enum
+from itertools import groupby
+from typing import Any, AsyncIterator, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import orjson
+from sqlalchemy import JSON, Column
+from sqlalchemy import Enum as SAEnum
+from sqlalchemy import MetaData, String, Table, insert
+from sqlalchemy.exc import NoSuchTableError
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+# (line number, column -> value) as parsed from the request body
+Record = Tuple[int, Dict[str, Any]]
+
+
+class IngestError(Exception):
+    """Raised when a bulk ingest request or one of its rows is invalid."""
+
+
+class TableNotFoundError(IngestError):
+    """Raised when the table to ingest into does not exist."""
+
+
+class IngestFormat(str, Enum):
+    """Supported request body encodings."""
+
+    CSV = "csv"
+    NDJSON = "ndjson"
+
+
+class DuplicatePolicy(str, Enum):
+    """What to do with a row whose primary or unique key already exists."""
+
+    ERROR = "error"
+    UPDATE = "update"
+
+
+class IngestBatch(NamedTuple):
+    """One committed batch; ``committed_rows`` counts every row so far."""
+
+    batch: int
+    rows: int
+    committed_rows: int
+    seconds: float
+
+
+def _coerce_int(value: Any) -> int:
+    # bool is accepted: MySQL BOOLEAN columns reflect as TINYINT
+    if isinstance(value, int):
+        return int(value)
+    if isinstance(value, str):
+        return int(value)
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    raise ValueError
+
+
+def _coerce_float(value: Any) -> float:
+    if isinstance(value, bool):
+        raise ValueError
+    return float(value)
+
+
+def _coerce_decimal(value: Any) -> Decimal:
+    if isinstance(value, bool):
+        raise ValueError
+    try:
+        # str() first, so JSON floats do not carry binary rounding noise
+        return Decimal(str(value))
+    except InvalidOperation:
+        raise ValueError
+
+
+def _coerce_bool(value: Any) -> bool:
+    if isinstance(value, bool):
+        return value
+    if value in (0, 1):
+        return bool(value)
+    if isinstance(value, str) and value.lower() in ("true", "false", "1", "0"):
+        return value.lower() in ("true", "1")
+    raise ValueError
+
+
+def _coerce_datetime(value: Any) -> datetime:
+    if isinstance(value, str):
+        return datetime.fromisoformat(value)
+    raise ValueError
+
+
+def _coerce_date(value: Any) -> date:
+    if isinstance(value, str):
+        return date.fromisoformat(value)
+    raise ValueError
+
+
+def _coerce_time(value: Any) -> time_of_day:
+    if isinstance(value, str):
+        return time_of_day.fromisoformat(value)
+    raise ValueError
+
+
+def _coerce_bytes(value: Any) -> bytes:
+    # The export side writes binary columns as base64
+    if isinstance(value, str):
+        try:
+            return base64.b64decode(value, validate=True)
+        except binascii.Error:
+            raise ValueError
+    raise ValueError
+
+
+_COERCERS: Dict[type, Callable[[Any], Any]] = {
+    bool: _coerce_bool,
+    int: _coerce_int,
+    float: _coerce_float,
+    Decimal: _coerce_decimal,
+    datetime: _coerce_datetime,
+    date: _coerce_date,
+    time_of_day: _coerce_time,
+    bytes: _coerce_bytes,
+}
+
+
+def _column_coercer(column: Column) -> Callable[[Any], Any]:
+    """Build the converter from a parsed value to ``column``'s Python type."""
+    column_type = column.type
+    if isinstance(column_type, JSON):
+        return lambda value: value
+    if isinstance(column_type, SAEnum):
+        allowed = set(column_type.enums)
+
+        def coerce_enum(value: Any) -> Any:
+            if value not in allowed:
+                raise ValueError
+            return value
+
+        return coerce_enum
+    if isinstance(column_type, String):
+        length = column_type.length
+
+        def coerce_string(value: Any) -> str:
+            if not isinstance(value, str):
+                raise ValueError
+            if length is not None and len(value) > length:
+                raise ValueError(f"longer than {length} characters")
+            return value
+
+        return coerce_string
+    try:
+        python_type = column_type.python_type
+    except NotImplementedError:
+        return lambda value: value
+    for base, coercer in _COERCERS.items():
+        if issubclass(python_type, base):
+            return coercer
+    return lambda value: value
+
+
+class IngestTarget:
+    """A reflected table with per-column validation for incoming rows."""
+
+    def __init__(self, table: Table):
+        self.table = table
+        self.name = table.name
+        self.primary_key = [column.name for column in table.primary_key.columns]
+        self._coercers = {column.name: _column_coercer(column) for column in table.c}
+        self._types = {column.name: str(column.type) for column in table.c}
+        self._nullable = {column.name for column in table.c if column.nullable}
+        auto = table.autoincrement_column
+        self.required = {
+            column.name
+            for column in table.c
+            if not column.nullable
+            and column.server_default is None
+            and column is not auto
+        }
+        self._checked: set = set()
+
+    def check_columns(self, names: Tuple[str, ...], line: int) -> None:
+        """Reject unknown columns and missing required ones, once per layout."""
+        if names in self._checked:
+            return
+        unknown = [name for name in names if name not in self._coercers]
+        if unknown:
+            raise IngestError(f"Line {line}: unknown columns: {', '.join(unknown)}")
+        missing = sorted(self.required.difference(names))
+        if missing:
+            raise IngestError(
+                f"Line {line}: missing required columns: {', '.join(missing)}"
+            )
+        self._checked.add(names)
+
+    def validate(self, line: int, values: Dict[str, Any]) -> Dict[str, Any]:
+        """Convert one parsed row to column types, or raise IngestError."""
+        self.check_columns(tuple(values), line)
+        row: Dict[str, Any] = {}
+        for name, value in values.items():
+            if value is None:
+                if name not in self._nullable:
+                    raise IngestError(f"Line {line}: column '{name}' cannot be null")
+                row[name] = None
+                continue
+            try:
+                row[name] = self._coercers[name](value)
+            except (TypeError, ValueError) as e:
+                reason = f" ({e})" if str(e) else ""
+                raise IngestError(
+                    f"Line {line}: column '{name}' expects {self._types[name]}, "
+                    f"got {value!r}{reason}"
+                )
+        return row
+
+
+async def ingest_target(engine: AsyncEngine, table_name: str) -> IngestTarget:
+    """Reflect ``table_name`` for validation and inserts."""
+
+    def reflect(sync_conn: Any) -> Table:
+        return Table(table_name, MetaData(), autoload_with=sync_conn)
+
+    async with engine.connect() as conn:
+        try:
+            return IngestTarget(await conn.run_sync(reflect))
+        except NoSuchTableError:
+            raise TableNotFoundError(f"Table '{table_name}' not found")
+
+
+async def iter_ndjson_records(
+    chunks: AsyncIterator[bytes], max_record_bytes: int = 1 << 20
+) -> AsyncIterator[List[Record]]:
+    """Parse a streamed NDJSON body; yields the records completed by each chunk."""
+    pending = b""
+    line_number = 0
+    async for chunk in chunks:
+        lines = (pending + chunk).split(b"\n")
+        pending = lines.pop()
+        if len(pending) > max_record_bytes:
+            raise IngestError(
+                f"Line {line_number + len(lines) + 1}: longer than "
+                f"{max_record_bytes} bytes"
+            )
+        records = []
+        for line in lines:
+            line_number += 1
+            if line.strip():
+                records.append((line_number, _parse_json_line(line, line_number)))
+        if records:
+            yield records
+    if pending.strip():
+        yield [(line_number + 1, _parse_json_line(pending, line_number + 1))]
+
+
+def _parse_json_line(line: bytes, line_number: int) -> Dict[str, Any]:
+    try:
+        value = orjson.loads(line)
+    except orjson.JSONDecodeError as e:
+        raise IngestError(f"Line {line_number}: invalid JSON: {e}")
+    if not isinstance(value, dict):
+        raise IngestError(f"Line {line_number}: expected a JSON object")
+    return value
+
+
+async def iter_csv_records(
+    chunks: AsyncIterator[bytes], max_record_bytes: int = 1 << 20
+) -> AsyncIterator[List[Record]]:
+    """Parse a streamed CSV body with a header row.
+
+    Quoted fields may contain newlines; a record is complete once its
+    quotes balance. Empty fields are NULL, as the CSV export writes them.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    header: Optional[List[str]] = None
+
+    def parse(texts: List[Tuple[int, str]]) -> List[Record]:
+        nonlocal header
+        records = []
+        for (line, _), fields in zip(texts, csv.reader(text for _, text in texts)):
+            if header is None:
+                header = fields
+                if len(set(header)) != len(header):
+                    raise IngestError(f"Line {line}: duplicate column names")
+                continue
+            if len(fields) != len(header):
+                raise IngestError(
+                    f"Line {line}: expected {len(header)} fields, got {len(fields)}"
+                )
+            records.append(
+                (line, {name: value or None for name, value in zip(header, fields)})
+            )
+        return records
+
+    async def texts() -> AsyncIterator[str]:
+        async for chunk in chunks:
+            yield decoder.decode(chunk)
+        yield decoder.decode(b"", final=True)
+
+    # ``record`` holds the complete lines of an unfinished record, which
+    # started on ``record_line``; ``partial`` the unterminated last line
+    record, partial = "", ""
+    quotes = line_number = record_line = 0
+    try:
+        async for text in texts():
+            lines = (partial + text).split("\n")
+            partial = lines.pop()
+            complete: List[Tuple[int, str]] = []
+            for line in lines:
+                line_number += 1
+                if not record:
+                    record_line = line_number
+                record += line + "\n"
+                quotes += line.count('"')
+                if quotes % 2:
+                    continue  # Newline inside a quoted field
+                if record.strip():
+                    complete.append((record_line, record))
+                record, quotes = "", 0
+            if len(record) + len(partial) > max_record_bytes:
+                raise IngestError(
+                    f"Line {record_line or line_number + 1}: record longer "
+                    f"than {max_record_bytes} bytes"
+                )
+            records = parse(complete)
+            if records:
+                yield records
+        if not record:
+            record_line = line_number + 1
+        record += partial
+        if not record.strip():
+            return
+        if (quotes + partial.count('"')) % 2:
+            raise IngestError(f"Line {record_line}: unterminated quoted field")
+        records = parse([(record_line, record)])
+    except UnicodeDecodeError as e:
+        raise IngestError(f"Line {line_number + 1}: invalid UTF-8: {e}")
+    except csv.Error as e:
+        raise IngestError(f"Line {record_line}: invalid CSV: {e}")
+    if records:
+        yield records
+
+
+def record_iterator(
+    ingest_format: IngestFormat,
+    chunks: AsyncIterator[bytes],
+    max_record_bytes: int = 1 << 20,
+) -> AsyncIterator[List[Record]]:
+    """Parser for the request body format."""
+    if ingest_format == IngestFormat.CSV:
+        return iter_csv_records(chunks, max_record_bytes)
+    return iter_ndjson_records(chunks, max_record_bytes)
+
+
+def insert_statement(
+    target: IngestTarget,
+    dialect: str,
+    columns: Tuple[str, ...],
+    on_duplicate: DuplicatePolicy,
+) -> Any:
+    """INSERT for rows with ``columns``, upserting if asked to."""
+    table = target.table
+    if on_duplicate == DuplicatePolicy.ERROR:
+        return insert(table)
+    updated = [name for name in columns if name not in target.primary_key]
+    if dialect == "mysql":
+        from sqlalchemy.dialects.mysql import insert as mysql_insert
+
+        mysql_stmt = mysql_insert(table)
+        # Assigning the key to itself turns a duplicate into a no-op
+        updated = updated or target.primary_key[:1]
+        return mysql_stmt.on_duplicate_key_update(
+            {name: mysql_stmt.inserted[name] for name in updated}
+        )
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+        sqlite_stmt = sqlite_insert(table)
+        if not updated:
+            return sqlite_stmt.on_conflict_do_nothing()
+        return sqlite_stmt.on_conflict_do_update(
+            index_elements=target.primary_key,
+            set_={name: sqlite_stmt.excluded[name] for name in updated},
+        )
+    raise IngestError(f"on_duplicate=update is not supported on {dialect}")
+
+
+async def ingest(
+    engine: AsyncEngine,
+    target: IngestTarget,
+    records: AsyncIterator[List[Record]],
+    batch_size: int = 1000,
+    on_duplicate: DuplicatePolicy = DuplicatePolicy.ERROR,
+    resume_from: int = 0,
+) -> AsyncIterator[IngestBatch]:
+    """Validate and insert rows in batches, one transaction per batch.
+
+    The first ``resume_from`` rows are skipped without being validated or
+    written, so a client can send the same body again after a failure,
+    passing the ``committed_rows`` of the last batch it saw committed.
+    Yields each batch after it commits. A failing batch is rolled back and
+    raises; every batch before it stays committed.
+    """
+    if on_duplicate == DuplicatePolicy.UPDATE and not target.primary_key:
+        raise IngestError(f"Table '{target.name}' has no primary key to update on")
+    dialect = engine.dialect.name
+    statements: Dict[Tuple[str, ...], Any] = {}
+    skip = resume_from
+    committed = resume_from
+    batch: List[Dict[str, Any]] = []
+    number = 0
+
+    async def write() -> IngestBatch:
+        started = time.perf_counter()
+        async with engine.begin() as conn:
+            # executemany needs one column layout per statement; rows
+            # normally share one, so this is usually a single execute
+            for columns, rows in groupby(batch, key=tuple):
+                stmt = statements.get(columns)
+                if stmt is None:
+                    stmt = statements[columns] = insert_statement(
+                        target, dialect, columns, on_duplicate
+                    )
+                await conn.execute(stmt, list(rows))
+        return IngestBatch(
+            number,
+            len(batch),
+            committed + len(batch),
+            round(time.perf_counter() - started, 4),
+        )
+
+    async for parsed in records:
+        if skip:
+            skipped = min(skip, len(parsed))
+            parsed = parsed[skipped:]
+            skip -= skipped
+        for line, values in parsed:
+            batch.append(target.validate(line, values))
+            if len(batch) >= batch_size:
+                result = await write()
+                committed, number, batch = result.committed_rows, number + 1, []
+                yield result
+    if batch:
+        yield await write()
@@ -0,0 +1,396 @@
+"""
+Query history retention: partition maintenance, archiving and pruning.
+"""
+import asyncio
+import gzip
+import logging
+import os
+from contextlib import asynccontextmanager
+from datetime import date, datetime, time, timedelta
+from enum import Enum
+from pathlib import Path
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    NamedTuple,
+    Optional,
+)
+
+from sqlalchemy import delete, select, text
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlmodel import SQLModel
+
+from core.config import settings
+from core.database import get_async_engine
+from models.query_history import QueryHistory
+from services.import_export import (
+    ExportFormat,
+    KeysetSource,
+    get_encoder,
+    iter_keyset_chunks,
+)
+
+logger = logging.getLogger(__name__)
+
+HISTORY_TABLE = QueryHistory.__tablename__
+_history = SQLModel.metadata.tables[HISTORY_TABLE]
+FUTURE_PARTITION = "p_future"
+LOCK_NAME = "connector.history_retention"
+
+
+class RetentionError(Exception):
+    """Raised when retention cannot run in the configured mode."""
+
+
+class RetentionMode(str, Enum):
+    """How expired history is removed."""
+
+    AUTO = "auto"  # Partitions when the table has them, else deletes
+    PARTITION = "partition"
+    DELETE = "delete"
+
+
+class Partition(NamedTuple):
+    """A range partition of query_history; ``upper`` is None for MAXVALUE."""
+
+    name: str
+    upper: Optional[datetime]
+    rows: int = 0
+
+
+def partition_name(day: date) -> str:
+    """Name of the partition holding ``day``'s rows."""
+    return f"p{day:%Y%m%d}"
+
+
+def parse_partitions(rows: Iterable[Any]) -> List[Partition]:
+    """Partitions from ``information_schema.PARTITIONS`` name/description/rows."""
+    partitions = []
+    for name, description, table_rows in rows:
+        upper = None
+        if description != "MAXVALUE":
+            upper = datetime.fromisoformat(description.strip("'"))
+        partitions.append(Partition(name, upper, table_rows or 0))
+    return partitions
+
+
+def partitions_to_add(
+    existing: List[Partition], today: date, ahead: int
+) -> List[Partition]:
+    """Daily partitions to split off ``p_future`` to cover ``today + ahead``.
+
+    On a table with only ``p_future`` the first partition also takes every
+    row from before today.
+    """
+    bounds = [p.upper for p in existing if p.upper is not None]
+    added = []
+    if bounds:
+        upper = max(bounds)
+    else:
+        upper = datetime.combine(today, time())
+        added.append(Partition(partition_name(today - timedelta(days=1)), upper))
+    end = datetime.combine(today + timedelta(days=ahead + 1), time())
+    while upper < end:
+        added.append(Partition(partition_name(upper.date()), upper + timedelta(days=1)))
+        upper += timedelta(days=1)
+    return added
+
+
+def expired_partitions(existing: List[Partition], cutoff: datetime) -> List[Partition]:
+    """Partitions whose rows are all older than ``cutoff``."""
+    return [p for p in existing if p.upper is not None and p.upper <= cutoff]
+
+
+def reorganize_sql(added: List[Partition]) -> str:
+    """DDL splitting the (normally empty) ``p_future`` into ``added``."""
+    parts = [
+        f"PARTITION {p.name} VALUES LESS THAN ('{p.upper:%Y-%m-%d %H:%M:%S}')"
+        for p in added
+    ]
+    parts.append(f"PARTITION {FUTURE_PARTITION} VALUES LESS THAN (MAXVALUE)")
+    return (
+        f"ALTER TABLE {HISTORY_TABLE} REORGANIZE PARTITION {FUTURE_PARTITION} "
+        f"INTO ({', '.join(parts)})"
+    )
+
+
+async def read_partitions(engine: AsyncEngine) -> List[Partition]:
+    """Range partitions of query_history; empty when it is not partitioned."""
+    if engine.dialect.name != "mysql":
+        return []
+    async with engine.connect() as conn:
+        result = await conn.execute(
+            text(
+                "SELECT PARTITION_NAME, PARTITION_DESCRIPTION, TABLE_ROWS "
+                "FROM information_schema.PARTITIONS "
+                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table "
+                "AND PARTITION_NAME IS NOT NULL ORDER BY PARTITION_ORDINAL_POSITION"
+            ),
+            {"table": HISTORY_TABLE},
+        )
+        return parse_partitions(result.all())
+
+
+def _unique_path(directory: Path, name: str, extension: str) -> Path:
+    """``directory/name.extension``, numbered so no archive is overwritten."""
+    path, n = directory / f"{name}.{extension}", 0
+    while path.exists():
+        n += 1
+        path = directory / f"{name}-{n}.{extension}"
+    return path
+
+
+async def archive_history(
+    engine: AsyncEngine,
+    directory: Path,
+    name: str,
+    upper: datetime,
+    lower: Optional[datetime] = None,
+    export_format: ExportFormat = ExportFormat.NDJSON,
+    chunk_size: int = 10000,
+) -> tuple[Optional[Path], int]:
+    """Write history rows in ``[lower, upper)`` to a compressed archive file.
+
+    NDJSON is gzipped; Parquet uses its own column compression. Rows are
+    read in id order one keyset page at a time, and the file is renamed
+    into place only once complete. Returns ``(None, 0)`` when there is
+    nothing to archive.
+    """
+    columns = _history.c
+    conditions = [columns.executed_at < upper]
+    if lower is not None:
+        conditions.append(columns.executed_at >= lower)
+    subquery = select(_history).where(*conditions).subquery("archive")
+    source = KeysetSource(name, subquery, "id")
+
+    encoder = get_encoder(export_format, column_types=source.column_types)
+    compressed = export_format == ExportFormat.NDJSON
+    extension = encoder.extension + (".gz" if compressed else "")
+    await asyncio.to_thread(directory.mkdir, parents=True, exist_ok=True)
+    path = _unique_path(directory, name, extension)
+    partial = path.with_name(path.name + ".part")
+
+    opener: Callable[..., Any] = open
+    if compressed:
+        opener = gzip.open
+    handle = await asyncio.to_thread(opener, partial, "wb")
+    rows = 0
+    try:
+        async for names, chunk in iter_keyset_chunks(engine, source, None, chunk_size):
+            await asyncio.to_thread(handle.write, encoder.encode(names, chunk))
+            rows += len(chunk)
+        await asyncio.to_thread(handle.write, encoder.finish())
+    except BaseException:
+        await asyncio.to_thread(handle.close)
+        partial.unlink(missing_ok=True)
+        raise
+    await asyncio.to_thread(handle.close)
+    if not rows:
+        partial.unlink()
+        return None, 0
+    os.replace(partial, path)
+    return path, rows
+
+
+@asynccontextmanager
+async def _exclusive(engine: AsyncEngine) -> AsyncIterator[bool]:
+    """Hold a MySQL named lock so only one worker runs maintenance at a time."""
+    if engine.dialect.name != "mysql":
+        yield True
+        return
+    async with engine.connect() as conn:
+        acquired = await conn.scalar(
+            text("SELECT GET_LOCK(:name, 0)"), {"name": LOCK_NAME}
+        )
+        try:
+            yield bool(acquired)
+        finally:
+            if acquired:
+                await conn.execute(
+                    text("SELECT RELEASE_LOCK(:name)"), {"name": LOCK_NAME}
+                )
+
+
+class HistoryRetention:
+    """Keeps ``retention_days`` of query history and prunes the rest.
+
+    On a table partitioned by ``executed_at`` (see the init schema) each run
+    splits daily partitions off ``p_future`` for the next ``partitions_ahead``
+    days and drops whole partitions that are past the cutoff, which is a
+    metadata operation instead of a row-by-row DELETE. Without partitions
+    (or on other backends) expired rows are deleted in id-ordered chunks of
+    ``chunk_size`` with ``delete_pause`` seconds between them, so no single
+    transaction holds locks for long. With ``archive_dir`` set, expired rows
+    are written to an archive file first and nothing is removed if that
+    fails.
+    """
+
+    def __init__(
+        self,
+        engine_factory: Callable[[], AsyncEngine],
+        retention_days: int = 90,
+        mode: RetentionMode = RetentionMode.AUTO,
+        archive_dir: Optional[str] = None,
+        archive_format: ExportFormat = ExportFormat.NDJSON,
+        partitions_ahead: int = 7,
+        chunk_size: int = 5000,
+        delete_pause: float = 0.05,
+        clock: Callable[[], datetime] = datetime.utcnow,
+    ):
+        self._engine_factory = engine_factory
+        self.retention_days = retention_days
+        self.mode = mode
+        self.archive_dir = Path(archive_dir) if archive_dir else None
+        self.archive_format = archive_format
+        self.partitions_ahead = partitions_ahead
+        self.chunk_size = chunk_size
+        self.delete_pause = delete_pause
+        self._clock = clock
+        self.last_run: Optional[Dict[str, Any]] = None
+
+    def cutoff(self) -> Optional[datetime]:
+        """Midnight (UTC) before which history has expired; None keeps all."""
+        if not self.retention_days:
+            return None
+        day = (self._clock() - timedelta(days=self.retention_days)).date()
+        return datetime.combine(day, time())
+
+    async def run_once(self) -> Dict[str, Any]:
+        """Run one maintenance pass and return what it did."""
+        engine = self._engine_factory()
+        cutoff = self.cutoff()
+        report: Dict[str, Any] = {
+            "mode": None,
+            "cutoff": cutoff.isoformat() if cutoff else None,
+            "partitions_added": [],
+            "partitions_dropped": [],
+            "rows_deleted": 0,
+            "rows_archived": 0,
+            "archives": [],
+        }
+        async with _exclusive(engine) as acquired:
+            if not acquired:
+                report["mode"] = "skipped"
+                return report
+            partitions = await read_partitions(engine)
+            mode = self.mode
+            if mode == RetentionMode.AUTO:
+                mode = RetentionMode.PARTITION if partitions else RetentionMode.DELETE
+            report["mode"] = mode.value
+            if mode == RetentionMode.PARTITION:
+                if not partitions:
+                    raise RetentionError(f"{HISTORY_TABLE} is not partitioned")
+                await self._maintain_partitions(engine, partitions, cutoff, report)
+            elif cutoff is not None:
+                await self._delete_expired(engine, cutoff, report)
+        self.last_run = report
+        return report
+
+    async def _archive(
+        self,
+        engine: AsyncEngine,
+        name: str,
+        upper: datetime,
+        lower: Optional[datetime],
+        report: Dict[str, Any],
+    ) -> None:
+        if self.archive_dir is None:
+            return
+        path, rows = await archive_history(
+            engine, self.archive_dir, name, upper, lower, self.archive_format
+        )
+        if path is not None:
+            report["archives"].append(str(path))
+            report["rows_archived"] += rows
+
+    async def _maintain_partitions(
+        self,
+        engine: AsyncEngine,
+        partitions: List[Partition],
+        cutoff: Optional[datetime],
+        report: Dict[str, Any],
+    ) -> None:
+        added = partitions_to_add(
+            partitions, self._clock().date(), self.partitions_ahead
+        )
+        if added:
+            async with engine.begin() as conn:
+                await conn.execute(text(reorganize_sql(added)))
+            report["partitions_added"] = [p.name for p in added]
+        if cutoff is None:
+            return
+        expired = {p.name for p in expired_partitions(partitions, cutoff)}
+        lower: Optional[datetime] = None
+        for partition in partitions:
+            if partition.name in expired and partition.upper is not None:
+                await self._archive(
+                    engine,
+                    f"{HISTORY_TABLE}-{partition.name}",
+                    partition.upper,
+                    lower,
+                    report,
+                )
+                drop = f"ALTER TABLE {HISTORY_TABLE} DROP PARTITION {partition.name}"
+                async with engine.begin() as conn:
+                    await conn.execute(text(drop))
+                report["partitions_dropped"].append(partition.name)
+            lower = partition.upper
+
+    async def _delete_expired(
+        self, engine: AsyncEngine, cutoff: datetime, report: Dict[str, Any]
+    ) -> None:
+        await self._archive(
+            engine, f"{HISTORY_TABLE}-before-{cutoff:%Y%m%d}", cutoff, None, report
+        )
+        columns = _history.c
+        while True:
+            async with engine.begin() as conn:
+                ids = (
+                    (
+                        await conn.execute(
+                            select(columns.id)
+                            .where(columns.executed_at < cutoff)
+                            .order_by(columns.id)
+                            .limit(self.chunk_size)
+                        )
+                    )
+                    .scalars()
+                    .all()
+                )
+                if ids:
+                    await conn.execute(delete(_history).where(columns.id.in_(ids)))
+            report["rows_deleted"] += len(ids)
+            if len(ids) < self.chunk_size:
+                return
+            await asyncio.sleep(self.delete_pause)
+
+    async def run(self, interval: float) -> None:
+        """Run maintenance now and then every ``interval`` seconds until cancelled."""
+        while True:
+            try:
+                report = await self.run_once()
+                if (
+                    report["partitions_dropped"]
+                    or report["rows_deleted"]
+                    or (report["partitions_added"])
+                ):
+                    logger.info("Query history retention: %s", report)
+            except Exception as e:
+                logger.warning("Query history retention failed: %s", e)
+            await asyncio.sleep(interval)
+
+
+history_retention = HistoryRetention(
+    get_async_engine,
+    retention_days=settings.history_retention_days,
+    mode=RetentionMode(settings.history_retention_mode),
+    archive_dir=settings.history_archive_dir,
+    archive_format=ExportFormat(settings.history_archive_format),
+    partitions_ahead=settings.history_partitions_ahead,
+    chunk_size=settings.history_delete_chunk_size,
+    delete_pause=settings.history_delete_pause_ms / 1000,
+)
@@ -0,0 +1,428 @@
+"""
+Data export service with keyset pagination and incremental encoders.
+"""
+import csv
+import io
+from datetime import date, datetime, time
+from decimal import Decimal
+from enum import Enum
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence
+
+from sqlalchemy import (
+    Numeric,
+    Row,
+    column,
+    inspect,
+    literal_column,
+    select,
+    table,
+    text,
+)
+from sqlalchemy.exc import NoSuchTableError, SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.sql import Select
+
+from core.timing import timed
+from services.query_executor import is_read_query
+from utils.formatters import json_default, ndjson_rows
+
+
+class ExportError(Exception):
+    """Raised when an export request cannot be satisfied."""
+
+
+class TableNotFoundError(ExportError):
+    """Raised when the table to export does not exist."""
+
+
+class ExportFormat(str, Enum):
+    """Supported export encodings."""
+
+    CSV = "csv"
+    NDJSON = "ndjson"
+    PARQUET = "parquet"
+
+
+class KeysetSource:
+    """A table or query paged in key order with ``WHERE key > :after``."""
+
+    def __init__(
+        self,
+        name: str,
+        selectable: Any,
+        key: str,
+        key_type: Optional[type] = None,
+        select_all: bool = False,
+    ):
+        self.name = name
+        self.key = key
+        self._selectable = selectable
+        self._key_type = key_type
+        # Text subqueries only know the key column, so select them with '*'
+        self._columns = [literal_column("*")] if select_all else list(selectable.c)
+        # Declared types of the selected columns; unknown for text queries
+        self.column_types: Dict[str, Any] = (
+            {} if select_all else {c.name: c.type for c in selectable.c}
+        )
+
+    def coerce_key(self, value: Any) -> Any:
+        """Convert a resume key received as text to the key column type."""
+        if self._key_type is None or value is None:
+            return value
+        if isinstance(value, self._key_type):
+            return value
+        try:
+            return self._key_type(value)
+        except (TypeError, ValueError):
+            raise ExportError(f"Invalid value for key column '{self.key}': {value!r}")
+
+    def page(self, after: Any, limit: int) -> Select:
+        """Build the statement for the page following ``after``."""
+        key_column = self._selectable.c[self.key]
+        stmt = select(*self._columns).select_from(self._selectable)
+        if after is not None:
+            stmt = stmt.where(key_column > after)
+        return stmt.order_by(key_column).limit(limit)
+
+
+async def table_source(
+    engine: AsyncEngine,
+    table_name: str,
+    key: Optional[str] = None,
+    columns: Optional[List[str]] = None,
+) -> KeysetSource:
+    """Reflect a table and build a keyset source over it."""
+
+    def reflect(
+        sync_conn: Any,
+    ) -> tuple[List[Dict[str, Any]], List[str], List[List[str]]]:
+        inspector = inspect(sync_conn)
+        unique = [
+            index["column_names"]
+            for index in inspector.get_indexes(table_name)
+            if index.get("unique")
+        ] + [
+            constraint["column_names"]
+            for constraint in inspector.get_unique_constraints(table_name)
+        ]
+        return (
+            inspector.get_columns(table_name),
+            inspector.get_pk_constraint(table_name).get("constrained_columns") or [],
+            unique,
+        )
+
+    async with engine.connect() as conn:
+        try:
+            reflected, primary_key, unique = await conn.run_sync(reflect)
+        except NoSuchTableError:
+            raise TableNotFoundError(f"Table '{table_name}' not found")
+
+    types = {col["name"]: col["type"] for col in reflected}
+    if key is None:
+        if len(primary_key) != 1:
+            raise ExportError(
+                f"Table '{table_name}' has no single-column primary key; "
+                "pass an explicit key column"
+            )
+        key = primary_key[0]
+    if key not in types:
+        raise ExportError(f"Unknown key column '{key}'")
+    not_null = {col["name"] for col in reflected if not col.get("nullable", True)}
+    if primary_key != [key] and ([key] not in unique or key not in not_null):
+        # Paging on "key > last key" skips rows sharing the last key (or NULL)
+        raise ExportError(
+            f"Key column '{key}' must be the primary key or a NOT NULL column "
+            "with a unique index"
+        )
+
+    selected = columns or list(types)
+    unknown = [name for name in selected if name not in types]
+    if unknown:
+        raise ExportError(f"Unknown columns: {', '.join(unknown)}")
+    if key not in selected:
+        # The key must be in every row so clients can resume from it
+        selected = [key] + selected
+
+    try:
+        key_type: Optional[type] = types[key].python_type
+    except NotImplementedError:
+        key_type = None
+
+    return KeysetSource(
+        table_name,
+        table(table_name, *[column(name, types[name]) for name in selected]),
+        key,
+        key_type,
+    )
+
+
+def query_source(
+    sql: str, key: str, params: Optional[Dict[str, Any]] = None
+) -> KeysetSource:
+    """Build a keyset source over an arbitrary read query."""
+    if not is_read_query(sql):
+        raise ExportError("Only single read-only statements can be exported")
+    statement = text(sql.strip().rstrip(";")).bindparams(**(params or {}))
+    subquery = statement.columns(column(key)).subquery("export_source")
+    return KeysetSource("export", subquery, key, select_all=True)
+
+
+async def iter_keyset_chunks(
+    engine: AsyncEngine,
+    source: KeysetSource,
+    after: Any = None,
+    chunk_size: int = 10000,
+) -> AsyncIterator[tuple[List[str], Sequence[Row]]]:
+    """Yield ``(columns, rows)`` pages in key order starting after ``after``.
+
+    Each page checks a connection out only for the duration of its own
+    SELECT, so a slow client never pins a pooled connection. The first
+    page is yielded even when empty, so encoders still learn the columns.
+    """
+    after = source.coerce_key(after)
+    first = True
+    while True:
+        async with engine.connect() as conn:
+            result = await conn.execute(source.page(after, chunk_size))
+            columns = list(result.keys())
+            with timed("fetch"):
+                rows = result.fetchall()
+        if not rows and not first:
+            return
+        first = False
+        yield columns, rows
+        if not rows:
+            return
+        if len(rows) < chunk_size:
+            return
+        after = rows[-1][columns.index(source.key)]
+
+
+class ExportEncoder:
+    """Base class for incremental encoders; one ``encode`` call per chunk."""
+
+    media_type = "application/octet-stream"
+    extension = "bin"
+
+    def encode(self, columns: List[str], rows: Sequence[Row]) -> bytes:
+        """Encode one chunk of rows."""
+        raise NotImplementedError
+
+    def finish(self) -> bytes:
+        """Return any trailing bytes once all chunks are encoded."""
+        return b""
+
+
+class NdjsonEncoder(ExportEncoder):
+    """One JSON object per line."""
+
+    media_type = "application/x-ndjson"
+    extension = "ndjson"
+
+    def encode(self, columns: List[str], rows: Sequence[Row]) -> bytes:
+        return ndjson_rows(columns, rows)
+
+
+class CsvEncoder(ExportEncoder):
+    """RFC 4180 CSV; the header row is skipped when resuming an export."""
+
+    media_type = "text/csv"
+    extension = "csv"
+
+    def __init__(self, header: bool = True):
+        self._header = header
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(self._buffer, lineterminator="\n")
+
+    def encode(self, columns: List[str], rows: Sequence[Row]) -> bytes:
+        if self._header:
+            self._writer.writerow(columns)
+            self._header = False
+        for row in rows:
+            self._writer.writerow(
+                [
+                    value
+                    if value is None or isinstance(value, (str, int, float))
+                    else json_default(value)
+                    for value in row
+                ]
+            )
+        data = self._buffer.getvalue().encode()
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        return data
+
+
+class _DrainableSink:
+    """Write-only file object whose contents are handed off after each chunk."""
+
+    def __init__(self) -> None:
+        self._parts: List[bytes] = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data: Any) -> int:
+        data = bytes(data)
+        self._parts.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts = []
+        return data
+
+
+def _arrow_type(column_type: Any) -> Any:
+    """Arrow type for a SQLAlchemy column type, None if it has no clear one."""
+    import pyarrow as pa
+
+    try:
+        python_type = column_type.python_type
+    except NotImplementedError:
+        return None
+    if issubclass(python_type, bool):
+        return pa.bool_()
+    if issubclass(python_type, int):
+        return pa.uint64() if getattr(column_type, "unsigned", False) else pa.int64()
+    if issubclass(python_type, float):
+        return pa.float64()
+    if issubclass(python_type, Decimal):
+        precision = getattr(column_type, "precision", None)
+        if precision is None or precision > 38:
+            return pa.string()
+        return pa.decimal128(precision, getattr(column_type, "scale", None) or 0)
+    if issubclass(python_type, datetime):
+        return pa.timestamp("us")
+    if issubclass(python_type, date):
+        return pa.date32()
+    if issubclass(python_type, time):
+        return pa.time64("us")
+    if issubclass(python_type, str):
+        return pa.string()
+    if issubclass(python_type, bytes):
+        return pa.binary()
+    return None
+
+
+class ParquetEncoder(ExportEncoder):
+    """Parquet file written as one row group per chunk.
+
+    The schema comes from the declared column types where they are known,
+    so a chunk of NULLs or small numbers cannot pin a column to the wrong
+    type; only the remaining columns are inferred from the first chunk.
+    """
+
+    media_type = "application/vnd.apache.parquet"
+    extension = "parquet"
+
+    def __init__(self, column_types: Optional[Dict[str, Any]] = None) -> None:
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise ExportError("Parquet export requires the pyarrow package")
+        self._column_types = column_types or {}
+        self._sink = _DrainableSink()
+        self._writer: Any = None
+        self._schema: Any = None
+        self._as_text: List[str] = []
+
+    def _build_schema(self, columns: List[str], data: Dict[str, List[Any]]) -> Any:
+        import pyarrow as pa
+
+        fields = []
+        for name in columns:
+            declared = self._column_types.get(name)
+            arrow_type = _arrow_type(declared) if declared is not None else None
+            if arrow_type is None:
+                arrow_type = pa.array(data[name]).type
+            if pa.types.is_null(arrow_type):
+                # All-NULL columns in the first chunk say nothing about the type
+                arrow_type = pa.string()
+            if pa.types.is_string(arrow_type) and isinstance(declared, Numeric):
+                # Decimals wider than decimal128 are kept exact as text
+                self._as_text.append(name)
+            fields.append(pa.field(name, arrow_type))
+        return pa.schema(fields)
+
+    def encode(self, columns: List[str], rows: Sequence[Row]) -> bytes:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        data = {name: [row[i] for row in rows] for i, name in enumerate(columns)}
+        if self._writer is None:
+            self._schema = self._build_schema(columns, data)
+            self._writer = pq.ParquetWriter(self._sink, self._schema)
+        for name in self._as_text:
+            data[name] = [None if v is None else str(v) for v in data[name]]
+        if rows:
+            self._writer.write_table(pa.Table.from_pydict(data, schema=self._schema))
+        return self._sink.drain()
+
+    def finish(self) -> bytes:
+        if self._writer is not None:
+            self._writer.close()
+        return self._sink.drain()
+
+
+def get_encoder(
+    export_format: ExportFormat,
+    resume: bool = False,
+    column_types: Optional[Dict[str, Any]] = None,
+) -> ExportEncoder:
+    """Create an encoder for the requested format."""
+    if export_format == ExportFormat.CSV:
+        return CsvEncoder(header=not resume)
+    if export_format == ExportFormat.PARQUET:
+        return ParquetEncoder(column_types)
+    return NdjsonEncoder()
+
+
+async def open_export(
+    engine: AsyncEngine,
+    source: KeysetSource,
+    encoder: ExportEncoder,
+    after: Any = None,
+    chunk_size: int = 10000,
+) -> AsyncIterator[bytes]:
+    """Start an export and return its encoded byte stream.
+
+    The first page is fetched eagerly so that SQL errors are raised here,
+    before a response has started, instead of truncating the body.
+    """
+    chunks = iter_keyset_chunks(engine, source, after, chunk_size)
+    try:
+        first = await chunks.__anext__()
+    except StopAsyncIteration:
+        first = None
+    except SQLAlchemyError as e:
+        raise ExportError(str(e.__cause__ or e)) from e
+    return _encode_chunks(first, chunks, encoder)
+
+
+async def _encode_chunks(
+    first: Optional[tuple[List[str], Sequence[Row]]],
+    chunks: AsyncIterator[tuple[List[str], Sequence[Row]]],
+    encoder: ExportEncoder,
+) -> AsyncIterator[bytes]:
+    """Encode pages one at a time, holding at most one chunk in memory."""
+    if first is not None:
+        with timed("serialize"):
+            data = encoder.encode(*first)
+        yield data
+        async for columns, rows in chunks:
+            with timed("serialize"):
+                data = encoder.encode(columns, rows)
+            yield data
+    trailer = encoder.finish()
+    if trailer:
+        yield trailer
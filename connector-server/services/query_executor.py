@@ -0,0 +1,386 @@
+"""
+Query execution service with server-side cursor streaming.
+
+Statements can run under an execution time budget and be tied to the
+client's connection: when the budget runs out or the client disconnects,
+the statement is cancelled on the database server instead of running to
+completion on a pooled connection nobody is waiting for.
+"""
+import asyncio
+import json
+import logging
+import math
+import re
+import time
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Sequence,
+)
+
+import anyio
+from sqlalchemy import Row, text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import (
+    AsyncConnection,
+    AsyncEngine,
+    AsyncResult,
+    create_async_engine,
+)
+from sqlalchemy.pool import NullPool
+
+from core.timing import timed
+from services.sql_analyzer import StatementType, analyze_sql
+from utils.formatters import ndjson_rows
+
+logger = logging.getLogger(__name__)
+
+# Completes when the client that asked for the statement goes away
+Disconnected = Callable[[], Awaitable[Any]]
+
+# ER_QUERY_TIMEOUT: stopped by max_execution_time
+_MYSQL_QUERY_TIMEOUT = 3024
+
+_LEADING_SELECT = re.compile(r"^(\s*select\b)(\s*/\*\+)?", re.IGNORECASE)
+
+
+class QueryError(Exception):
+    """Raised when a query is rejected or fails before streaming starts."""
+
+
+class QueryTimeoutError(QueryError):
+    """Raised when a statement is cancelled for exceeding its time budget."""
+
+
+def is_read_query(sql: str) -> bool:
+    """Check that a statement is a single read-only query."""
+    analysis = analyze_sql(sql)
+    return analysis.error is None and analysis.statement_type == StatementType.READ
+
+
+def with_execution_time_hint(sql: str, budget_ms: int) -> str:
+    """Add a MySQL ``MAX_EXECUTION_TIME`` optimizer hint to a SELECT.
+
+    Only a leading SELECT can carry the hint; other reads (``WITH``,
+    parenthesised unions) are returned unchanged and rely on KILL QUERY.
+    """
+    match = _LEADING_SELECT.match(sql)
+    if match is None:
+        return sql
+    hint = f"MAX_EXECUTION_TIME({budget_ms})"
+    if match.group(2):
+        # Join the statement's own hint comment; MySQL reads only the first
+        return f"{sql[:match.end()]} {hint}{sql[match.end():]}"
+    return f"{match.group(1)} /*+ {hint} */{sql[match.end(1):]}"
+
+
+async def kill_query(engine: AsyncEngine, thread_id: int) -> None:
+    """Run ``KILL QUERY`` for a MySQL connection from a side connection.
+
+    The side connection is opened outside the pool, which may be exhausted
+    by the very statements being cancelled; it counts against
+    ``db_reserved_connections``.
+    """
+    side = create_async_engine(engine.url, poolclass=NullPool)
+    try:
+        async with side.connect() as conn:
+            await conn.execute(text(f"KILL QUERY {int(thread_id)}"))
+    finally:
+        await side.dispose()
+
+
+class StatementGuard:
+    """Cancels the statement running on a connection when it must not finish.
+
+    ``start`` watches for the ``budget`` (seconds) to run out and for
+    ``disconnected`` to complete, and then cancels the statement: with
+    ``KILL QUERY`` on MySQL, ``interrupt()`` on SQLite. ``stop`` ends the
+    watch and waits for a cancellation already under way, so it cannot
+    land on the connection's next user. After a cancellation ``settle``
+    checks the connection still works before it returns to the pool and
+    invalidates it otherwise.
+    """
+
+    def __init__(
+        self,
+        connection: AsyncConnection,
+        budget: Optional[float] = None,
+        disconnected: Optional[Disconnected] = None,
+    ):
+        self.connection = connection
+        self.budget = budget
+        self._disconnected = disconnected
+        # "timeout", "disconnect" or "abandoned" once cancelled
+        self.reason: Optional[str] = None
+        self._driver: Any = None
+        self._watcher: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        """Start watching; call once the connection is checked out."""
+        raw = await self.connection.get_raw_connection()
+        self._driver = raw.driver_connection
+        if self.budget is not None or self._disconnected is not None:
+            self._watcher = asyncio.create_task(self._watch())
+
+    async def _watch(self) -> None:
+        events: Dict[asyncio.Future, str] = {}
+        if self.budget is not None:
+            events[asyncio.ensure_future(asyncio.sleep(self.budget))] = "timeout"
+        if self._disconnected is not None:
+            events[asyncio.ensure_future(self._disconnected())] = "disconnect"
+        try:
+            done, _ = await asyncio.wait(events, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for event in events:
+                event.cancel()
+        first = done.pop()
+        # A disconnect watch that fails still means the client is unreachable
+        first.exception()
+        await self.cancel(events[first])
+
+    async def cancel(self, reason: str) -> None:
+        """Cancel the running statement now, unless already cancelled."""
+        if self.reason is not None:
+            return
+        self.reason = reason
+        watcher = self._watcher
+        if watcher is not None and watcher is not asyncio.current_task():
+            # Cancelled from outside; nothing is left for the watch to do
+            watcher.cancel()
+        try:
+            dialect = self.connection.dialect.name
+            if dialect == "mysql":
+                await kill_query(self.connection.engine, self._driver.thread_id())
+            elif dialect == "sqlite":
+                await self._driver.interrupt()
+        except Exception as e:
+            logger.warning("Could not cancel statement (%s): %s", reason, e)
+
+    async def stop(self) -> None:
+        """Stop watching; a cancellation in flight completes first."""
+        watcher, self._watcher = self._watcher, None
+        if watcher is None:
+            return
+        if self.reason is None:
+            watcher.cancel()
+        await asyncio.gather(watcher, return_exceptions=True)
+
+    async def settle(self) -> None:
+        """After a cancellation, make sure the connection is fit for reuse."""
+        if self.reason is None:
+            return
+        try:
+            await self.connection.execute(text("SELECT 1"))
+        except SQLAlchemyError:
+            # A late KILL QUERY or a half-read result; let the pool replace it
+            await self.connection.invalidate()
+
+    def describe(self, error: BaseException) -> str:
+        """Message for an error raised by the guarded statement."""
+        if self.timed_out(error):
+            return f"Query exceeded its {self.budget_ms}ms execution time budget"
+        if self.reason == "disconnect":
+            return "Query cancelled: the client disconnected"
+        return str(error.__cause__ or error)
+
+    def error(self, error: SQLAlchemyError) -> QueryError:
+        """QueryError, or QueryTimeoutError, for a failed statement."""
+        cls = QueryTimeoutError if self.timed_out(error) else QueryError
+        return cls(self.describe(error))
+
+    def timed_out(self, error: BaseException) -> bool:
+        """Whether the statement was stopped because its budget ran out."""
+        orig = getattr(error, "orig", None)
+        code = orig.args[0] if orig is not None and orig.args else None
+        return self.reason == "timeout" or code == _MYSQL_QUERY_TIMEOUT
+
+    @property
+    def budget_ms(self) -> Optional[int]:
+        return None if self.budget is None else math.ceil(self.budget * 1000)
+
+
+class QueryStream:
+    """Rows of an executed query, read from a server-side cursor in chunks."""
+
+    def __init__(
+        self,
+        connection: AsyncConnection,
+        result: AsyncResult,
+        fetch_size: int,
+        started: Optional[float] = None,
+        buffer_rows: int = 0,
+        guard: Optional[StatementGuard] = None,
+    ):
+        self._connection = connection
+        self._result = result
+        self._guard = guard or StatementGuard(connection)
+        self.fetch_size = fetch_size
+        self.columns: List[str] = list(result.keys())
+        self.row_count = 0
+        self.completed = False
+        self.error: Optional[str] = None
+        # Rows kept for the result cache until more than buffer_rows arrive
+        self.buffered: Optional[List[Row]] = [] if buffer_rows else None
+        self._buffer_rows = buffer_rows
+        self._started = started or time.perf_counter()
+        self._finished: Optional[float] = None
+        self._closed = False
+        # Set when a fetch was cut off by task cancellation
+        self._interrupted = False
+
+    @property
+    def execution_time(self) -> float:
+        """Seconds from execution until the stream finished (or now)."""
+        return (self._finished or time.perf_counter()) - self._started
+
+    async def chunks(self) -> AsyncIterator[Sequence[Row]]:
+        """Yield rows in fetchmany-sized partitions."""
+        partitions = self._result.partitions(self.fetch_size)
+        while True:
+            with timed("fetch"):
+                partition = await anext(partitions, None)
+            if partition is None:
+                return
+            yield partition
+
+    async def iter_ndjson(self) -> AsyncIterator[bytes]:
+        """Yield the result as NDJSON, one encoded chunk per partition."""
+        columns = self.columns
+        try:
+            async for rows in self.chunks():
+                self.row_count += len(rows)
+                if self.buffered is not None:
+                    self.buffered.extend(rows)
+                    if len(self.buffered) > self._buffer_rows:
+                        self.buffered = None
+                with timed("serialize"):
+                    chunk = ndjson_rows(columns, rows)
+                yield chunk
+            self.completed = True
+        except SQLAlchemyError as e:
+            # Headers are already sent, so report the failure in-band
+            self.error = self._guard.describe(e)
+            yield (json.dumps({"error": self.error}) + "\n").encode()
+        except asyncio.CancelledError:
+            self._interrupted = True
+            raise
+        finally:
+            # The response task may be cancelled (client gone); finish anyway
+            with anyio.CancelScope(shield=True):
+                await self.close()
+
+    async def close(self) -> None:
+        """Release the cursor and return the connection to the pool.
+
+        A stream that did not run to the end has its statement cancelled
+        first, so closing does not drain the rest of the result; one whose
+        read was cut off mid-way has its connection discarded, since the
+        protocol state is unknown.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        self._finished = time.perf_counter()
+        guard = self._guard
+        try:
+            if not self.completed and self.error is None:
+                await guard.cancel("abandoned")
+            await guard.stop()
+            if self._interrupted:
+                await self._connection.invalidate()
+                return
+            try:
+                await self._result.close()
+            except SQLAlchemyError:
+                # Draining a cancelled statement reports the cancellation
+                if guard.reason is None:
+                    raise
+            await guard.settle()
+        finally:
+            await self._connection.close()
+
+
+async def open_query_stream(
+    engine: AsyncEngine,
+    sql: str,
+    params: Optional[Dict[str, Any]] = None,
+    fetch_size: int = 1000,
+    buffer_rows: int = 0,
+    budget: Optional[float] = None,
+    disconnected: Optional[Disconnected] = None,
+) -> QueryStream:
+    """Execute a read query on a server-side cursor and return its stream.
+
+    With ``buffer_rows`` the stream also keeps the rows it has sent, as long
+    as there are no more than that many, so the caller can cache them.
+    ``budget`` (seconds) bounds the statement from execution until the
+    stream is closed; it and ``disconnected`` cancel it on the server.
+    """
+    if not is_read_query(sql):
+        raise QueryError("Only single read-only statements are allowed")
+
+    started = time.perf_counter()
+    connection = await engine.connect()
+    guard = StatementGuard(connection, budget, disconnected)
+    try:
+        await guard.start()
+        if budget is not None and connection.dialect.name == "mysql":
+            # The server stops the statement itself, even if we stall
+            sql = with_execution_time_hint(sql, math.ceil(budget * 1000))
+        result = await connection.stream(
+            text(sql),
+            params or {},
+            execution_options={"max_row_buffer": fetch_size},
+        )
+    except SQLAlchemyError as e:
+        await guard.stop()
+        await guard.settle()
+        await connection.close()
+        raise guard.error(e) from e
+    except BaseException:
+        await guard.stop()
+        await connection.close()
+        raise
+
+    return QueryStream(connection, result, fetch_size, started, buffer_rows, guard)
+
+
+async def execute_statement(
+    engine: AsyncEngine,
+    sql: str,
+    params: Optional[Dict[str, Any]] = None,
+    budget: Optional[float] = None,
+    disconnected: Optional[Disconnected] = None,
+    discard_connection: bool = False,
+) -> int:
+    """Run a write or DDL statement in its own transaction.
+
+    Returns the number of affected rows as reported by the driver.
+    ``budget`` and ``disconnected`` cancel the statement as for reads;
+    the commit itself is not cancelled. With ``discard_connection`` the
+    connection is closed afterwards instead of going back to the pool, so
+    session state the statement set (USE, SET, LOCK TABLES, PREPARE, ...)
+    cannot reach later requests.
+    """
+    async with engine.connect() as conn:
+        guard = StatementGuard(conn, budget, disconnected)
+        await guard.start()
+        try:
+            async with conn.begin():
+                try:
+                    result = await conn.execute(text(sql), params or {})
+                finally:
+                    await guard.stop()
+            return max(result.rowcount, 0)
+        except SQLAlchemyError as e:
+            raise guard.error(e) from e
+        finally:
+            if discard_connection:
+                await conn.invalidate()
+            else:
+                await guard.settle()
@@ -0,0 +1,287 @@
+"""
+Query performance rollups maintained as query history is written.
+"""
+from datetime import datetime, timedelta
+from enum import Enum
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import bindparam, insert, select, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncConnection
+from sqlmodel import SQLModel
+
+from core.config import settings
+from models.query_history import QueryStatus
+from models.query_rollup import QueryRollup
+from utils.sketch import LatencySketch
+
+EPOCH = datetime(1970, 1, 1)
+
+# (bucket_start, dimension, key)
+RollupKey = Tuple[datetime, str, str]
+
+
+class RollupDimension(str, Enum):
+    """What a rollup row is keyed by besides its time bucket."""
+
+    CLIENT = "client"
+    FINGERPRINT = "fingerprint"
+
+
+class RollupGroup(str, Enum):
+    """What a report aggregates rollups by."""
+
+    FINGERPRINT = "fingerprint"
+    CLIENT = "client"
+    BUCKET = "bucket"
+
+
+class RollupOrder(str, Enum):
+    """Report ordering, largest first (buckets are always chronological)."""
+
+    COUNT = "count"
+    ERRORS = "error_count"
+    TOTAL_TIME = "total_time"
+    MEAN_TIME = "mean_time"
+    MAX_TIME = "max_time"
+    P50 = "p50"
+    P95 = "p95"
+    P99 = "p99"
+
+
+class RollupTotals:
+    """Counters and latency sketch for one rollup row or report group."""
+
+    __slots__ = ("count", "error_count", "total_time", "max_time", "sketch")
+
+    def __init__(self, sketch: LatencySketch):
+        self.count = 0
+        self.error_count = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.sketch = sketch
+
+    def add(self, status: QueryStatus, execution_time: Optional[float]) -> None:
+        """Count one history record."""
+        self.count += 1
+        if status == QueryStatus.ERROR:
+            self.error_count += 1
+        if execution_time is not None:
+            self.total_time += execution_time
+            self.max_time = max(self.max_time, execution_time)
+            self.sketch.add(execution_time)
+
+    def merge(self, other: "RollupTotals") -> None:
+        self.count += other.count
+        self.error_count += other.error_count
+        self.total_time += other.total_time
+        self.max_time = max(self.max_time, other.max_time)
+        self.sketch.merge(other.sketch)
+
+    def summary(self) -> Dict[str, Any]:
+        """Report fields; times are seconds over the records that had one."""
+        timed = self.sketch.count
+
+        def rounded(value: Optional[float]) -> Optional[float]:
+            return None if value is None else round(value, 6)
+
+        return {
+            "count": self.count,
+            "error_count": self.error_count,
+            "error_rate": (
+                round(self.error_count / self.count, 4) if self.count else 0.0
+            ),
+            "total_time": rounded(self.total_time),
+            "mean_time": rounded(self.total_time / timed) if timed else None,
+            "max_time": rounded(self.max_time),
+            "p50": rounded(self.sketch.quantile(0.5)),
+            "p95": rounded(self.sketch.quantile(0.95)),
+            "p99": rounded(self.sketch.quantile(0.99)),
+        }
+
+
+class QueryRollups:
+    """Per time bucket rollups of query history by client and by fingerprint.
+
+    ``apply`` folds a batch of already committed history rows into the
+    ``query_rollups`` table inside the caller's transaction: existing rows
+    are locked, merged with the batch and updated, missing rows are
+    inserted. Reports then read one
+    row per bucket and client (or fingerprint) instead of scanning
+    ``query_history``, and merge the latency sketches for percentiles over
+    the requested range. Clients and fingerprints are rolled up separately
+    rather than as pairs, which keeps the row count to buckets times
+    (clients + fingerprints).
+    """
+
+    def __init__(self, bucket_seconds: int = 300, relative_accuracy: float = 0.01):
+        self.bucket_seconds = bucket_seconds
+        self.relative_accuracy = relative_accuracy
+
+    def bucket_start(self, at: datetime) -> datetime:
+        """Start of the bucket containing ``at`` (naive UTC)."""
+        seconds = int((at - EPOCH).total_seconds())
+        return EPOCH + timedelta(seconds=seconds - seconds % self.bucket_seconds)
+
+    @staticmethod
+    def _stored(row: Any) -> RollupTotals:
+        totals = RollupTotals(LatencySketch.from_bytes(row.sketch))
+        totals.count, totals.error_count = row.count, row.error_count
+        totals.total_time, totals.max_time = row.total_time, row.max_time
+        return totals
+
+    def aggregate(
+        self, rows: Iterable[Dict[str, Any]]
+    ) -> Dict[RollupKey, RollupTotals]:
+        """Group history rows by bucket, then by client and by fingerprint."""
+        groups: Dict[RollupKey, RollupTotals] = {}
+        for row in rows:
+            bucket = self.bucket_start(row["executed_at"])
+            status = row.get("status", QueryStatus.SUCCESS)
+            execution_time = row.get("execution_time")
+            for key in (
+                (bucket, RollupDimension.CLIENT.value, row.get("client_id") or ""),
+                (
+                    bucket,
+                    RollupDimension.FINGERPRINT.value,
+                    row.get("fingerprint") or "",
+                ),
+            ):
+                totals = groups.get(key)
+                if totals is None:
+                    totals = groups[key] = RollupTotals(
+                        LatencySketch(self.relative_accuracy)
+                    )
+                totals.add(status, execution_time)
+        return groups
+
+    async def apply(
+        self, conn: AsyncConnection, rows: Iterable[Dict[str, Any]]
+    ) -> None:
+        """Fold history rows into the rollup table within ``conn``'s transaction."""
+        deltas = self.aggregate(rows)
+        if not deltas:
+            return
+        table = SQLModel.metadata.tables[QueryRollup.__tablename__]
+        columns = (table.c.bucket_start, table.c.dimension, table.c.key)
+        keys = sorted(deltas)
+        # Lock in key order so concurrent writers queue instead of deadlocking
+        result = await conn.execute(
+            select(table)
+            .where(tuple_(*columns).in_(keys))
+            .order_by(*columns)
+            .with_for_update()
+        )
+        existing = {(row.bucket_start, row.dimension, row.key): row for row in result}
+
+        updates, inserts = [], []
+        for key in keys:
+            delta = deltas[key]
+            row = existing.get(key)
+            if row is None:
+                inserts.append(
+                    {
+                        "bucket_start": key[0],
+                        "dimension": key[1],
+                        "key": key[2],
+                        "count": delta.count,
+                        "error_count": delta.error_count,
+                        "total_time": delta.total_time,
+                        "max_time": delta.max_time,
+                        "sketch": delta.sketch.to_bytes(),
+                    }
+                )
+                continue
+            totals = self._stored(row)
+            totals.merge(delta)
+            updates.append(
+                {
+                    "_id": row.id,
+                    "_count": totals.count,
+                    "_error_count": totals.error_count,
+                    "_total_time": totals.total_time,
+                    "_max_time": totals.max_time,
+                    "_sketch": totals.sketch.to_bytes(),
+                }
+            )
+
+        if updates:
+            await conn.execute(
+                update(table)
+                .where(table.c.id == bindparam("_id"))
+                .values(
+                    count=bindparam("_count"),
+                    error_count=bindparam("_error_count"),
+                    total_time=bindparam("_total_time"),
+                    max_time=bindparam("_max_time"),
+                    sketch=bindparam("_sketch"),
+                ),
+                updates,
+            )
+        if inserts:
+            await conn.execute(insert(table), inserts)
+
+    async def report(
+        self,
+        conn: AsyncConnection,
+        since: datetime,
+        until: datetime,
+        group_by: RollupGroup = RollupGroup.FINGERPRINT,
+        order_by: RollupOrder = RollupOrder.P95,
+        client_id: Optional[str] = None,
+        fingerprint: Optional[str] = None,
+        limit: int = 20,
+    ) -> List[Dict[str, Any]]:
+        """Merged rollups of buckets overlapping ``[since, until)``.
+
+        Raises ValueError for a filter the rollups cannot answer: clients
+        and fingerprints are rolled up separately, so a report filters on
+        at most one of them, and only when grouping by that one or by bucket.
+        """
+        if client_id is not None and fingerprint is not None:
+            raise ValueError("Filter by client_id or fingerprint, not both")
+        if (group_by == RollupGroup.FINGERPRINT and client_id is not None) or (
+            group_by == RollupGroup.CLIENT and fingerprint is not None
+        ):
+            raise ValueError(
+                f"Cannot filter a report grouped by {group_by.value} on another "
+                "dimension"
+            )
+        if group_by == RollupGroup.FINGERPRINT or fingerprint is not None:
+            dimension, key = RollupDimension.FINGERPRINT, fingerprint
+        else:
+            dimension, key = RollupDimension.CLIENT, client_id
+
+        table = SQLModel.metadata.tables[QueryRollup.__tablename__]
+        query = select(table).where(
+            table.c.dimension == dimension.value,
+            table.c.bucket_start >= self.bucket_start(since),
+            table.c.bucket_start < until,
+        )
+        if key is not None:
+            query = query.where(table.c.key == key)
+
+        groups: Dict[Any, RollupTotals] = {}
+        for row in await conn.execute(query):
+            group = row.bucket_start if group_by == RollupGroup.BUCKET else row.key
+            totals = self._stored(row)
+            if group in groups:
+                groups[group].merge(totals)
+            else:
+                groups[group] = totals
+
+        summaries = [
+            {
+                "key": group.isoformat() if isinstance(group, datetime) else group,
+                **totals.summary(),
+            }
+            for group, totals in sorted(groups.items())
+        ]
+        if group_by != RollupGroup.BUCKET:
+            summaries.sort(key=lambda s: s[order_by.value] or 0.0, reverse=True)
+        return summaries[:limit]
+
+
+query_rollups = QueryRollups(
+    bucket_seconds=settings.rollup_bucket_seconds,
+    relative_accuracy=settings.rollup_sketch_accuracy,
+)
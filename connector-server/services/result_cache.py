@@ -0,0 +1,194 @@
+"""
+Redis cache for read query results with table-level invalidation.
+
+Entries are keyed by the normalized SQL text plus bound parameters and
+stored as msgpack together with the version of every table the query reads.
+Writes bump the per-table version counters, so a lookup fetches the entry and
+the current versions in one pipelined round trip and treats any mismatch as
+stale; dependent entries never have to be found with ``SCAN``. Table names
+are schema-qualified, unqualified ones with the connection's default
+database, so ``items`` and ``shop.items`` share a version counter.
+"""
+import hashlib
+import json
+import logging
+import time
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Sequence
+
+import msgpack
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+from sqlalchemy.engine import make_url
+
+from core.config import settings
+from core.redis import get_redis
+from services.sql_analyzer import analyze_sql
+from utils.formatters import json_default
+
+logger = logging.getLogger(__name__)
+
+
+class CacheLookup(NamedTuple):
+    """Result of a cache lookup; ``columns``/``rows`` are set on a hit."""
+
+    key: str
+    tables: List[str]
+    versions: List[int]
+    columns: Optional[List[str]] = None
+    rows: Optional[List[List[Any]]] = None
+
+    @property
+    def hit(self) -> bool:
+        """Whether a fresh entry was found."""
+        return self.rows is not None
+
+
+class QueryResultCache:
+    """Read-through result cache in Redis."""
+
+    def __init__(
+        self,
+        redis_factory: Callable[[], Redis],
+        ttl: int = 30,
+        max_rows: int = 10000,
+        key_prefix: str = "qcache:",
+        version_prefix: str = "qver:",
+        retry_seconds: float = 5.0,
+        default_schema: Optional[str] = None,
+    ):
+        self._redis_factory = redis_factory
+        self.default_schema = default_schema.lower() if default_schema else None
+        self._retry_seconds = retry_seconds
+        self._retry_at = 0.0
+        self.ttl = ttl
+        self.max_rows = max_rows
+        self._key_prefix = key_prefix
+        self._version_prefix = version_prefix
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.stores = 0
+        self.skipped = 0
+        self.errors = 0
+
+    def cache_key(
+        self, normalized_sql: str, params: Optional[Dict[str, Any]] = None
+    ) -> str:
+        """Key for a normalized statement and its bound parameters."""
+        material = (
+            normalized_sql
+            + "\0"
+            + json.dumps(params or {}, sort_keys=True, default=str)
+        )
+        return self._key_prefix + hashlib.sha256(material.encode()).hexdigest()
+
+    def table_name(self, table: str) -> str:
+        """Schema-qualified, lower-case name a table's version is kept under."""
+        name = table.replace("`", "").lower()
+        if "." not in name and self.default_schema:
+            name = f"{self.default_schema}.{name}"
+        return name
+
+    async def get(
+        self, sql: str, params: Optional[Dict[str, Any]] = None
+    ) -> Optional[CacheLookup]:
+        """Look up a query; returns None if the cache is unavailable."""
+        if time.monotonic() < self._retry_at:
+            return None
+        analysis = analyze_sql(sql)
+        tables = sorted({self.table_name(table) for table in analysis.tables})
+        key = self.cache_key(analysis.normalized, params)
+        try:
+            async with self._redis_factory().pipeline(transaction=False) as pipe:
+                pipe.get(key)
+                if tables:
+                    pipe.mget([self._version_prefix + table for table in tables])
+                replies = await pipe.execute()
+        except (RedisError, OSError) as e:
+            self._failed("lookup", e)
+            return None
+
+        raw = replies[0]
+        versions = [int(v or 0) for v in replies[1]] if tables else []
+        if raw is None:
+            self.misses += 1
+            return CacheLookup(key, tables, versions)
+
+        try:
+            entry = msgpack.unpackb(raw)
+        except (ValueError, msgpack.UnpackException):
+            self.misses += 1
+            return CacheLookup(key, tables, versions)
+        if entry["v"] != versions:
+            # A table was written since this entry was stored
+            self.stale += 1
+            self.misses += 1
+            return CacheLookup(key, tables, versions)
+
+        self.hits += 1
+        return CacheLookup(key, tables, versions, entry["c"], entry["r"])
+
+    async def set(
+        self, lookup: CacheLookup, columns: Sequence[str], rows: Sequence[Sequence[Any]]
+    ) -> bool:
+        """Store a result under the versions seen at lookup time."""
+        if len(rows) > self.max_rows:
+            self.skipped += 1
+            return False
+        payload = msgpack.packb(
+            {"v": lookup.versions, "c": list(columns), "r": [list(r) for r in rows]},
+            default=json_default,
+        )
+        try:
+            await self._redis_factory().set(lookup.key, payload, ex=self.ttl)
+        except (RedisError, OSError) as e:
+            self._failed("store", e)
+            return False
+        self.stores += 1
+        return True
+
+    async def invalidate_tables(self, tables: Iterable[str]) -> None:
+        """Bump table versions after a write so dependent entries go stale."""
+        names = sorted({self.table_name(table) for table in tables})
+        if not names:
+            return
+        try:
+            async with self._redis_factory().pipeline(transaction=False) as pipe:
+                for name in names:
+                    pipe.incr(self._version_prefix + name)
+                await pipe.execute()
+        except (RedisError, OSError) as e:
+            self._failed("invalidation", e)
+
+    def _failed(self, operation: str, error: Exception) -> None:
+        # Bypass the cache for a while rather than paying a timeout per query
+        self.errors += 1
+        self._retry_at = time.monotonic() + self._retry_seconds
+        logger.warning("Query cache %s failed: %s", operation, error)
+
+    async def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters plus Redis eviction and expiry totals."""
+        stats: Dict[str, Any] = {
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale": self.stale,
+            "stores": self.stores,
+            "skipped": self.skipped,
+            "errors": self.errors,
+        }
+        try:
+            info = await self._redis_factory().info("stats")
+            stats["evicted_keys"] = info.get("evicted_keys")
+            stats["expired_keys"] = info.get("expired_keys")
+        except (RedisError, OSError):
+            pass
+        return stats
+
+
+query_result_cache = QueryResultCache(
+    get_redis,
+    ttl=settings.query_cache_ttl_seconds,
+    max_rows=settings.query_cache_max_rows,
+    # Only primary reads are cached, and USE never outlives its request there
+    default_schema=make_url(settings.database_url).database,
+)
@@ -0,0 +1,494 @@
+"""
+SQL statement analysis: classification, table extraction and fingerprints.
+
+Statements are tokenized rather than matched with regular expressions on
+the raw text, so keywords, semicolons and comments inside string literals
+or quoted identifiers cannot change the outcome. Analyses are memoized by
+raw SQL text because clients tend to send the same statements repeatedly.
+"""
+import hashlib
+import re
+from enum import Enum
+from functools import lru_cache
+from typing import List, NamedTuple, Optional, Set, Tuple
+
+from core.config import settings
+
+
+class StatementType(str, Enum):
+    """Statement classes; each maps to the API key scope it requires."""
+
+    READ = "read"
+    WRITE = "write"
+    DDL = "ddl"
+    ADMIN = "admin"
+    MULTI = "multi"
+    UNKNOWN = "unknown"
+
+
+# Scope an API key needs per statement type; None means never allowed
+REQUIRED_SCOPES = {
+    StatementType.READ: "read",
+    StatementType.WRITE: "write",
+    StatementType.DDL: "admin",
+    StatementType.ADMIN: "admin",
+    StatementType.MULTI: None,
+    StatementType.UNKNOWN: None,
+}
+
+_READ_VERBS = {"select", "show", "describe", "desc", "explain", "values", "table"}
+_WRITE_VERBS = {"insert", "update", "delete", "replace", "load"}
+_DDL_VERBS = {"create", "alter", "drop", "truncate", "rename"}
+_ADMIN_VERBS = {
+    "grant",
+    "revoke",
+    "set",
+    "use",
+    "kill",
+    "flush",
+    "lock",
+    "unlock",
+    "start",
+    "begin",
+    "commit",
+    "rollback",
+    "savepoint",
+    "release",
+    "xa",
+    "call",
+    "do",
+    "handler",
+    "prepare",
+    "execute",
+    "deallocate",
+    "install",
+    "uninstall",
+    "reset",
+    "purge",
+    "change",
+    "shutdown",
+    "restart",
+    "analyze",
+    "optimize",
+    "repair",
+    "check",
+    "checksum",
+    "cache",
+}
+_DML_VERBS = {"select", "insert", "update", "delete", "replace"}
+# EXPLAIN options that may precede the explained statement
+_EXPLAIN_OPTIONS = {"analyze", "extended", "partitions", "format"}
+# Named locks belong to the session and outlive the request on a pooled
+# connection, so they are refused outright
+_LOCK_FUNCTIONS = {"get_lock", "release_lock", "release_all_locks"}
+
+# Keywords after which table references follow
+_TABLE_CONTEXT = {"from", "join", "into", "update", "table", "truncate"}
+# Words that can sit between such a keyword and the table name
+_TABLE_MODIFIERS = {
+    "low_priority",
+    "high_priority",
+    "delayed",
+    "ignore",
+    "quick",
+    "if",
+    "not",
+    "exists",
+    "temporary",
+    "only",
+    "straight_join",
+    "lateral",
+}
+_NOT_TABLES = {
+    "dual",
+    "outfile",
+    "dumpfile",
+    "select",
+    "values",
+    "set",
+    "nowait",
+    "skip",
+}
+# Words that end a table reference instead of aliasing it
+_CLAUSE_WORDS = {
+    "where",
+    "set",
+    "on",
+    "using",
+    "group",
+    "order",
+    "having",
+    "limit",
+    "union",
+    "left",
+    "right",
+    "inner",
+    "outer",
+    "cross",
+    "natural",
+    "straight_join",
+    "values",
+    "select",
+    "partition",
+    "window",
+    "for",
+    "lock",
+    "into",
+    "use",
+    "force",
+    "ignore",
+    "as",
+    "to",
+    "like",
+    "with",
+    "except",
+    "intersect",
+    "returning",
+    "default",
+    "key",
+}
+
+_TOKEN = re.compile(
+    r"""
+    (?P<ws>\s+)
+  | (?P<exec_comment>/\*![\s\S]*?\*/)
+  | (?P<comment>--(?:[ \t\r\n][^\n]*|$)|\#[^\n]*|/\*[\s\S]*?\*/)
+  | (?P<string>'(?:[^'\\]|\\[\s\S]|'')*'|"(?:[^"\\]|\\[\s\S]|"")*")
+  | (?P<qident>`(?:[^`]|``)*`)
+  | (?P<number>0[xX][0-9a-fA-F]+|0[bB][01]+|[xX]'[0-9a-fA-F]*'|[bB]'[01]*'
+      |(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][+-]?\d+)?(?![\w$]))
+  | (?P<param>:[A-Za-z_]\w*|\?|%s|%\(\w+\)s)
+  | (?P<var>@@?(?:[\w$.]+|`(?:[^`]|``)*`|'[^']*'))
+  | (?P<word>[^\W\d][\w$]*|\d+[^\W\d][\w$]*)
+  | (?P<semi>;)
+  | (?P<unterminated>['"`]|/\*)
+  | (?P<op><=>|<>|!=|<=|>=|:=|\|\||&&|<<|>>|->>?|\S)
+""",
+    re.VERBOSE,
+)
+
+_LITERALS = {"string", "number", "param"}
+
+
+class SqlAnalysis(NamedTuple):
+    """Outcome of analyzing one SQL text.
+
+    ``normalized`` drops comments and redundant whitespace but keeps
+    literals, so it identifies the exact query. ``template`` also replaces
+    literals and parameters with ``?`` and collapses value lists, so queries
+    differing only in values share it; ``fingerprint`` is its digest.
+    """
+
+    statement_type: StatementType
+    statement_count: int
+    tables: Tuple[str, ...]
+    normalized: str
+    template: str
+    fingerprint: str
+    error: Optional[str] = None
+
+    @property
+    def required_scope(self) -> Optional[str]:
+        """API key scope needed to run the statement, None if never allowed."""
+        if self.error:
+            return None
+        return REQUIRED_SCOPES[self.statement_type]
+
+
+Token = Tuple[str, str]
+
+
+def tokenize(sql: str) -> Tuple[List[Token], Optional[str]]:
+    """Split SQL into ``(kind, text)`` tokens, dropping whitespace and comments.
+
+    Returns the tokens plus an error message for input that cannot be
+    analyzed safely.
+    """
+    tokens: List[Token] = []
+    for match in _TOKEN.finditer(sql):
+        # Every alternative of _TOKEN is a named group
+        kind = match.lastgroup or ""
+        if kind == "ws" or kind == "comment":
+            continue
+        if kind == "exec_comment":
+            # MySQL runs the contents of /*! ... */, so they would hide code
+            return tokens, "Executable comments are not allowed"
+        if kind == "unterminated":
+            return tokens, "Unterminated quoted string or comment"
+        tokens.append((kind, match.group()))
+    return tokens, None
+
+
+def _join(tokens: List[Token]) -> str:
+    parts: List[str] = []
+    previous = ""
+    for _, text in tokens:
+        if parts and text not in (".", ",", ")") and previous not in (".", "("):
+            parts.append(" ")
+        parts.append(text)
+        previous = text
+    return "".join(parts)
+
+
+def _templated(tokens: List[Token]) -> List[Token]:
+    """Replace literals with '?' and collapse value lists to '?+'."""
+    out: List[Token] = []
+    for kind, text in tokens:
+        if kind in _LITERALS:
+            if (
+                len(out) >= 3
+                and out[-1][1] == ","
+                and (out[-2][1] == "?+" or (out[-2][1] == "?" and out[-3][1] == "("))
+            ):
+                # IN (1, 2, 3) and VALUES (1, 2) become (?+)
+                out[-2:] = [("param", "?+")]
+                continue
+            out.append(("param", "?"))
+        elif kind == "word":
+            out.append((kind, text.lower()))
+        elif text == ")" and len(out) >= 2 and out[-1][1] == "?" and out[-2][1] == "(":
+            out[-1] = ("param", "?+")
+            out.append((kind, text))
+        else:
+            out.append((kind, text))
+        if (
+            len(out) >= 5
+            and out[-1][1] == ")"
+            and out[-2][1] in ("?", "?+")
+            and out[-3][1] == "("
+            and out[-4][1] == ","
+            and out[-5][1] == ")"
+        ):
+            # Multi-row VALUES (...), (...) keeps a single row
+            del out[-4:]
+    return out
+
+
+def _split(tokens: List[Token]) -> List[List[Token]]:
+    statements: List[List[Token]] = [[]]
+    for token in tokens:
+        if token[0] == "semi":
+            statements.append([])
+        else:
+            statements[-1].append(token)
+    return [statement for statement in statements if statement]
+
+
+def _identifier(token: Token) -> Optional[str]:
+    kind, text = token
+    if kind == "qident":
+        return text[1:-1].replace("``", "`").lower()
+    if kind == "word":
+        return text.lower()
+    return None
+
+
+def _classify(statement: List[Token]) -> StatementType:
+    words = [
+        (depth, text.lower())
+        for depth, (kind, text) in _depths(statement)
+        if kind == "word"
+    ]
+    if not words:
+        return StatementType.UNKNOWN
+    verb = words[0][1]
+    if verb in ("explain", "describe", "desc"):
+        explained = _explained(statement)
+        if explained:
+            # EXPLAIN ANALYZE runs the statement, so it needs that statement's
+            # scope and server
+            return _classify(explained)
+        return StatementType.READ
+    if _assigns_variables(statement):
+        # @var := ... changes the session, like SET @var
+        return StatementType.ADMIN
+    if verb == "with":
+        # The statement type is the first DML verb after the CTE list
+        verb = next(
+            (word for depth, word in words if depth == 0 and word in _DML_VERBS), ""
+        )
+    if verb in ("select", "values", "table"):
+        top_level = [word for depth, word in words if depth == 0]
+        if "into" in top_level:
+            # SELECT ... INTO OUTFILE/@var writes outside the result set
+            return StatementType.ADMIN
+        pairs = set(zip(top_level, top_level[1:]))
+        if pairs & {("for", "update"), ("for", "share"), ("share", "mode")}:
+            # Locking reads take row locks and belong on the primary
+            return StatementType.WRITE
+        return StatementType.READ
+    if verb in _READ_VERBS:
+        return StatementType.READ
+    if verb in _WRITE_VERBS:
+        return StatementType.WRITE
+    if verb in _DDL_VERBS:
+        for _, word in words[1:]:
+            if word in ("temporary", "temp"):
+                # Temporary tables live in the session, so their connection
+                # must not go back to the pool
+                return StatementType.ADMIN
+            if word in ("table", "view"):
+                break
+        return StatementType.DDL
+    if verb in _ADMIN_VERBS:
+        return StatementType.ADMIN
+    return StatementType.UNKNOWN
+
+
+def _explained(statement: List[Token]) -> List[Token]:
+    """Statement wrapped by EXPLAIN/DESCRIBE, empty when it names a table."""
+    i = 1
+    while i < len(statement):
+        text = statement[i][1].lower()
+        if text == "=":
+            i += 2
+        elif text in _EXPLAIN_OPTIONS:
+            i += 1
+        else:
+            break
+    explained = statement[i:]
+    if explained and explained[0][0] == "word":
+        verb = explained[0][1].lower()
+        if verb in _DML_VERBS or verb in ("with", "table", "values"):
+            return explained
+    return []
+
+
+def _assigns_variables(statement: List[Token]) -> bool:
+    return any(
+        kind == "var" and not text.startswith("@@") and following[1] == ":="
+        for (kind, text), following in zip(statement, statement[1:])
+    )
+
+
+def _lock_call(statement: List[Token]) -> Optional[str]:
+    """Name of a named-lock function called by the statement, if any."""
+    for (kind, text), following in zip(statement, statement[1:]):
+        if kind == "word" and text.lower() in _LOCK_FUNCTIONS and following[1] == "(":
+            return text.upper()
+    return None
+
+
+def _depths(statement: List[Token]) -> List[Tuple[int, Token]]:
+    depth = 0
+    out: List[Tuple[int, Token]] = []
+    for token in statement:
+        if token[1] == ")":
+            depth = max(depth - 1, 0)
+        out.append((depth, token))
+        if token[1] == "(":
+            depth += 1
+    return out
+
+
+def _cte_names(statement: List[Token]) -> Set[str]:
+    """Names defined by ``name [(columns)] AS (`` in a WITH clause."""
+    names: Set[str] = set()
+    for i in range(1, len(statement) - 1):
+        if statement[i][1].lower() != "as" or statement[i + 1][1] != "(":
+            continue
+        j = i - 1
+        if statement[j][1] == ")":
+            depth = 0
+            while j > 0:
+                if statement[j][1] == ")":
+                    depth += 1
+                elif statement[j][1] == "(":
+                    depth -= 1
+                    if depth == 0:
+                        break
+                j -= 1
+            j -= 1
+        name = _identifier(statement[j]) if j >= 0 else None
+        if name is not None:
+            names.add(name)
+    return names
+
+
+def _tables(statement: List[Token]) -> Set[str]:
+    tables: Set[str] = set()
+    count = len(statement)
+    for i, token in enumerate(statement):
+        if token[0] != "word" or token[1].lower() not in _TABLE_CONTEXT:
+            continue
+        if i and statement[i - 1][1].lower() in ("for", "key"):
+            # FOR UPDATE and ON DUPLICATE KEY UPDATE name no tables
+            continue
+        j = i + 1
+        while j < count and statement[j][1].lower() in _TABLE_MODIFIERS:
+            j += 1
+        # A comma-separated list of references, each optionally aliased
+        while j < count:
+            name = _identifier(statement[j])
+            if name is None:
+                break
+            if j + 2 < count and statement[j + 1][1] == ".":
+                qualified = _identifier(statement[j + 2])
+                if qualified is None:
+                    break
+                name = f"{name}.{qualified}"
+                j += 2
+            if name not in _NOT_TABLES:
+                tables.add(name)
+            j += 1
+            if j < count and statement[j][1].lower() == "as":
+                j += 1
+            if (
+                j < count
+                and statement[j][0] in ("word", "qident")
+                and (
+                    statement[j][1].lower() not in _TABLE_CONTEXT
+                    and statement[j][1].lower() not in _CLAUSE_WORDS
+                )
+            ):
+                j += 1
+            if j < count and statement[j][1] == ",":
+                j += 1
+                continue
+            break
+    if statement[0][1].lower() == "with":
+        tables -= _cte_names(statement)
+    return tables
+
+
+def _analyze(sql: str) -> SqlAnalysis:
+    tokens, error = tokenize(sql)
+    statements = _split(tokens)
+    template = _join(_templated(tokens)).rstrip(" ;")
+    fingerprint = hashlib.blake2b(template.encode(), digest_size=8).hexdigest()
+    normalized = _join(tokens).rstrip(" ;")
+
+    tables: Set[str] = set()
+    for statement in statements:
+        tables |= _tables(statement)
+
+    if not statements and error is None:
+        error = "Empty statement"
+    if error is None:
+        lock = _lock_call(tokens)
+        if lock:
+            error = f"{lock}() is not allowed: named locks outlive the request"
+    if len(statements) > 1:
+        statement_type = StatementType.MULTI
+    elif error is not None or not statements:
+        statement_type = StatementType.UNKNOWN
+    else:
+        statement_type = _classify(statements[0])
+    return SqlAnalysis(
+        statement_type,
+        len(statements),
+        tuple(sorted(tables)),
+        normalized,
+        template,
+        fingerprint,
+        error,
+    )
+
+
+@lru_cache(maxsize=settings.sql_analysis_cache_size)
+def analyze_sql(sql: str) -> SqlAnalysis:
+    """Analyze SQL text, memoized by the exact text.
+
+    Use ``analyze_sql.cache_info()`` for hit/miss counters.
+    """
+    return _analyze(sql)
@@ -0,0 +1,75 @@
+"""
+Write-behind tracking of API key usage.
+"""
+import asyncio
+import logging
+from datetime import datetime
+from typing import Callable, Dict, Optional
+
+from sqlalchemy import case, or_, update
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlmodel import col
+
+from core.database import get_async_engine
+from models.api_key import ApiKey
+
+logger = logging.getLogger(__name__)
+
+
+class LastUsedBuffer:
+    """Coalesce ``ApiKey.last_used`` updates and write them in bulk.
+
+    Requests only record a timestamp in memory; a background task flushes
+    the latest timestamp per key with a single ``UPDATE ... CASE`` so busy
+    keys no longer take a row lock and a commit on every request.
+    """
+
+    def __init__(self, engine_factory: Callable[[], AsyncEngine]):
+        self._engine_factory = engine_factory
+        self._pending: Dict[str, datetime] = {}
+
+    def record(self, key_id: str, when: Optional[datetime] = None) -> None:
+        """Remember that a key was used; only the latest time per key is kept."""
+        self._pending[key_id] = when or datetime.utcnow()
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    async def flush(self) -> int:
+        """Write pending timestamps in one statement; returns keys flushed."""
+        if not self._pending:
+            return 0
+        # Swap first so records made during the flush go to the next batch
+        pending, self._pending = self._pending, {}
+
+        last_used = col(ApiKey.last_used)
+        new_value = case(pending, value=col(ApiKey.key_id))
+        stmt = (
+            update(ApiKey)
+            .where(col(ApiKey.key_id).in_(list(pending)))
+            # Never move last_used backwards when workers flush out of order
+            .where(or_(last_used.is_(None), last_used < new_value))
+            .values(last_used=new_value)
+            .execution_options(synchronize_session=False)
+        )
+        try:
+            async with self._engine_factory().begin() as conn:
+                await conn.execute(stmt)
+        except Exception:
+            for key_id, when in pending.items():
+                if self._pending.get(key_id, when) <= when:
+                    self._pending[key_id] = when
+            raise
+        return len(pending)
+
+    async def run(self, interval: float) -> None:
+        """Flush every ``interval`` seconds until cancelled."""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.warning("Flushing API key last_used failed: %s", e)
+
+
+last_used_buffer = LastUsedBuffer(get_async_engine)
@@ -4,5 +4,81 @@ Pytest configuration and fixtures.
 import sys
 from pathlib import Path
 
+import pytest
+import pytest_asyncio
+
 # Add the parent directory to sys.path so we can import modules
 sys.path.insert(0, str(Path(__file__).parent.parent))
+
+
+def pytest_addoption(parser):
+    """Register command line options."""
+    parser.addoption(
+        "--run-slow",
+        action="store_true",
+        default=False,
+        help="Run slow tests (large result sets, benchmarks)",
+    )
+
+
+def pytest_configure(config):
+    """Register custom markers."""
+    config.addinivalue_line("markers", "slow: Slow running tests")
+
+
+def pytest_collection_modifyitems(config, items):
+    """Skip slow tests unless --run-slow is given."""
+    if config.getoption("--run-slow"):
+        return
+    skip_slow = pytest.mark.skip(reason="needs --run-slow")
+    for item in items:
+        if "slow" in item.keywords:
+            item.add_marker(skip_slow)
+
+
+@pytest.fixture
+def sqlite_url(tmp_path):
+    """File-backed SQLite database URL usable as a local MySQL stand-in."""
+    return f"sqlite+aiosqlite:///{tmp_path / 'connector.db'}"
+
+
+@pytest.fixture
+def sqlite_engine(sqlite_url):
+    """Async engine on the SQLite stand-in.
+
+    NullPool keeps connections from being shared between the event loops
+    of pytest-asyncio and TestClient.
+    """
+    from sqlalchemy.ext.asyncio import create_async_engine
+    from sqlalchemy.pool import NullPool
+
+    engine = create_async_engine(sqlite_url, poolclass=NullPool)
+    yield engine
+    engine.sync_engine.dispose()
+
+
+@pytest_asyncio.fixture
+async def sqlite_session(sqlite_engine):
+    """AsyncSession on the SQLite stand-in with all model tables created.
+
+    Executed statements are recorded, upper-cased, in ``session.statements``.
+    """
+    from sqlalchemy import event
+    from sqlalchemy.ext.asyncio import AsyncSession
+    from sqlmodel import SQLModel
+
+    import models  # noqa: F401  (registers the tables)
+
+    async with sqlite_engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+    statements = []
+    event.listen(
+        sqlite_engine.sync_engine,
+        "before_cursor_execute",
+        lambda conn, cursor, statement, *args: statements.append(
+            statement.lstrip().upper()
+        ),
+    )
+    async with AsyncSession(sqlite_engine, expire_on_commit=False) as session:
+        session.statements = statements
+        yield session
@@ -0,0 +1,189 @@
+"""
+Tests for fair-share admission control.
+"""
+import asyncio
+import time
+
+import httpx
+import pytest
+
+import api.query
+from auth.dependencies import get_api_key
+from core.admission import AdmissionController, AdmissionRejected, Priority
+from core.database import get_db_router
+from core.routing import DatabaseRouter
+from main import app
+from models.api_key import ApiKey
+
+
+async def _admission_order(controller: AdmissionController, arrivals) -> list:
+    """Queue ``arrivals`` behind one held slot and record who goes next."""
+    holder = await controller.acquire("holder")
+    order: list = []
+    tickets: asyncio.Queue = asyncio.Queue()
+
+    async def request(client_id):
+        ticket = await controller.acquire(client_id)
+        order.append(client_id)
+        await tickets.put(ticket)
+
+    tasks = [asyncio.create_task(request(client_id)) for client_id in arrivals]
+    await asyncio.sleep(0)
+    holder.release()
+    for _ in arrivals:
+        (await tickets.get()).release()
+    await asyncio.gather(*tasks)
+    return order
+
+
+@pytest.mark.asyncio
+async def test_waiting_clients_take_turns_by_weight():
+    """Test a client's backlog is interleaved with others, not served first."""
+    arrivals = ["a", "a", "a", "b", "b"]
+    equal = AdmissionController(slots=1, reserved=0)
+    assert await _admission_order(equal, arrivals) == ["a", "b", "a", "b", "a"]
+
+    # b weighs twice as much, so it gets two turns for each of a's
+    weighted = AdmissionController(slots=1, reserved=0, weights={"b": 2})
+    order = await _admission_order(weighted, ["a", "a", "a", "b", "b", "b", "b"])
+    assert order == ["b", "a", "b", "b", "a", "b", "a"]
+
+
+@pytest.mark.asyncio
+async def test_per_client_cap_leaves_room_for_others():
+    """Test a client at its cap waits while another client is admitted."""
+    controller = AdmissionController(slots=4, per_client=2, reserved=0)
+    held = [await controller.acquire("heavy") for _ in range(2)]
+    queued = asyncio.create_task(controller.acquire("heavy"))
+    await asyncio.sleep(0)
+
+    light = await asyncio.wait_for(controller.acquire("light"), 1)
+    assert not queued.done()
+    assert controller.stats()["clients"]["heavy"] == {"active": 2, "queued": 1}
+
+    held[0].release()
+    (await queued).release()
+    for ticket in (held[1], light):
+        ticket.release()
+    assert controller.active == 0 and controller.stats()["clients"] == {}
+
+
+@pytest.mark.asyncio
+async def test_critical_work_uses_reserved_slots_and_goes_first():
+    """Test auth and health work is admitted ahead of queued normal work."""
+    controller = AdmissionController(slots=3, reserved=1)
+    normal = [await controller.acquire("a"), await controller.acquire("b")]
+    # Normal work is out of slots, the reserved one still admits critical work
+    critical = await asyncio.wait_for(controller.acquire("auth", Priority.CRITICAL), 1)
+
+    waiting_normal = asyncio.create_task(controller.acquire("c"))
+    await asyncio.sleep(0)
+    waiting_critical = asyncio.create_task(
+        controller.acquire("health", Priority.CRITICAL)
+    )
+    await asyncio.sleep(0)
+    critical.release()
+    assert (await waiting_critical).priority == Priority.CRITICAL
+    assert not waiting_normal.done()
+
+    normal[0].release()
+    (await waiting_normal).release()
+
+
+@pytest.mark.asyncio
+async def test_rejects_early_instead_of_waiting_out_the_pool():
+    """Test over-long waits, expected waits and full queues are rejected."""
+    controller = AdmissionController(slots=1, reserved=0, max_wait=0.05, max_queue=1)
+    holder = await controller.acquire("a")
+    with pytest.raises(AdmissionRejected, match="Timed out") as rejected:
+        await controller.acquire("b")
+    assert rejected.value.headers() == {"Retry-After": "1"}
+    assert controller.stats()["queued"] == 0
+
+    # Once slots are known to be held for 0.1s, a 0.05s wait is hopeless
+    await asyncio.sleep(0.1)
+    holder.release()
+    holder = await controller.acquire("a")
+    started = time.perf_counter()
+    with pytest.raises(AdmissionRejected, match="Expected wait"):
+        await controller.acquire("b")
+    assert time.perf_counter() - started < 0.04
+
+    controller.max_wait = 5
+    queued = asyncio.create_task(controller.acquire("b"))
+    await asyncio.sleep(0)
+    with pytest.raises(AdmissionRejected, match="Too many requests"):
+        await controller.acquire("c")
+    assert controller.stats()["rejected"] == 3
+
+    holder.release()
+    (await queued).release()
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_leaves_the_queue():
+    """Test a request abandoned while waiting does not keep a place or slot."""
+    controller = AdmissionController(slots=1, reserved=0)
+    holder = await controller.acquire("a")
+    waiter = asyncio.create_task(controller.acquire("b"))
+    await asyncio.sleep(0)
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+
+    holder.release()
+    assert controller.stats()["queued"] == 0 and controller.active == 0
+
+
+@pytest.mark.asyncio
+async def test_light_client_is_not_starved_by_heavy_one():
+    """Test a cheap request gets in promptly behind a flood of slow ones."""
+    controller = AdmissionController(slots=4, per_client=2, reserved=0)
+
+    async def work(client_id, seconds):
+        async with controller.admit(client_id):
+            await asyncio.sleep(seconds)
+        return time.perf_counter()
+
+    started = time.perf_counter()
+    heavy = [asyncio.create_task(work("heavy", 0.05)) for _ in range(20)]
+    await asyncio.sleep(0.01)
+    light_done = await work("light", 0)
+    heavy_done = await asyncio.gather(*heavy)
+
+    assert light_done - started < 0.03
+    assert max(heavy_done) - started >= 0.5
+
+
+@pytest.mark.asyncio
+async def test_query_endpoint_answers_429_with_retry_after(sqlite_engine, monkeypatch):
+    """Test a rejected admission reaches the client as 429 + Retry-After."""
+    controller = AdmissionController(slots=1, reserved=0, max_wait=0.05)
+    monkeypatch.setattr(api.query, "admission", controller)
+    holder = await controller.acquire("other")
+
+    app.dependency_overrides[get_db_router] = lambda: DatabaseRouter(sqlite_engine)
+    app.dependency_overrides[get_api_key] = lambda: ApiKey(
+        key_id="t", key_hash="t", client_id="t", scopes='["read"]'
+    )
+    transport = httpx.ASGITransport(app=app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://t") as c:
+            busy = await c.post(
+                "/api/v1/query", json={"sql": "SELECT 1 AS n", "cache": False}
+            )
+            holder.release()
+            admitted = await c.post(
+                "/api/v1/query", json={"sql": "SELECT 1 AS n", "cache": False}
+            )
+    finally:
+        app.dependency_overrides.clear()
+
+    assert busy.status_code == 429
+    assert busy.headers["retry-after"] == "1"
+    assert admitted.status_code == 200 and admitted.text == '{"n":1}\n'
+    assert controller.active == 0
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,133 @@
+"""
+Tests for the batched query history writer.
+"""
+import asyncio
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import event, func, select
+from sqlmodel import SQLModel
+
+from models import QueryHistory, QueryHistoryCreate
+from services.audit_logger import OverflowPolicy, QueryHistoryWriter
+
+
+def _record(i: int) -> QueryHistoryCreate:
+    return QueryHistoryCreate(client_id="client", query=f"SELECT {i}", row_count=i)
+
+
+@pytest_asyncio.fixture
+async def history_engine(sqlite_engine):
+    """SQLite stand-in with the model tables, plus the INSERTs it runs."""
+    async with sqlite_engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+    inserts = []
+    event.listen(
+        sqlite_engine.sync_engine,
+        "before_cursor_execute",
+        lambda conn, cursor, statement, *args: inserts.append(statement)
+        if statement.startswith("INSERT")
+        else None,
+    )
+    return sqlite_engine, inserts
+
+
+async def _stored(engine) -> int:
+    async with engine.connect() as conn:
+        return await conn.scalar(select(func.count()).select_from(QueryHistory))
+
+
+@pytest.mark.asyncio
+async def test_writes_full_batches_as_multi_row_inserts(history_engine):
+    """Test records are written in batch_size multi-row INSERTs."""
+    engine, inserts = history_engine
+    writer = QueryHistoryWriter(lambda: engine, batch_size=10, flush_interval=0.05)
+    for i in range(25):
+        await writer.submit(_record(i))
+    writer.start()
+    for _ in range(100):
+        if writer.flushed == 25:
+            break
+        await asyncio.sleep(0.01)
+    await writer.stop()
+
+    assert writer.stats()["flushed"] == 25
+    assert len(inserts) == 3
+    assert await _stored(engine) == 25
+
+
+@pytest.mark.asyncio
+async def test_partial_batch_flushed_after_interval(history_engine):
+    """Test a partial batch is written once the flush interval passes."""
+    engine, inserts = history_engine
+    writer = QueryHistoryWriter(lambda: engine, batch_size=100, flush_interval=0.05)
+    writer.start()
+    for i in range(3):
+        await writer.submit(_record(i))
+    await asyncio.sleep(0.2)
+
+    assert writer.flushed == 3
+    assert len(inserts) == 1
+    await writer.stop()
+
+
+@pytest.mark.asyncio
+async def test_stop_drains_queue(history_engine):
+    """Test shutdown writes records that were still queued."""
+    engine, inserts = history_engine
+    writer = QueryHistoryWriter(lambda: engine, batch_size=4)
+    for i in range(10):
+        await writer.submit(_record(i))
+    await writer.stop()
+    assert await _stored(engine) == 10
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "policy, sample_rate, dropped",
+    [
+        (OverflowPolicy.DROP, 0.0, 3),
+        (OverflowPolicy.SAMPLE, 0.0, 3),
+        (OverflowPolicy.BLOCK, 0.0, 3),
+    ],
+)
+async def test_overflow_when_nothing_drains(
+    sqlite_engine, policy, sample_rate, dropped
+):
+    """Test every overflow policy gives up once the queue stays full."""
+    writer = QueryHistoryWriter(
+        lambda: sqlite_engine,
+        max_queue=2,
+        overflow_policy=policy,
+        sample_rate=sample_rate,
+        block_timeout=0.01,
+    )
+    results = [await writer.submit(_record(i)) for i in range(5)]
+    assert results.count(False) == dropped
+    assert writer.stats()["dropped"] == dropped
+    assert writer.stats()["queued"] == 2
+
+
+@pytest.mark.asyncio
+async def test_block_waits_for_space(history_engine):
+    """Test the block policy admits records once the flusher frees space."""
+    engine, inserts = history_engine
+    writer = QueryHistoryWriter(
+        lambda: engine,
+        max_queue=2,
+        batch_size=2,
+        flush_interval=0.01,
+        overflow_policy=OverflowPolicy.BLOCK,
+        block_timeout=1.0,
+    )
+    writer.start()
+    results = [await writer.submit(_record(i)) for i in range(20)]
+    await writer.stop()
+
+    assert all(results)
+    assert writer.dropped == 0
+    assert await _stored(engine) == 20
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
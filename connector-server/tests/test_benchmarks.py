@@ -0,0 +1,109 @@
+"""
+Tests for the benchmark suite's statistics, baseline comparison and runners.
+"""
+import json
+
+import pytest
+
+from benchmarks.run import compare, main, summarize
+from benchmarks.startup import eager_imports, parse_importtime
+
+
+def _result(p95_ms: float, rps: float, errors: int = 0) -> dict:
+    return {
+        "scenarios": {
+            "query": {
+                "8": {
+                    "requests": 100,
+                    "errors": errors,
+                    "throughput_rps": rps,
+                    "p50_ms": p95_ms / 2,
+                    "p95_ms": p95_ms,
+                    "p99_ms": p95_ms * 2,
+                }
+            }
+        }
+    }
+
+
+def test_summarize_percentiles():
+    """Test percentiles are reported in milliseconds with throughput."""
+    stats = summarize([i / 1000 for i in range(1, 101)], errors=2, seconds=2.0)
+    assert stats["requests"] == 100
+    assert stats["throughput_rps"] == 50.0
+    assert stats["p50_ms"] == pytest.approx(50.5)
+    assert stats["p95_ms"] == pytest.approx(95.05)
+    assert stats["p99_ms"] == pytest.approx(99.01)
+    assert summarize([], 0, 1.0)["p99_ms"] == 0.0
+
+
+def test_compare_flags_regressions_beyond_tolerance():
+    """Test p95, throughput and error regressions against the baseline."""
+    baseline = _result(10.0, 100.0)
+    assert compare(_result(14.0, 80.0), baseline, 0.5, 0.3) == []
+
+    regressions = compare(_result(16.0, 60.0, errors=1), baseline, 0.5, 0.3)
+    assert len(regressions) == 3
+    assert "p95 16.0ms vs baseline 10.0ms" in regressions[1]
+
+    assert compare(_result(99.0, 1.0), {"scenarios": {}}, 0.5, 0.3) == []
+
+
+@pytest.mark.slow
+def test_benchmark_run_end_to_end(tmp_path):
+    """Test a short run boots the app on stand-ins and records every scenario."""
+    output = tmp_path / "results.json"
+    code = main(
+        [
+            "--levels",
+            "2",
+            "--duration",
+            "0.5",
+            "--warmup",
+            "0.1",
+            "--rows",
+            "200",
+            "--output",
+            str(output),
+        ]
+    )
+    results = json.loads(output.read_text())
+    assert code == 0
+    assert set(results["scenarios"]) == {"health", "auth", "query", "export"}
+    for levels in results["scenarios"].values():
+        assert levels["2"]["requests"] > 0
+        assert levels["2"]["errors"] == 0
+
+
+def test_parse_importtime_sums_self_time_per_package():
+    """Test -X importtime lines are grouped by top-level package."""
+    output = "\n".join(
+        [
+            "import time: self [us] | cumulative | imported package",
+            "import time:       100 |        100 |     jose.jwk",
+            "import time:        50 |        150 |   jose",
+            "import time:      1000 |       1150 | main",
+        ]
+    )
+    assert parse_importtime(output) == {"jose": 150, "main": 1000}
+
+
+def test_import_main_defers_heavy_modules():
+    """Test importing the app loads no crypto, driver or server modules."""
+    assert eager_imports() == {"modules": [], "engine_created": False}
+
+
+@pytest.mark.slow
+def test_startup_benchmark_within_thresholds(tmp_path):
+    """Test the startup benchmark runs and stays under its default thresholds."""
+    from benchmarks.startup import main as startup_main
+
+    output = tmp_path / "startup.json"
+    assert startup_main(["--repeat", "3", "--output", str(output)]) == 0
+    results = json.loads(output.read_text())
+    assert results["import"]["packages"]["fastapi"] > 0
+    assert results["first_request_ms"] > 0
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,301 @@
+"""
+Tests for streamed bulk ingest: parsing, validation, batching and resume.
+"""
+import time
+from datetime import datetime
+from decimal import Decimal
+
+import httpx
+import orjson
+import pytest
+import pytest_asyncio
+from fakeredis import FakeAsyncRedis
+from sqlalchemy import text
+
+from auth.dependencies import get_api_key
+from core.database import get_async_engine
+from main import app
+from models.api_key import ApiKey
+from services.bulk_ingest import (
+    DuplicatePolicy,
+    IngestError,
+    ingest,
+    ingest_target,
+    iter_csv_records,
+    iter_ndjson_records,
+)
+from services.result_cache import query_result_cache
+
+
+@pytest_asyncio.fixture
+async def items_engine(sqlite_engine):
+    async with sqlite_engine.begin() as conn:
+        await conn.execute(
+            text(
+                "CREATE TABLE items (id INTEGER PRIMARY KEY, sku VARCHAR(8) NOT NULL, "
+                "price NUMERIC(10, 2) NOT NULL, qty INTEGER, active BOOLEAN, "
+                "added DATETIME, note TEXT DEFAULT 'none' NOT NULL)"
+            )
+        )
+    return sqlite_engine
+
+
+async def _chunks(data: bytes, size: int):
+    for start in range(0, len(data), size):
+        yield data[start : start + size]
+
+
+async def _records(iterator) -> list:
+    return [record async for records in iterator for record in records]
+
+
+def _ndjson(rows) -> bytes:
+    return b"".join(orjson.dumps(row) + b"\n" for row in rows)
+
+
+async def _count(engine) -> int:
+    async with engine.connect() as conn:
+        return (await conn.execute(text("SELECT count(*) FROM items"))).scalar()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("size", [1, 7, 4096])
+async def test_parsers_are_independent_of_chunk_boundaries(size):
+    """Test records, line numbers and quoted newlines survive any split."""
+    ndjson = b'{"a": 1}\n\n{"a": "\xc3\xa9"}\n{"a": null}'
+    assert await _records(iter_ndjson_records(_chunks(ndjson, size))) == [
+        (1, {"a": 1}),
+        (3, {"a": "é"}),
+        (4, {"a": None}),
+    ]
+
+    csv_body = 'id,note\r\n1,"two\nlines, ""quoted"""\r\n\r\n2,\r\n3,é'.encode()
+    assert await _records(iter_csv_records(_chunks(csv_body, size))) == [
+        (2, {"id": "1", "note": 'two\nlines, "quoted"'}),
+        (5, {"id": "2", "note": None}),
+        (6, {"id": "3", "note": "é"}),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_malformed_bodies_name_the_line():
+    """Test parse errors point at the offending line."""
+    cases = [
+        (iter_ndjson_records, b'{"a": 1}\n[1]\n', "Line 2: expected a JSON object"),
+        (iter_ndjson_records, b'{"a": 1}\n{"a"\n', "Line 2: invalid JSON"),
+        (iter_csv_records, b"a,b\n1\n", "Line 2: expected 2 fields, got 1"),
+        (iter_csv_records, b'a\n"open\n', "Line 2: unterminated quoted field"),
+    ]
+    for parser, body, message in cases:
+        with pytest.raises(IngestError, match=message):
+            await _records(parser(_chunks(body, 3)))
+    with pytest.raises(IngestError, match="longer than 1024 bytes"):
+        await _records(iter_ndjson_records(_chunks(b"x" * 5000, 100), 1024))
+
+
+@pytest.mark.asyncio
+async def test_rows_are_validated_against_reflected_columns(items_engine):
+    """Test values are converted to column types and bad ones rejected."""
+    target = await ingest_target(items_engine, "items")
+    row = target.validate(
+        1,
+        {
+            "sku": "a1",
+            "price": "12.50",
+            "qty": "3",
+            "active": "true",
+            "added": "2024-05-01T12:00:00",
+        },
+    )
+    assert row == {
+        "sku": "a1",
+        "price": Decimal("12.50"),
+        "qty": 3,
+        "active": True,
+        "added": datetime(2024, 5, 1, 12),
+    }
+    assert target.required == {"sku", "price"}
+
+    invalid = [
+        ({"sku": "a", "price": 1, "qty": "x"}, "column 'qty' expects INTEGER"),
+        ({"sku": "toolongsku", "price": 1}, "longer than 8 characters"),
+        ({"sku": "a", "price": None}, "column 'price' cannot be null"),
+        ({"sku": "a", "price": 1, "colour": "red"}, "unknown columns: colour"),
+        ({"sku": "a"}, "missing required columns: price"),
+    ]
+    for values, message in invalid:
+        with pytest.raises(IngestError, match=f"Line 7: .*{message}"):
+            target.validate(7, values)
+
+
+@pytest.mark.asyncio
+async def test_failed_batch_keeps_earlier_batches_and_resumes(items_engine):
+    """Test a bad row rolls back only its batch; a resend skips committed rows."""
+    rows = [{"sku": f"s{i}", "price": i} for i in range(10)]
+    bad = rows[:7] + [{"sku": "s7", "price": "oops"}] + rows[8:]
+    target = await ingest_target(items_engine, "items")
+
+    committed = []
+    with pytest.raises(IngestError, match="Line 8"):
+        async for batch in ingest(
+            items_engine,
+            target,
+            iter_ndjson_records(_chunks(_ndjson(bad), 50)),
+            batch_size=3,
+        ):
+            committed.append(batch)
+    assert [(b.batch, b.rows, b.committed_rows) for b in committed] == [
+        (0, 3, 3),
+        (1, 3, 6),
+    ]
+    assert await _count(items_engine) == 6
+
+    resumed = [
+        batch
+        async for batch in ingest(
+            items_engine,
+            target,
+            iter_ndjson_records(_chunks(_ndjson(rows), 50)),
+            batch_size=3,
+            resume_from=6,
+        )
+    ]
+    assert [b.committed_rows for b in resumed] == [9, 10]
+    async with items_engine.connect() as conn:
+        skus = (await conn.execute(text("SELECT sku FROM items ORDER BY id"))).scalars()
+        assert list(skus) == [f"s{i}" for i in range(10)]
+
+
+@pytest.mark.asyncio
+async def test_on_duplicate_update(items_engine):
+    """Test rows with an existing key update it instead of failing."""
+    target = await ingest_target(items_engine, "items")
+
+    async def load(rows, policy):
+        records = iter_ndjson_records(_chunks(_ndjson(rows), 1000))
+        return [b async for b in ingest(items_engine, target, records, 10, policy)]
+
+    await load([{"id": 1, "sku": "a", "price": 1}], DuplicatePolicy.ERROR)
+    with pytest.raises(Exception, match="UNIQUE"):
+        await load([{"id": 1, "sku": "b", "price": 2}], DuplicatePolicy.ERROR)
+    await load(
+        [{"id": 1, "sku": "b", "price": 2}, {"id": 2, "sku": "c", "price": 3}],
+        DuplicatePolicy.UPDATE,
+    )
+    async with items_engine.connect() as conn:
+        rows = (await conn.execute(text("SELECT id, sku FROM items ORDER BY id"))).all()
+    assert [tuple(r) for r in rows] == [(1, "b"), (2, "c")]
+
+
+@pytest_asyncio.fixture
+async def client(items_engine):
+    app.dependency_overrides[get_async_engine] = lambda: items_engine
+    app.dependency_overrides[get_api_key] = lambda: ApiKey(
+        key_id="t", key_hash="t", client_id="t", scopes='["read", "write"]'
+    )
+    transport = httpx.ASGITransport(app=app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://t") as c:
+            yield c
+    finally:
+        app.dependency_overrides.clear()
+
+
+@pytest.mark.asyncio
+async def test_bulk_endpoint_reports_batches_and_resume_point(client, items_engine):
+    """Test the endpoint streams CSV in, and reports where to resume."""
+    csv_body = b"sku,price\n" + b"".join(b"s%d,%d\n" % (i, i) for i in range(25))
+    response = await client.post(
+        "/api/v1/database/items/bulk?batch_size=10",
+        content=_chunks(csv_body, 64),
+        headers={"Content-Type": "text/csv"},
+    )
+    assert response.status_code == 200
+    body = response.json()
+    assert body["committed_rows"] == 25
+    assert [b["rows"] for b in body["batches"]] == [10, 10, 5]
+
+    failing = _ndjson([{"sku": "x", "price": 1}] * 4 + [{"sku": "x"}])
+    response = await client.post(
+        "/api/v1/database/items/bulk?batch_size=2&format=ndjson", content=failing
+    )
+    assert response.status_code == 422
+    detail = response.json()["detail"]
+    assert detail["resume_from"] == 4
+    assert "missing required columns: price" in detail["error"]
+    assert await _count(items_engine) == 29
+
+
+@pytest.mark.asyncio
+async def test_bulk_endpoint_invalidates_cached_reads(
+    client, items_engine, monkeypatch
+):
+    """Test a read cached before an ingest misses afterwards, even on failure."""
+    redis = FakeAsyncRedis()
+    monkeypatch.setattr(query_result_cache, "_redis_factory", lambda: redis)
+    monkeypatch.setattr(query_result_cache, "_retry_at", 0.0)
+    sql = "SELECT count(*) FROM items"
+
+    for rows in ([{"sku": "a", "price": 1}], [{"sku": "b", "price": 2}, {}]):
+        lookup = await query_result_cache.get(sql)
+        await query_result_cache.set(lookup, ["n"], [(await _count(items_engine),)])
+        assert (await query_result_cache.get(sql)).hit
+        await client.post(
+            "/api/v1/database/items/bulk?format=ndjson&batch_size=1",
+            content=_ndjson(rows),
+        )
+        assert not (await query_result_cache.get(sql)).hit
+
+
+@pytest.mark.asyncio
+async def test_bulk_endpoint_rejections(client):
+    """Test unknown tables, internal tables and unknown body types."""
+    body = _ndjson([{"sku": "a", "price": 1}])
+    ndjson = {"Content-Type": "application/x-ndjson"}
+    missing = await client.post(
+        "/api/v1/database/nope/bulk", content=body, headers=ndjson
+    )
+    internal = await client.post(
+        "/api/v1/database/api_keys/bulk", content=body, headers=ndjson
+    )
+    untyped = await client.post(
+        "/api/v1/database/items/bulk",
+        content=body,
+        headers={"Content-Type": "application/octet-stream"},
+    )
+    assert (missing.status_code, internal.status_code, untyped.status_code) == (
+        404,
+        403,
+        415,
+    )
+
+
+@pytest.mark.slow
+@pytest.mark.asyncio
+async def test_bulk_ingest_throughput_benchmark(client, items_engine):
+    """Benchmark: 100k NDJSON rows through the endpoint in 1000-row batches."""
+    rows = [
+        {
+            "sku": f"s{i}",
+            "price": i / 100,
+            "qty": i,
+            "active": i % 2 == 0,
+            "added": "2024-05-01T12:00:00",
+        }
+        for i in range(100000)
+    ]
+    body = _ndjson(rows)
+    started = time.perf_counter()
+    response = await client.post(
+        "/api/v1/database/items/bulk?format=ndjson&batch_size=1000",
+        content=_chunks(body, 65536),
+    )
+    seconds = time.perf_counter() - started
+    print(f"\n100k rows in {seconds:.2f}s ({100000 / seconds:,.0f} rows/s)")
+    assert response.status_code == 200
+    assert await _count(items_engine) == 100000
+    assert len(response.json()["batches"]) == 100
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
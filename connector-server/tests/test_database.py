@@ -0,0 +1,99 @@
+"""
+Tests for connection pool sizing, warm-up and lazy engine creation.
+"""
+import pytest
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+import core.database as database
+from core.config import Settings
+from core.database import compute_pool_budget, warm_up_pool
+
+
+def test_budget_is_split_across_workers_and_replicas():
+    """Test every process gets an equal share of the usable connections."""
+    budget = compute_pool_budget(
+        Settings(
+            max_connections=200,
+            db_reserved_connections=10,
+            api_workers=2,
+            api_replicas=2,
+            db_pool_overflow_share=0.5,
+        )
+    )
+    assert (budget.processes, budget.per_process) == (4, 47)
+    assert (budget.pool_size, budget.max_overflow) == (24, 23)
+    assert budget.processes * (budget.pool_size + budget.max_overflow) <= 190
+    assert "47 per worker" in budget.describe()
+
+
+def test_budget_is_shared_by_primary_and_replica_engines():
+    """Test every engine's pool together stays within the usable connections."""
+    budget = compute_pool_budget(
+        Settings(
+            max_connections=200,
+            db_reserved_connections=10,
+            api_workers=2,
+            api_replicas=2,
+            database_replica_urls=["mysql://r1/db", "mysql://r2/db"],
+        )
+    )
+    assert (budget.engines, budget.per_engine) == (3, 15)
+    engine_connections = budget.pool_size + budget.max_overflow
+    assert budget.processes * budget.engines * engine_connections <= 190
+
+
+def test_budget_too_small_is_an_error():
+    """Test a budget that cannot cover every worker fails at startup."""
+    with pytest.raises(ValueError, match="8 worker processes"):
+        compute_pool_budget(
+            Settings(
+                max_connections=15,
+                db_reserved_connections=10,
+                api_workers=4,
+                api_replicas=2,
+            )
+        )
+
+
+@pytest.mark.asyncio
+async def test_warm_up_fills_the_pool(sqlite_url):
+    """Test warm-up leaves distinct connections idle in the pool."""
+    engine = create_async_engine(
+        sqlite_url, poolclass=AsyncAdaptedQueuePool, pool_size=3, max_overflow=0
+    )
+    try:
+        assert await warm_up_pool(engine, 3) == 3
+        assert engine.sync_engine.pool.checkedin() == 3
+    finally:
+        await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_warm_up_failure_is_not_fatal():
+    """Test an unreachable database only reduces the warmed count."""
+    engine = create_async_engine("sqlite+aiosqlite:////nonexistent/dir/x.db")
+    try:
+        assert await warm_up_pool(engine, 2) == 0
+    finally:
+        await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_engines_are_created_on_first_use(monkeypatch, sqlite_url):
+    """Test the getters share one engine until close_database disposes it."""
+    monkeypatch.setattr(database.settings, "database_url", sqlite_url)
+    await database.close_database()
+
+    engine = database.get_async_engine()
+    assert database.async_engine is engine
+    assert database.get_db_router().primary.engine is engine
+    assert database.get_session_factory().kw["bind"] is engine
+    await database.close_database()
+    assert database._async_engine is None
+    assert database.get_async_engine() is not engine
+    await database.close_database()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,149 @@
+"""
+Tests for the per-connection_id engine registry.
+"""
+import asyncio
+import sqlite3
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+
+from auth.dependencies import get_api_key
+from core.config import DatabaseTarget
+from core.database import get_engine_registry
+from core.engines import EngineRegistry, UnknownTargetError
+from main import app
+from models.api_key import ApiKey
+from services.audit_logger import query_history_writer
+
+
+@pytest.fixture
+def targets(tmp_path):
+    """Three SQLite targets whose ``items`` row names the database."""
+    configured = {}
+    for name in ("a", "b", "c"):
+        path = tmp_path / f"{name}.db"
+        db = sqlite3.connect(path)
+        db.execute("CREATE TABLE items (id INTEGER PRIMARY KEY, source TEXT)")
+        db.execute("INSERT INTO items (id, source) VALUES (1, ?)", (name,))
+        db.commit()
+        db.close()
+        configured[name] = DatabaseTarget(
+            url=f"sqlite+aiosqlite:///{path}", pool_size=1, max_overflow=0
+        )
+    return configured
+
+
+async def _source(registry: EngineRegistry, name: str) -> str:
+    lease = await registry.acquire(name)
+    try:
+        async with lease.engine.connect() as conn:
+            return (await conn.execute(text("SELECT source FROM items"))).scalar_one()
+    finally:
+        lease.release()
+
+
+@pytest.mark.asyncio
+async def test_engines_are_created_lazily(targets):
+    """Test nothing opens until a target is used, and unknown ids fail."""
+    registry = EngineRegistry(targets)
+    try:
+        assert registry.stats()["targets"] == {"a": None, "b": None, "c": None}
+        assert await _source(registry, "b") == "b"
+        stats = registry.stats()
+        assert stats["open_engines"] == 1
+        assert stats["targets"]["b"]["connections"] == 1
+        assert "Pool size: 1" in stats["targets"]["b"]["pool"]
+        with pytest.raises(UnknownTargetError):
+            await registry.acquire("missing")
+    finally:
+        await registry.dispose_all()
+
+
+@pytest.mark.asyncio
+async def test_least_recently_used_idle_engine_is_disposed(targets):
+    """Test the engine cap disposes the oldest engine not in use."""
+    registry = EngineRegistry(targets, max_engines=2)
+    try:
+        held = await registry.acquire("a")
+        await _source(registry, "b")
+        await _source(registry, "c")
+        assert [n for n, s in registry.stats()["targets"].items() if s] == ["a", "c"]
+
+        held.release()
+        await _source(registry, "b")
+        assert registry.stats()["targets"]["a"] is None
+        assert registry.disposed == 2
+    finally:
+        await registry.dispose_all()
+
+
+@pytest.mark.asyncio
+async def test_idle_engines_are_disposed(targets):
+    """Test idle disposal skips engines with a checked-out connection."""
+    registry = EngineRegistry(targets, idle_timeout=0.01)
+    try:
+        await _source(registry, "a")
+        lease = await registry.acquire("b")
+        lease.release()
+        async with lease.engine.connect() as conn:
+            await asyncio.sleep(0.05)
+            assert await registry.evict_idle() == 1
+            assert registry.stats()["targets"]["b"]["in_use"] == 1
+            await conn.execute(text("SELECT 1"))
+        await asyncio.sleep(0.05)
+        assert await registry.evict_idle() == 1
+        assert registry.stats()["open_engines"] == 0
+    finally:
+        await registry.dispose_all()
+
+
+def test_query_endpoint_targets_connection_id(targets, monkeypatch):
+    """Test connection_id selects the database and is recorded in history."""
+    registry = EngineRegistry(
+        targets,
+        engine_factory=lambda name, target: create_async_engine(
+            target.url, poolclass=NullPool
+        ),
+    )
+    submitted = []
+
+    async def submit(record):
+        submitted.append(record)
+        return True
+
+    monkeypatch.setattr(query_history_writer, "submit", submit)
+    app.dependency_overrides[get_engine_registry] = lambda: registry
+    app.dependency_overrides[get_api_key] = lambda: ApiKey(
+        key_id="r", key_hash="r", client_id="r", scopes='["read"]'
+    )
+    try:
+        client = TestClient(app)
+        response = client.post(
+            "/api/v1/query",
+            json={
+                "sql": "SELECT source FROM items",
+                "connection_id": "c",
+            },
+        )
+        missing = client.post(
+            "/api/v1/query",
+            json={
+                "sql": "SELECT 1",
+                "connection_id": "missing",
+            },
+        )
+    finally:
+        app.dependency_overrides.clear()
+
+    assert response.json() == {"source": "c"}
+    assert response.headers["X-Cache"] == "BYPASS"
+    assert missing.status_code == 404
+    assert submitted[0].connection_id == "c"
+    assert registry.stats()["targets"]["c"]["outstanding"] == 0
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
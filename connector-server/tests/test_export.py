@@ -0,0 +1,228 @@
+"""
+Tests for the export endpoints.
+"""
+import csv
+import io
+import json
+import sqlite3
+import tracemalloc
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from sqlalchemy.exc import OperationalError
+
+from auth.dependencies import get_api_key
+from core.admission import admission
+from core.database import get_async_engine
+from main import app
+from models.api_key import ApiKey
+from services.import_export import NdjsonEncoder, open_export, table_source
+
+
+def _seed(sqlite_url: str, rows: int) -> None:
+    db = sqlite3.connect(sqlite_url.split(":///", 1)[1])
+    db.execute("CREATE TABLE events (id INTEGER PRIMARY KEY, name TEXT, score REAL)")
+    db.executemany(
+        "INSERT INTO events (id, name, score) VALUES (?, ?, ?)",
+        [(i, f"event-{i}", i / 2) for i in range(1, rows + 1)],
+    )
+    db.commit()
+    db.close()
+
+
+@pytest.fixture
+def client(sqlite_engine, sqlite_url):
+    """Test client with exports bound to the SQLite stand-in."""
+    _seed(sqlite_url, 25)
+    app.dependency_overrides[get_async_engine] = lambda: sqlite_engine
+    app.dependency_overrides[get_api_key] = lambda: ApiKey(
+        key_id="test", key_hash="test", client_id="test", scopes='["read"]'
+    )
+    yield TestClient(app)
+    app.dependency_overrides.clear()
+
+
+def test_export_ndjson_in_chunks(client):
+    """Test a table export pages through every row in key order."""
+    response = client.get("/api/v1/export/events?chunk_size=4")
+    assert response.status_code == 200
+    assert response.headers["x-export-key"] == "id"
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [row["id"] for row in rows] == list(range(1, 26))
+
+
+def test_export_csv_resume(client):
+    """Test resuming after the last received key skips the header row."""
+    response = client.get("/api/v1/export/events?format=csv&chunk_size=10")
+    first = list(csv.reader(io.StringIO(response.text)))
+    assert first[0] == ["id", "name", "score"]
+    assert len(first) == 26
+
+    response = client.get("/api/v1/export/events?format=csv&columns=name&after=20")
+    rest = list(csv.reader(io.StringIO(response.text)))
+    assert rest == [[str(i), f"event-{i}"] for i in range(21, 26)]
+
+
+def test_export_parquet_row_groups(client):
+    """Test Parquet output is a valid file with one row group per chunk."""
+    pq = pytest.importorskip("pyarrow.parquet")
+    response = client.get("/api/v1/export/events?format=parquet&chunk_size=10")
+    assert response.status_code == 200
+    parquet_file = pq.ParquetFile(io.BytesIO(response.content))
+    assert parquet_file.num_row_groups == 3
+    assert parquet_file.read().column("id").to_pylist() == list(range(1, 26))
+
+
+def test_export_parquet_schema_from_column_types(client, sqlite_url):
+    """Test Parquet types come from the table, not the first chunk's values."""
+    pa = pytest.importorskip("pyarrow")
+    pq = pytest.importorskip("pyarrow.parquet")
+    db = sqlite3.connect(sqlite_url.split(":///", 1)[1])
+    db.execute(
+        "CREATE TABLE prices (id INTEGER PRIMARY KEY, amount NUMERIC(10, 2), "
+        "rank INTEGER, seen DATETIME)"
+    )
+    db.executemany(
+        "INSERT INTO prices VALUES (?, ?, ?, ?)",
+        [(1, "1.50", None, None), (2, "2.25", None, None), (3, "3", 7, None)],
+    )
+    db.commit()
+    db.close()
+
+    response = client.get("/api/v1/export/prices?format=parquet&chunk_size=2")
+    assert response.status_code == 200
+    parquet = pq.read_table(io.BytesIO(response.content))
+    assert parquet.schema.field("amount").type == pa.decimal128(10, 2)
+    assert parquet.schema.field("rank").type == pa.int64()
+    assert parquet.schema.field("seen").type == pa.timestamp("us")
+    assert parquet.column("rank").to_pylist() == [None, None, 7]
+
+
+def test_export_empty_table(client, sqlite_url):
+    """Test a zero-row export still has a CSV header and a valid Parquet file."""
+    db = sqlite3.connect(sqlite_url.split(":///", 1)[1])
+    db.execute("CREATE TABLE empty (id INTEGER PRIMARY KEY, name TEXT)")
+    db.commit()
+    db.close()
+
+    response = client.get("/api/v1/export/empty?format=csv")
+    assert response.status_code == 200
+    assert response.text == "id,name\n"
+    assert client.get("/api/v1/export/empty").text == ""
+
+    pq = pytest.importorskip("pyarrow.parquet")
+    response = client.get("/api/v1/export/empty?format=parquet")
+    parquet = pq.read_table(io.BytesIO(response.content))
+    assert (parquet.num_rows, parquet.column_names) == (0, ["id", "name"])
+
+
+def test_export_key_must_be_unique(client, sqlite_url):
+    """Test a key with duplicates across a chunk boundary is refused."""
+    db = sqlite3.connect(sqlite_url.split(":///", 1)[1])
+    db.execute(
+        "CREATE TABLE tags (id INTEGER PRIMARY KEY, tag TEXT NOT NULL, "
+        "code TEXT NOT NULL UNIQUE, alias TEXT UNIQUE)"
+    )
+    # 'b' straddles the first two-row chunk; paging on tag would lose a row
+    db.executemany(
+        "INSERT INTO tags VALUES (?, ?, ?, ?)",
+        [(1, "a", "c1", None), (2, "b", "c2", None), (3, "b", "c3", None)],
+    )
+    db.commit()
+    db.close()
+
+    for key in ("tag", "alias"):
+        response = client.get(f"/api/v1/export/tags?key={key}&chunk_size=2")
+        assert response.status_code == 400
+        assert "unique index" in response.json()["detail"]
+
+    response = client.get("/api/v1/export/tags?key=code&chunk_size=2")
+    assert response.status_code == 200
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [row["id"] for row in rows] == [1, 2, 3]
+
+
+def test_export_query(client):
+    """Test exporting a query keyed on one of its columns."""
+    response = client.post(
+        "/api/v1/export",
+        json={
+            "sql": "SELECT id, name FROM events WHERE score > :min_score",
+            "params": {"min_score": 5},
+            "key": "id",
+            "after": 15,
+            "chunk_size": 3,
+        },
+    )
+    assert response.status_code == 200
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [row["id"] for row in rows] == list(range(16, 26))
+
+
+def test_export_errors(client):
+    """Test unknown tables, columns and bad queries are rejected up front."""
+    assert client.get("/api/v1/export/missing").status_code == 404
+    assert client.get("/api/v1/export/events?key=nope").status_code == 400
+    assert client.get("/api/v1/export/events?after=abc").status_code == 400
+    response = client.post(
+        "/api/v1/export", json={"sql": "SELECT * FROM missing", "key": "id"}
+    )
+    assert response.status_code == 400
+
+
+def test_export_failing_mid_stream_releases_admission(client, sqlite_engine):
+    """Test a page failing after the response started frees the ticket."""
+    pages = []
+
+    def break_second_page(conn, cursor, statement, parameters, context, executemany):
+        if "LIMIT" in statement:
+            pages.append(statement)
+            if len(pages) == 2:
+                statement = "SELECT * FROM dropped_mid_export"
+        return statement, parameters
+
+    event.listen(
+        sqlite_engine.sync_engine,
+        "before_cursor_execute",
+        break_second_page,
+        retval=True,
+    )
+    try:
+        with pytest.raises(OperationalError):
+            client.get("/api/v1/export/events?chunk_size=10")
+    finally:
+        event.remove(
+            sqlite_engine.sync_engine, "before_cursor_execute", break_second_page
+        )
+    assert len(pages) == 2
+    assert admission.active == 0
+
+
+async def _export_peak_memory(engine) -> tuple[int, int]:
+    source = await table_source(engine, "events")
+    body = await open_export(engine, source, NdjsonEncoder(), chunk_size=5000)
+    rows = 0
+    tracemalloc.start()
+    try:
+        async for chunk in body:
+            rows += chunk.count(b"\n")
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return rows, peak
+
+
+@pytest.mark.slow
+@pytest.mark.asyncio
+async def test_export_memory_is_bounded(sqlite_engine, sqlite_url):
+    """Test peak memory tracks the chunk size, not the table size."""
+    _seed(sqlite_url, 500_000)
+    rows, peak = await _export_peak_memory(sqlite_engine)
+    assert rows == 500_000
+    # Roughly a couple of 5000-row chunks, far below the full table
+    assert peak < 8 * 1024 * 1024
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,78 @@
+"""
+Tests for result formatting helpers and the row serialization benchmark.
+"""
+import json
+from datetime import date, datetime, time, timedelta, timezone
+from decimal import Decimal
+from uuid import UUID
+
+import pytest
+
+from utils.formatters import json_default, ndjson_rows
+
+
+def test_ndjson_rows_matches_json_default():
+    """Test orjson output decodes to the same values as the json module path."""
+    columns = ["id", "at", "day", "clock", "took", "price", "blob", "uid", "none"]
+    rows = [
+        (
+            1,
+            datetime(2024, 5, 1, 8, 30, 15, 250),
+            date(2024, 5, 1),
+            time(8, 30),
+            timedelta(seconds=90),
+            Decimal("12345678901234.5678"),
+            b"\x00\xffbytes",
+            UUID(int=7),
+            None,
+        ),
+        (
+            2,
+            datetime(2024, 5, 1, tzinfo=timezone.utc),
+            date(1999, 12, 31),
+            time(23, 59, 59, 1),
+            timedelta(days=1),
+            Decimal("-0.10"),
+            bytearray(b"x"),
+            UUID(int=8),
+            "ünïcode",
+        ),
+    ]
+    encoded = ndjson_rows(columns, rows)
+    lines = encoded.decode().splitlines()
+
+    assert encoded.endswith(b"\n")
+    assert len(lines) == 2
+    for line, row in zip(lines, rows):
+        expected = json.loads(json.dumps(dict(zip(columns, row)), default=json_default))
+        assert json.loads(line) == expected
+    assert json.loads(lines[0])["price"] == "12345678901234.5678"
+    assert ndjson_rows(columns, []) == b""
+
+
+def test_ndjson_rows_accepts_str_subclass_columns():
+    """Test SQLAlchemy quoted_name column keys encode like plain strings."""
+    from sqlalchemy.sql.elements import quoted_name
+
+    assert ndjson_rows([quoted_name("id", None)], [(1,)]) == b'{"id":1}\n'
+
+
+def test_ndjson_rows_rejects_unknown_types():
+    """Test values neither encoder understands still raise TypeError."""
+    with pytest.raises(TypeError):
+        ndjson_rows(["value"], [(object(),)])
+
+
+@pytest.mark.slow
+def test_serialization_benchmark():
+    """Test the orjson path beats per-row models and the json module."""
+    from benchmarks.serialization import main
+
+    results = main(["--rows", "100000", "--repeat", "1"])
+    assert results["orjson"]["seconds"] < results["json"]["seconds"]
+    assert results["orjson"]["seconds"] < results["pydantic"]["seconds"]
+    assert results["orjson"]["peak_mib"] < results["pydantic"]["peak_mib"]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
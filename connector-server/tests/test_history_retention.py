@@ -0,0 +1,253 @@
+"""
+Tests for query history partition maintenance, archiving and pruning.
+"""
+import gzip
+import json
+from contextlib import asynccontextmanager
+from datetime import date, datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import func, insert, select
+from sqlmodel import SQLModel
+
+import services.history_retention as retention_module
+from models import QueryHistory
+from services.history_retention import (
+    HistoryRetention,
+    Partition,
+    RetentionError,
+    RetentionMode,
+    expired_partitions,
+    parse_partitions,
+    partitions_to_add,
+    reorganize_sql,
+)
+from services.import_export import ExportFormat
+
+NOW = datetime(2024, 5, 20, 15, 30)
+
+
+@pytest_asyncio.fixture
+async def history_engine(sqlite_engine):
+    """SQLite stand-in with 30 days of history, 10 rows per day."""
+    import models  # noqa: F401  (registers the tables)
+
+    async with sqlite_engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+        await conn.execute(
+            insert(QueryHistory),
+            [
+                {
+                    "client_id": "client",
+                    "query": f"SELECT {day}, {i}",
+                    "execution_time": 0.01,
+                    "row_count": i,
+                    "executed_at": NOW - timedelta(days=day, minutes=i),
+                }
+                for day in range(30)
+                for i in range(10)
+            ],
+        )
+    return sqlite_engine
+
+
+async def _remaining(engine) -> tuple[int, datetime]:
+    async with engine.connect() as conn:
+        return (
+            await conn.execute(select(func.count(), func.min(QueryHistory.executed_at)))
+        ).one()
+
+
+def test_partitions_to_add_on_fresh_table():
+    """Test the first run adds a catch-all partition and the days ahead."""
+    added = partitions_to_add([Partition("p_future", None)], date(2024, 5, 20), ahead=2)
+    assert [(p.name, p.upper) for p in added] == [
+        ("p20240519", datetime(2024, 5, 20)),
+        ("p20240520", datetime(2024, 5, 21)),
+        ("p20240521", datetime(2024, 5, 22)),
+        ("p20240522", datetime(2024, 5, 23)),
+    ]
+
+
+def test_partitions_to_add_continues_from_last_bound():
+    """Test only the missing days are added, and none when far enough ahead."""
+    existing = [
+        Partition("p20240519", datetime(2024, 5, 20)),
+        Partition("p20240520", datetime(2024, 5, 21)),
+        Partition("p_future", None),
+    ]
+    added = partitions_to_add(existing, date(2024, 5, 20), ahead=1)
+    assert [p.name for p in added] == ["p20240521"]
+    assert partitions_to_add(existing, date(2024, 5, 19), ahead=1) == []
+
+
+def test_partition_sql_helpers():
+    """Test information_schema parsing, expiry and the REORGANIZE statement."""
+    partitions = parse_partitions(
+        [
+            ("p20240501", "'2024-05-02 00:00:00'", 120),
+            ("p20240502", "'2024-05-03 00:00:00'", None),
+            ("p_future", "MAXVALUE", 0),
+        ]
+    )
+    assert partitions[0] == Partition("p20240501", datetime(2024, 5, 2), 120)
+    assert partitions[2].upper is None
+    assert [p.name for p in expired_partitions(partitions, datetime(2024, 5, 2))] == [
+        "p20240501"
+    ]
+    assert reorganize_sql([Partition("p20240503", datetime(2024, 5, 4))]) == (
+        "ALTER TABLE query_history REORGANIZE PARTITION p_future INTO ("
+        "PARTITION p20240503 VALUES LESS THAN ('2024-05-04 00:00:00'), "
+        "PARTITION p_future VALUES LESS THAN (MAXVALUE))"
+    )
+
+
+@pytest.mark.asyncio
+async def test_chunked_delete_with_ndjson_archive(history_engine, tmp_path):
+    """Test expired rows are archived, then deleted in chunks."""
+    retention = HistoryRetention(
+        lambda: history_engine,
+        retention_days=7,
+        archive_dir=str(tmp_path),
+        chunk_size=40,
+        delete_pause=0,
+        clock=lambda: NOW,
+    )
+    report = await retention.run_once()
+
+    # Days 8..29 are entirely before the cutoff; day 7 is split by it
+    cutoff = datetime(2024, 5, 13)
+    expired = sum(
+        NOW - timedelta(days=day, minutes=i) < cutoff
+        for day in range(30)
+        for i in range(10)
+    )
+    assert report["mode"] == "delete"
+    assert report["rows_deleted"] == report["rows_archived"] == expired
+    count, oldest = await _remaining(history_engine)
+    assert count == 300 - expired
+    assert oldest >= cutoff
+
+    archive = tmp_path / "query_history-before-20240513.ndjson.gz"
+    assert report["archives"] == [str(archive)]
+    with gzip.open(archive, "rt") as f:
+        rows = [json.loads(line) for line in f]
+    assert len(rows) == expired
+    assert rows == sorted(rows, key=lambda r: r["id"])
+    assert all(datetime.fromisoformat(r["executed_at"]) < cutoff for r in rows)
+
+    # Nothing left to prune, so no empty archive either
+    again = await retention.run_once()
+    assert again["rows_deleted"] == 0
+    assert again["archives"] == []
+
+
+@pytest.mark.asyncio
+async def test_parquet_archive(history_engine, tmp_path):
+    """Test archives can be written as Parquet."""
+    pq = pytest.importorskip("pyarrow.parquet")
+    retention = HistoryRetention(
+        lambda: history_engine,
+        retention_days=20,
+        archive_dir=str(tmp_path),
+        archive_format=ExportFormat.PARQUET,
+        clock=lambda: NOW,
+    )
+    report = await retention.run_once()
+
+    table = pq.read_table(report["archives"][0])
+    assert table.num_rows == report["rows_deleted"] > 0
+    assert "executed_at" in table.column_names
+
+
+@pytest.mark.asyncio
+async def test_nothing_removed_when_archive_fails(
+    history_engine, tmp_path, monkeypatch
+):
+    """Test a failed archive leaves history in place."""
+
+    async def failing_archive(*args, **kwargs):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(retention_module, "archive_history", failing_archive)
+    retention = HistoryRetention(
+        lambda: history_engine,
+        retention_days=7,
+        archive_dir=str(tmp_path),
+        clock=lambda: NOW,
+    )
+    with pytest.raises(OSError):
+        await retention.run_once()
+    assert (await _remaining(history_engine))[0] == 300
+
+
+@pytest.mark.asyncio
+async def test_zero_retention_and_partition_mode_without_partitions(history_engine):
+    """Test retention_days=0 keeps everything; partition mode needs partitions."""
+    keep = HistoryRetention(lambda: history_engine, retention_days=0)
+    assert (await keep.run_once())["rows_deleted"] == 0
+    assert (await _remaining(history_engine))[0] == 300
+
+    forced = HistoryRetention(
+        lambda: history_engine, mode=RetentionMode.PARTITION, clock=lambda: NOW
+    )
+    with pytest.raises(RetentionError):
+        await forced.run_once()
+
+
+class _RecordingEngine:
+    """Just enough of a MySQL AsyncEngine to record maintenance statements."""
+
+    dialect = SimpleNamespace(name="mysql")
+
+    def __init__(self):
+        self.statements = []
+
+    @asynccontextmanager
+    async def connect(self):
+        yield self
+
+    begin = connect
+
+    async def scalar(self, statement, params=None):
+        return 1  # GET_LOCK acquired
+
+    async def execute(self, statement, params=None):
+        self.statements.append(str(statement))
+
+
+@pytest.mark.asyncio
+async def test_partition_mode_adds_and_drops_partitions(monkeypatch):
+    """Test partitions are split off ahead of time and dropped once expired."""
+    engine = _RecordingEngine()
+    partitions = [
+        Partition(f"p202405{day:02d}", datetime(2024, 5, day + 1))
+        for day in range(10, 22)
+    ] + [Partition("p_future", None)]
+
+    async def read_partitions(_engine):
+        return partitions
+
+    monkeypatch.setattr(retention_module, "read_partitions", read_partitions)
+    retention = HistoryRetention(
+        lambda: engine, retention_days=7, partitions_ahead=3, clock=lambda: NOW
+    )
+    report = await retention.run_once()
+
+    assert report["mode"] == "partition"
+    assert report["partitions_added"] == ["p20240522", "p20240523"]
+    assert report["partitions_dropped"] == ["p20240510", "p20240511", "p20240512"]
+    ddl = [s for s in engine.statements if s.startswith("ALTER")]
+    assert ddl[0].startswith(
+        "ALTER TABLE query_history REORGANIZE PARTITION p_future INTO ("
+    )
+    assert ddl[1:] == [
+        f"ALTER TABLE query_history DROP PARTITION p202405{day}" for day in (10, 11, 12)
+    ]
+    assert engine.statements[-1] == "SELECT RELEASE_LOCK(:name)"
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
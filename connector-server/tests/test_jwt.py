@@ -0,0 +1,86 @@
+"""
+Tests for JWT verification and the per-worker token/principal caches.
+"""
+from datetime import timedelta
+
+import pytest
+import pytest_asyncio
+from fastapi import HTTPException
+from fastapi.security import HTTPAuthorizationCredentials
+
+import auth.jwt as auth_jwt
+from auth.jwt import (
+    create_access_token_for_user,
+    get_current_active_user,
+    get_current_user,
+    principal_cache,
+    token_cache,
+    verify_token_cached,
+)
+from auth.users import get_user_by_username, update_user
+from core.security import create_access_token
+from models import User
+
+
+@pytest_asyncio.fixture
+async def db(sqlite_session):
+    """Async session on the SQLite stand-in holding one user."""
+    token_cache.clear()
+    principal_cache.clear()
+    sqlite_session.add(User(username="alice", hashed_password="x", scopes="read,write"))
+    await sqlite_session.commit()
+    yield sqlite_session
+    token_cache.clear()
+    principal_cache.clear()
+
+
+def _credentials(token: str) -> HTTPAuthorizationCredentials:
+    return HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+
+
+def test_verified_tokens_are_cached(monkeypatch):
+    """Test the signature is only checked once per token."""
+    calls = []
+    verify = auth_jwt.verify_token
+    monkeypatch.setattr(
+        auth_jwt, "verify_token", lambda *a: calls.append(a) or verify(*a)
+    )
+    token = create_access_token({"sub": "alice", "scopes": ["read"]})
+
+    first = verify_token_cached(token, HTTPException(401))
+    second = verify_token_cached(token, HTTPException(401))
+    assert first == second
+    assert first.scopes == ["read"]
+    assert len(calls) == 1
+
+
+def test_expired_tokens_are_rejected():
+    """Test an expired token never enters the cache."""
+    token_cache.clear()
+    token = create_access_token({"sub": "alice"}, timedelta(seconds=-5))
+    with pytest.raises(HTTPException):
+        verify_token_cached(token, HTTPException(401))
+    assert len(token_cache) == 0
+
+
+@pytest.mark.asyncio
+async def test_principal_cache_and_invalidation(db):
+    """Test repeat requests skip the user lookup until the user changes."""
+    user = await get_user_by_username(db, "alice")
+    credentials = _credentials(create_access_token_for_user(user))
+
+    current = await get_current_user(credentials, db)
+    assert (current.username, current.scopes_list) == ("alice", ["read", "write"])
+    selects = len(db.statements)
+    await get_current_user(credentials, db)
+    assert len(db.statements) == selects
+
+    await update_user(db, user.id, is_active=False)
+    current = await get_current_user(credentials, db)
+    assert not current.is_active
+    with pytest.raises(HTTPException):
+        await get_current_active_user(current)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,166 @@
+"""
+Tests for signed keyset cursors and the paginated listings.
+"""
+from datetime import datetime, timedelta
+
+import httpx
+import pytest
+import pytest_asyncio
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from auth.api_keys import get_api_keys
+from auth.dependencies import get_api_key
+from auth.users import get_users
+from core.database import get_async_db
+from main import app
+from models import ApiKey, QueryHistory, User
+from services.audit_logger import get_query_history
+from utils.pagination import CursorError, decode_cursor, encode_cursor
+
+START = datetime(2024, 5, 1, 12, 0, 0)
+
+
+@pytest_asyncio.fixture
+async def db(sqlite_session):
+    """Session with 25 users, 25 keys over two clients and 50 history rows."""
+    await sqlite_session.execute(
+        insert(User),
+        [{"username": f"user{i:02d}", "hashed_password": "x"} for i in range(25)],
+    )
+    await sqlite_session.execute(
+        insert(ApiKey),
+        [
+            {
+                "key_id": f"k{i:02d}",
+                "key_hash": f"h{i:02d}",
+                "client_id": ("a", "b")[i % 2],
+            }
+            for i in range(25)
+        ],
+    )
+    # Two records per second, so pages must break executed_at ties by id
+    await sqlite_session.execute(
+        insert(QueryHistory),
+        [
+            {
+                "client_id": ("a", "b")[i % 2],
+                "query": f"SELECT {i}",
+                "executed_at": START + timedelta(seconds=i // 2),
+            }
+            for i in range(50)
+        ],
+    )
+    await sqlite_session.commit()
+    sqlite_session.statements.clear()
+    return sqlite_session
+
+
+async def _all_pages(fetch, **kwargs) -> list:
+    pages, cursor = [], None
+    while True:
+        page = await fetch(cursor=cursor, **kwargs)
+        pages.append(page.items)
+        if page.next_cursor is None:
+            return pages
+        cursor = page.next_cursor
+
+
+def test_cursor_round_trip_and_tampering():
+    """Test cursors decode only unmodified and for the scope they were made for."""
+    token = encode_cursor("scope", [START, 7], secret="s")
+    assert decode_cursor("scope", token, secret="s") == [START.isoformat(), 7]
+
+    payload, signature = token.split(".")
+    forged = encode_cursor("scope", [START, 8], secret="other").split(".")[0]
+    for bad in (f"{forged}.{signature}", "garbage", f"{payload}.!!"):
+        with pytest.raises(CursorError):
+            decode_cursor("scope", bad, secret="s")
+    with pytest.raises(CursorError):
+        decode_cursor("other-scope", token, secret="s")
+
+
+@pytest.mark.asyncio
+async def test_users_pages_cover_every_row_once(db):
+    """Test users page in id order without OFFSET."""
+    pages = await _all_pages(lambda **kw: get_users(db, **kw), limit=10)
+
+    assert [len(p) for p in pages] == [10, 10, 5]
+    ids = [user.id for page in pages for user in page]
+    assert ids == sorted(ids) and len(set(ids)) == 25
+    # Later pages seek past the previous page's last id instead of skipping
+    assert sum("WHERE USERS.ID > ?" in s for s in db.statements) == 2
+
+
+@pytest.mark.asyncio
+async def test_api_key_cursors_are_bound_to_the_client_filter(db):
+    """Test per-client pages, and that a cursor cannot switch clients."""
+    pages = await _all_pages(
+        lambda **kw: get_api_keys(db, client_id="a", **kw), limit=5
+    )
+    keys = [key for page in pages for key in page]
+    assert len(keys) == 13 and {key.client_id for key in keys} == {"a"}
+
+    first = await get_api_keys(db, client_id="a", limit=5)
+    with pytest.raises(CursorError):
+        await get_api_keys(db, client_id="b", cursor=first.next_cursor)
+
+
+@pytest.mark.asyncio
+async def test_history_pages_newest_first(db):
+    """Test history pages by (executed_at, id) descending across ties."""
+    pages = await _all_pages(lambda **kw: get_query_history(db, **kw), limit=7)
+    rows = [(h.executed_at, h.id) for page in pages for h in page]
+
+    assert len(rows) == 50
+    assert rows == sorted(rows, reverse=True)
+    # At least one page boundary falls between two rows of the same second
+    assert any(
+        before[-1].executed_at == after[0].executed_at
+        for before, after in zip(pages, pages[1:])
+    )
+
+
+@pytest.mark.asyncio
+async def test_history_endpoint_scopes_listing_to_caller(db, sqlite_engine):
+    """Test non-admin keys only see their own client's history."""
+    caller = ApiKey(key_id="t", key_hash="t", client_id="a", scopes='["read"]')
+
+    async def session():
+        async with AsyncSession(sqlite_engine, expire_on_commit=False) as s:
+            yield s
+
+    app.dependency_overrides[get_async_db] = session
+    app.dependency_overrides[get_api_key] = lambda: caller
+    transport = httpx.ASGITransport(app=app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://t") as c:
+            first = (await c.get("/api/v1/history?limit=20")).json()
+            second = (
+                await c.get("/api/v1/history", params={"cursor": first["next_cursor"]})
+            ).json()
+            forbidden = await c.get("/api/v1/history?client_id=b")
+            bad_cursor = await c.get("/api/v1/history?cursor=nope")
+    finally:
+        app.dependency_overrides.clear()
+
+    items = first["items"] + second["items"]
+    assert len(first["items"]) == 20 and second["next_cursor"] is None
+    assert len(items) == 25 and {item["client_id"] for item in items} == {"a"}
+    assert forbidden.status_code == 403
+    assert bad_cursor.status_code == 400
+
+
+@pytest.mark.slow
+def test_pagination_depth_benchmark():
+    """Benchmark: keyset pages stay flat with depth while OFFSET pages grow."""
+    from benchmarks.pagination import main
+
+    results = main(["--rows", "1000100", "--repeat", "3"])
+    shallow, deep = results[0], results[1000000]
+    assert deep["keyset_ms"] < shallow["keyset_ms"] * 3
+    assert deep["keyset_ms"] * 5 < deep["offset_ms"]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
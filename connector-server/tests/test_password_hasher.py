@@ -0,0 +1,124 @@
+"""
+Tests for bcrypt hashing on the bounded password pool.
+"""
+import asyncio
+import statistics
+import time
+
+import httpx
+import pytest
+from passlib.context import CryptContext
+
+from core.security import PasswordHasher, PasswordHashingBusy
+from main import app
+
+# Minimum bcrypt cost keeps the functional tests fast
+fast_context = CryptContext(schemes=["bcrypt"], bcrypt__rounds=4)
+
+
+@pytest.mark.asyncio
+async def test_hash_and_verify_off_loop():
+    """Test hashing and verification round-trip through the pool."""
+    hasher = PasswordHasher(max_workers=2, context=fast_context)
+    try:
+        hashed = await hasher.hash("s3cret")
+        assert await hasher.verify("s3cret", hashed)
+        assert not await hasher.verify("wrong", hashed)
+    finally:
+        hasher.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_saturated_pool_rejects_and_times_out():
+    """Test work beyond capacity is rejected, and waiting is bounded."""
+    hasher = PasswordHasher(max_workers=1, max_pending=1, timeout=0.1)
+    try:
+        running = asyncio.ensure_future(hasher._run(time.sleep, 0.3))
+        queued = asyncio.ensure_future(hasher._run(time.sleep, 0.3))
+        await asyncio.sleep(0)
+        with pytest.raises(PasswordHashingBusy):
+            await hasher._run(time.sleep, 0)
+        assert hasher.rejected == 1
+
+        results = await asyncio.gather(running, queued, return_exceptions=True)
+        assert all(isinstance(r, PasswordHashingBusy) for r in results)
+        assert hasher.timed_out == 2
+        # The queued call was cancelled; the running one still holds its place
+        assert hasher._in_flight == 1
+        await asyncio.sleep(0.3)
+        assert hasher._in_flight == 0
+    finally:
+        hasher.shutdown()
+
+
+async def _health_latencies(
+    client: httpx.AsyncClient, duration: float, interval: float = 0.01
+) -> list:
+    """Issue /health on a fixed schedule; latency counts from the planned send.
+
+    Measuring from the schedule rather than the actual send includes the
+    time a request waited for a blocked event loop.
+    """
+    latencies = []
+    started = time.perf_counter()
+    for i in range(int(duration / interval)):
+        planned = started + i * interval
+        await asyncio.sleep(max(planned - time.perf_counter(), 0))
+        response = await client.get("/health")
+        assert response.status_code == 200
+        latencies.append(time.perf_counter() - planned)
+    return latencies
+
+
+@pytest.mark.slow
+@pytest.mark.asyncio
+async def test_login_storm_keeps_other_endpoints_flat():
+    """Load test: /health latency during a storm of password checks.
+
+    Compares verification inline on the event loop with the bounded pool;
+    only the pool keeps the non-auth endpoint responsive.
+    """
+    context = CryptContext(schemes=["bcrypt"], bcrypt__rounds=10)
+    hashed = context.hash("password")
+    hasher = PasswordHasher(
+        max_workers=4, max_pending=1000, timeout=60, context=context
+    )
+
+    # Logins arrive every 30ms across the measurement window
+    async def inline_login(i: int) -> None:
+        await asyncio.sleep(i * 0.03)
+        context.verify("password", hashed)
+
+    async def pooled_login(i: int) -> None:
+        await asyncio.sleep(i * 0.03)
+        await hasher.verify("password", hashed)
+
+    transport = httpx.ASGITransport(app=app)
+    results = {}
+    try:
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://test"
+        ) as client:
+            baseline = await _health_latencies(client, 0.5)
+            for name, login in (("inline", inline_login), ("pooled", pooled_login)):
+                storm = asyncio.gather(*(login(i) for i in range(40)))
+                latencies = await _health_latencies(client, 1.5)
+                await storm
+                results[name] = latencies
+    finally:
+        hasher.shutdown()
+
+    def p95(values: list) -> float:
+        return statistics.quantiles(values, n=20)[-1] * 1000
+
+    print(
+        f"\n/health p95 during login storm: idle={p95(baseline):.1f}ms "
+        f"inline={p95(results['inline']):.1f}ms "
+        f"pooled={p95(results['pooled']):.1f}ms"
+    )
+    assert p95(results["pooled"]) < 50
+    assert p95(results["inline"]) > p95(results["pooled"]) * 5
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,325 @@
+"""
+Tests for the streaming query endpoint.
+"""
+import asyncio
+import json
+import sqlite3
+import time
+import tracemalloc
+
+import httpx
+import pytest
+import pytest_asyncio
+from fastapi.testclient import TestClient
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from api.query import QueryRequest, execution_budget
+from auth.dependencies import get_api_key
+from core.admission import admission
+from core.config import settings
+from core.database import get_db_router
+from core.routing import DatabaseRouter
+from main import app
+from models.api_key import ApiKey
+from models.query_history import QueryStatus
+from services.audit_logger import query_history_writer
+from services.query_executor import (
+    QueryError,
+    QueryTimeoutError,
+    execute_statement,
+    is_read_query,
+    open_query_stream,
+    with_execution_time_hint,
+)
+
+SERIES_SQL = (
+    "WITH RECURSIVE seq(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM seq "
+    "WHERE n < :rows) SELECT n AS id, 'row-' || n AS label FROM seq"
+)
+# Never finishes on its own
+ENDLESS_SQL = "WITH RECURSIVE seq(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM seq)"
+
+
+@pytest.fixture
+def client(sqlite_engine, sqlite_url):
+    """Test client with the query endpoint bound to the SQLite stand-in."""
+    db = sqlite3.connect(sqlite_url.split(":///", 1)[1])
+    db.execute("CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT)")
+    db.executemany(
+        "INSERT INTO items (id, name) VALUES (?, ?)",
+        [(i, f"item-{i}") for i in range(1, 26)],
+    )
+    db.commit()
+    db.close()
+
+    app.dependency_overrides[get_db_router] = lambda: DatabaseRouter(sqlite_engine)
+    app.dependency_overrides[get_api_key] = lambda: ApiKey(
+        key_id="test", key_hash="test", client_id="test", scopes='["read"]'
+    )
+    yield TestClient(app)
+    app.dependency_overrides.clear()
+
+
+def test_is_read_query():
+    """Test read-only statement detection."""
+    assert is_read_query("SELECT 1")
+    assert is_read_query("  with t as (select 1) select * from t;")
+    assert not is_read_query("DELETE FROM items")
+    assert not is_read_query("SELECT 1; DROP TABLE items")
+    assert not is_read_query("")
+
+
+def test_query_streams_ndjson(client):
+    """Test rows come back as NDJSON across several fetch chunks."""
+    submitted = query_history_writer.submitted
+    response = client.post(
+        "/api/v1/query",
+        json={
+            "sql": "SELECT id, name FROM items WHERE id > :min_id ORDER BY id",
+            "params": {"min_id": 5},
+            "fetch_size": 7,
+        },
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    assert response.headers["x-query-columns"] == "id,name"
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert len(rows) == 20
+    assert rows[0] == {"id": 6, "name": "item-6"}
+    assert rows[-1] == {"id": 25, "name": "item-25"}
+    # Recorded to query history once the stream finished
+    assert query_history_writer.submitted == submitted + 1
+
+
+def test_query_rejects_writes(client):
+    """Test a read-only key cannot run writes or stacked statements."""
+    response = client.post("/api/v1/query", json={"sql": "DELETE FROM items"})
+    assert response.status_code == 403
+    response = client.post("/api/v1/query", json={"sql": "SELECT 1; DELETE FROM items"})
+    assert response.status_code == 400
+
+
+def test_query_reports_sql_errors(client):
+    """Test SQL errors surface as 400 before streaming starts."""
+    response = client.post("/api/v1/query", json={"sql": "SELECT * FROM missing"})
+    assert response.status_code == 400
+    assert "missing" in response.json()["detail"]
+
+
+def test_query_failing_mid_stream_settles_the_request(
+    client, sqlite_engine, monkeypatch
+):
+    """Test a non-SQL error while streaming still frees the lease and ticket."""
+    router = DatabaseRouter(sqlite_engine)
+    app.dependency_overrides[get_db_router] = lambda: router
+    records = []
+
+    async def record(history):
+        records.append(history)
+        return True
+
+    def broken(columns, rows):
+        raise ValueError("cannot encode row")
+
+    monkeypatch.setattr(query_history_writer, "submit", record)
+    monkeypatch.setattr("services.query_executor.ndjson_rows", broken)
+    with pytest.raises(ValueError):
+        client.post("/api/v1/query", json={"sql": "SELECT * FROM items"})
+    assert router.primary.outstanding == 0
+    assert admission.active == 0
+    assert [r.status for r in records] == [QueryStatus.ERROR]
+    assert records[0].error_message == "cannot encode row"
+
+
+@pytest.mark.asyncio
+async def test_open_query_stream_rejects_writes(sqlite_engine):
+    """Test the service refuses writes without opening a connection."""
+    with pytest.raises(QueryError):
+        await open_query_stream(sqlite_engine, "UPDATE items SET name = 'x'")
+
+
+async def _stream_peak_memory(engine, rows: int) -> tuple[int, int]:
+    """Stream a generated result and return (rows seen, peak traced bytes)."""
+    stream = await open_query_stream(
+        engine, SERIES_SQL, {"rows": rows}, fetch_size=1000
+    )
+    seen = 0
+    tracemalloc.start()
+    try:
+        async for chunk in stream.iter_ndjson():
+            seen += chunk.count(b"\n")
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return seen, peak
+
+
+@pytest.mark.slow
+@pytest.mark.asyncio
+async def test_stream_memory_is_flat(sqlite_engine):
+    """Test peak memory does not grow with the size of the result set."""
+    small_rows, small_peak = await _stream_peak_memory(sqlite_engine, 20_000)
+    large_rows, large_peak = await _stream_peak_memory(sqlite_engine, 2_000_000)
+
+    assert small_rows == 20_000
+    assert large_rows == 2_000_000
+    # 100x the rows must not cost meaningfully more memory than one chunk
+    assert large_peak < small_peak * 2 + 1024 * 1024
+
+
+def test_execution_time_hint():
+    """Test the MySQL budget hint goes after a leading SELECT only."""
+    assert with_execution_time_hint("select a from t", 500) == (
+        "select /*+ MAX_EXECUTION_TIME(500) */ a from t"
+    )
+    assert with_execution_time_hint("  SELECT /*+ NO_ICP(t) */ a FROM t", 5) == (
+        "  SELECT /*+ MAX_EXECUTION_TIME(5) NO_ICP(t) */ a FROM t"
+    )
+    for sql in ("WITH c AS (SELECT 1) SELECT * FROM c", "(SELECT 1) UNION (SELECT 2)"):
+        assert with_execution_time_hint(sql, 5) == sql
+
+
+def test_execution_budget(monkeypatch):
+    """Test a request can lower, but not raise, its key's budget."""
+    monkeypatch.setattr(settings, "query_max_execution_ms", 30000)
+    key = ApiKey(key_id="k", key_hash="k", client_id="c")
+
+    assert execution_budget(QueryRequest(sql="SELECT 1"), key) == 30
+    assert execution_budget(QueryRequest(sql="SELECT 1", timeout_ms=500), key) == 0.5
+    key.max_execution_ms = 2000
+    assert execution_budget(QueryRequest(sql="SELECT 1", timeout_ms=5000), key) == 2
+    key.max_execution_ms = 0
+    assert execution_budget(QueryRequest(sql="SELECT 1"), key) is None
+    assert execution_budget(QueryRequest(sql="SELECT 1", timeout_ms=9), key) == 0.009
+
+
+@pytest_asyncio.fixture
+async def pooled_engine(sqlite_url):
+    """Engine whose pool holds a single connection, reused by every query."""
+    engine = create_async_engine(
+        sqlite_url, poolclass=AsyncAdaptedQueuePool, pool_size=1, max_overflow=0
+    )
+    async with engine.begin() as conn:
+        await conn.execute(text("CREATE TABLE log (n INTEGER)"))
+    yield engine
+    await engine.dispose()
+
+
+async def _pool_is_clean(engine) -> bool:
+    pool = engine.sync_engine.pool
+    if pool.checkedout():
+        return False
+    async with engine.connect() as conn:
+        return (await conn.execute(text("SELECT count(*) FROM log"))).scalar() == 0
+
+
+@pytest.mark.asyncio
+async def test_budget_cancels_read_on_the_server(pooled_engine):
+    """Test an over-budget read is interrupted and its connection reused."""
+    started = time.perf_counter()
+    with pytest.raises(QueryTimeoutError, match="100ms execution time budget"):
+        await open_query_stream(
+            pooled_engine, f"{ENDLESS_SQL} SELECT count(*) FROM seq", budget=0.1
+        )
+    assert time.perf_counter() - started < 5
+    assert await _pool_is_clean(pooled_engine)
+
+
+@pytest.mark.asyncio
+async def test_budget_covers_streaming(pooled_engine):
+    """Test the budget keeps running while rows stream, reported in-band."""
+    stream = await open_query_stream(
+        pooled_engine, f"{ENDLESS_SQL} SELECT n FROM seq", fetch_size=100, budget=0.2
+    )
+    chunks = [chunk async for chunk in stream.iter_ndjson()]
+
+    assert json.loads(chunks[-1]) == {
+        "error": "Query exceeded its 200ms execution time budget"
+    }
+    assert stream.row_count > 0 and not stream.completed
+    assert await _pool_is_clean(pooled_engine)
+
+
+@pytest.mark.asyncio
+async def test_abandoned_stream_is_cancelled_not_drained(pooled_engine):
+    """Test closing a half-read endless stream returns promptly."""
+    # The budget watch must not hold up the close until it runs out
+    stream = await open_query_stream(
+        pooled_engine, f"{ENDLESS_SQL} SELECT n FROM seq", fetch_size=100, budget=60
+    )
+    await anext(stream.chunks())
+    await asyncio.wait_for(stream.close(), 5)
+    assert await _pool_is_clean(pooled_engine)
+
+
+@pytest.mark.asyncio
+async def test_disconnect_cancels_and_rolls_back_write(pooled_engine):
+    """Test a client disconnect interrupts a write and rolls it back."""
+    gone = asyncio.Event()
+    asyncio.get_running_loop().call_later(0.1, gone.set)
+
+    with pytest.raises(QueryError, match="client disconnected"):
+        await execute_statement(
+            pooled_engine,
+            f"INSERT INTO log {ENDLESS_SQL} SELECT n FROM seq",
+            disconnected=gone.wait,
+        )
+    assert await _pool_is_clean(pooled_engine)
+
+
+@pytest.mark.asyncio
+async def test_admin_session_state_does_not_leak(pooled_engine):
+    """Test a USE/SET on the primary is not seen by the next request."""
+    # SQLite has no USE; a temp table is the same kind of per-session state
+    session_state = {
+        "USE shop": "CREATE TEMP TABLE current_db AS SELECT 'shop' AS name",
+        "SET @tenant = 1": "CREATE TEMP TABLE tenant AS SELECT 1 AS id",
+    }
+    event.listen(
+        pooled_engine.sync_engine,
+        "before_cursor_execute",
+        lambda conn, cursor, statement, params, *args: (
+            session_state.get(statement, statement),
+            params,
+        ),
+        retval=True,
+    )
+    app.dependency_overrides[get_db_router] = lambda: DatabaseRouter(pooled_engine)
+    app.dependency_overrides[get_api_key] = lambda: ApiKey(
+        key_id="a", key_hash="a", client_id="a", scopes='["read", "admin"]'
+    )
+    transport = httpx.ASGITransport(app=app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://t") as c:
+            for sql in session_state:
+                changed = await c.post("/api/v1/query", json={"sql": sql})
+                seen = await c.post(
+                    "/api/v1/query",
+                    json={
+                        "sql": "SELECT count(*) AS n FROM sqlite_temp_master",
+                        "cache": False,
+                    },
+                )
+                assert changed.status_code == 200
+                assert seen.text == '{"n":0}\n'
+    finally:
+        app.dependency_overrides.clear()
+
+
+def test_query_timeout_is_504(client):
+    """Test an over-budget request gets 504 and the error is recorded."""
+    response = client.post(
+        "/api/v1/query",
+        json={
+            "sql": f"{ENDLESS_SQL} SELECT count(*) FROM seq",
+            "timeout_ms": 100,
+        },
+    )
+    assert response.status_code == 504
+    assert "execution time budget" in response.json()["detail"]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,337 @@
+"""
+Tests for the latency sketch, query rollups and the analytics endpoint.
+"""
+import random
+import time
+from datetime import datetime, timedelta
+
+import pytest
+import pytest_asyncio
+from fastapi.testclient import TestClient
+from sqlalchemy import func, select
+from sqlalchemy.exc import OperationalError
+from sqlmodel import SQLModel
+
+from auth.dependencies import get_api_key
+from core.database import get_async_engine
+from main import app
+from models import QueryHistory, QueryRollup, QueryStatus
+from models.api_key import ApiKey
+from services.audit_logger import QueryHistoryWriter
+from services.query_rollups import QueryRollups, RollupGroup, RollupOrder
+from utils.sketch import LatencySketch
+
+START = datetime(2024, 5, 1, 12, 0, 0)
+
+
+def _row(
+    seconds: float,
+    execution_time: float,
+    client_id: str = "client",
+    fingerprint: str = "fp-a",
+    status: QueryStatus = QueryStatus.SUCCESS,
+) -> dict:
+    return {
+        "client_id": client_id,
+        "query": "SELECT 1",
+        "fingerprint": fingerprint,
+        "execution_time": execution_time,
+        "row_count": 1,
+        "status": status,
+        "executed_at": START + timedelta(seconds=seconds),
+    }
+
+
+@pytest_asyncio.fixture
+async def rollup_engine(sqlite_engine):
+    import models  # noqa: F401  (registers the tables)
+
+    async with sqlite_engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+    return sqlite_engine
+
+
+def test_sketch_quantiles_within_relative_accuracy():
+    """Test percentiles land within the configured relative error."""
+    rng = random.Random(7)
+    values = sorted(rng.lognormvariate(-4, 1.5) for _ in range(20000))
+    sketch = LatencySketch(0.01)
+    sketch.update(values)
+
+    assert sketch.count == len(values)
+    for q in (0.5, 0.9, 0.95, 0.99):
+        exact = values[int(q * (len(values) - 1))]
+        assert sketch.quantile(q) == pytest.approx(exact, rel=0.0201)
+    assert LatencySketch().quantile(0.5) is None
+
+
+def test_sketch_merge_and_round_trip():
+    """Test merged sketches equal one sketch of all values, after serializing."""
+    left, right, both = LatencySketch(), LatencySketch(), LatencySketch()
+    for i in range(1, 1001):
+        (left if i % 2 else right).add(i / 1000)
+        both.add(i / 1000)
+    left.add(0.0)
+    both.add(0.0)
+
+    merged = LatencySketch.from_bytes(left.to_bytes())
+    merged.merge(LatencySketch.from_bytes(right.to_bytes()))
+    assert merged.count == both.count == 1001
+    assert merged.bins == both.bins
+    assert merged.quantile(0.0) == 0.0
+    assert merged.quantile(0.99) == both.quantile(0.99)
+    with pytest.raises(ValueError):
+        merged.merge(LatencySketch(0.05))
+
+
+def test_bucket_start():
+    """Test timestamps are floored to the bucket width."""
+    rollups = QueryRollups(bucket_seconds=300)
+    assert rollups.bucket_start(datetime(2024, 5, 1, 12, 7, 59)) == datetime(
+        2024, 5, 1, 12, 5
+    )
+    assert rollups.bucket_start(START) == START
+
+
+@pytest.mark.asyncio
+async def test_apply_inserts_then_merges(rollup_engine):
+    """Test a second batch updates the rows the first batch inserted."""
+    rollups = QueryRollups(bucket_seconds=300)
+    async with rollup_engine.begin() as conn:
+        await rollups.apply(
+            conn,
+            [
+                _row(0, 0.010),
+                _row(10, 0.020),
+                _row(20, 0.5, fingerprint="fp-b", status=QueryStatus.ERROR),
+                _row(400, 0.030),
+            ],
+        )
+    async with rollup_engine.begin() as conn:
+        await rollups.apply(conn, [_row(30, 0.040), _row(40, None, client_id="")])
+
+    async with rollup_engine.connect() as conn:
+        rows = (
+            await conn.execute(
+                select(QueryRollup.__table__).order_by(
+                    "bucket_start", "dimension", "key"
+                )
+            )
+        ).all()
+    assert [(r.dimension, r.key, r.count) for r in rows] == [
+        ("client", "", 1),
+        ("client", "client", 4),
+        ("fingerprint", "fp-a", 4),
+        ("fingerprint", "fp-b", 1),
+        ("client", "client", 1),
+        ("fingerprint", "fp-a", 1),
+    ]
+    merged = rows[2]
+    assert merged.total_time == pytest.approx(0.070)
+    assert merged.max_time == pytest.approx(0.040)
+    assert LatencySketch.from_bytes(merged.sketch).count == 3
+    assert rows[1].error_count == rows[3].error_count == 1
+
+
+@pytest.mark.asyncio
+async def test_report_groups_and_orders(rollup_engine):
+    """Test reports merge buckets per group and order by the chosen metric."""
+    rollups = QueryRollups(bucket_seconds=300)
+    rows = [_row(i * 30, 0.001 * (i + 1), client_id=f"c{i % 2}") for i in range(20)]
+    rows += [_row(i * 30, 1.0, fingerprint="slow") for i in range(3)]
+    async with rollup_engine.begin() as conn:
+        await rollups.apply(conn, rows)
+
+    until = START + timedelta(hours=1)
+    async with rollup_engine.connect() as conn:
+        by_fingerprint = await rollups.report(conn, START, until)
+        by_client = await rollups.report(
+            conn, START, until, RollupGroup.CLIENT, RollupOrder.COUNT
+        )
+        by_bucket = await rollups.report(conn, START, until, RollupGroup.BUCKET)
+        one_fingerprint = await rollups.report(
+            conn, START, until, RollupGroup.BUCKET, fingerprint="slow"
+        )
+        empty = await rollups.report(conn, until, until + timedelta(hours=1))
+        with pytest.raises(ValueError):
+            await rollups.report(conn, START, until, client_id="c0")
+
+    assert [g["key"] for g in by_fingerprint] == ["slow", "fp-a"]
+    assert by_fingerprint[0]["p95"] == pytest.approx(1.0, rel=0.011)
+    assert by_fingerprint[1]["count"] == 20
+    assert by_fingerprint[1]["max_time"] == pytest.approx(0.020)
+    assert [(g["key"], g["count"]) for g in by_client] == [
+        ("c0", 10),
+        ("c1", 10),
+        ("client", 3),
+    ]
+    assert [(g["key"], g["count"]) for g in by_bucket] == [
+        ("2024-05-01T12:00:00", 13),
+        ("2024-05-01T12:05:00", 10),
+    ]
+    assert [g["count"] for g in one_fingerprint] == [3]
+    assert empty == []
+
+
+@pytest.mark.asyncio
+async def test_writer_updates_rollups(rollup_engine):
+    """Test the history writer folds each batch into the rollups."""
+    from models import QueryHistoryCreate
+
+    writer = QueryHistoryWriter(
+        lambda: rollup_engine, batch_size=4, rollups=QueryRollups()
+    )
+    for i in range(10):
+        await writer.submit(
+            QueryHistoryCreate(
+                client_id="client",
+                query=f"SELECT {i}",
+                fingerprint="fp",
+                execution_time=0.01,
+                status=QueryStatus.ERROR if i < 2 else "success",
+            )
+        )
+    await writer.stop()
+
+    assert writer.flushed == 10
+    async with rollup_engine.connect() as conn:
+        totals = (
+            await conn.execute(
+                select(
+                    QueryRollup.dimension,
+                    func.sum(QueryRollup.count),
+                    func.sum(QueryRollup.error_count),
+                )
+                .group_by(QueryRollup.dimension)
+                .order_by(QueryRollup.dimension)
+            )
+        ).all()
+    assert [tuple(row) for row in totals] == [("client", 10, 2), ("fingerprint", 10, 2)]
+
+
+class FlakyRollups(QueryRollups):
+    """Rollups whose first ``failures`` applies lose a race for a row."""
+
+    def __init__(self, failures: int):
+        super().__init__()
+        self.failures = failures
+
+    async def apply(self, conn, rows):
+        if self.failures:
+            self.failures -= 1
+            raise OperationalError("apply", {}, Exception("Deadlock found"))
+        await super().apply(conn, rows)
+
+
+async def _write_one(rollup_engine, rollups) -> QueryHistoryWriter:
+    from models import QueryHistoryCreate
+
+    writer = QueryHistoryWriter(lambda: rollup_engine, rollups=rollups)
+    writer.rollup_backoff = 0.001
+    await writer.submit(QueryHistoryCreate(client_id="client", query="SELECT 1"))
+    await writer.stop()
+    return writer
+
+
+@pytest.mark.asyncio
+async def test_rollup_failures_are_retried_and_never_lose_history(rollup_engine):
+    """Test rollups retry with backoff apart from the committed history."""
+    retried = await _write_one(rollup_engine, FlakyRollups(failures=2))
+    failed = await _write_one(rollup_engine, FlakyRollups(failures=3))
+
+    assert (retried.flushed, retried.rollup_failed) == (1, 0)
+    assert (failed.flushed, failed.failed, failed.rollup_failed) == (1, 0, 1)
+    async with rollup_engine.connect() as conn:
+        history = await conn.scalar(select(func.count()).select_from(QueryHistory))
+        rolled_up = await conn.scalar(
+            select(func.sum(QueryRollup.count)).where(QueryRollup.dimension == "client")
+        )
+    assert (history, rolled_up) == (2, 1)
+
+
+def test_analytics_endpoint(rollup_engine):
+    """Test the endpoint reports rollups and validates the time range."""
+    import asyncio
+
+    from services.query_rollups import query_rollups
+
+    now = datetime.utcnow()
+
+    async def seed():
+        async with rollup_engine.begin() as conn:
+            await query_rollups.apply(
+                conn,
+                [
+                    {**_row(0, 0.25), "executed_at": now - timedelta(minutes=5)},
+                ],
+            )
+
+    asyncio.run(seed())
+    app.dependency_overrides[get_async_engine] = lambda: rollup_engine
+    app.dependency_overrides[get_api_key] = lambda: ApiKey(
+        key_id="test", key_hash="test", client_id="test", scopes='["admin"]'
+    )
+    try:
+        client = TestClient(app)
+        response = client.get("/api/v1/analytics/queries?group_by=client")
+        assert response.status_code == 200
+        body = response.json()
+        assert body["group_by"] == "client"
+        assert body["groups"][0]["key"] == "client"
+        assert body["groups"][0]["p50"] == pytest.approx(0.25, rel=0.011)
+
+        response = client.get(
+            "/api/v1/analytics/queries",
+            params={"since": "2024-05-02T00:00:00Z", "until": "2024-05-01T00:00:00Z"},
+        )
+        assert response.status_code == 400
+
+        response = client.get(
+            "/api/v1/analytics/queries", params={"client_id": "client"}
+        )
+        assert response.status_code == 400
+    finally:
+        app.dependency_overrides.clear()
+
+
+@pytest.mark.slow
+@pytest.mark.asyncio
+async def test_report_time_independent_of_history_size(rollup_engine):
+    """Benchmark: a day's report reads rollups, not the 200k history rows."""
+    rollups = QueryRollups(bucket_seconds=300)
+    rng = random.Random(3)
+    # History arrives in time order, so each batch touches one or two buckets
+    for batch in range(400):
+        rows = [
+            _row(
+                batch * 216 + i * 0.432,
+                rng.lognormvariate(-4, 1),
+                client_id=f"client-{rng.randrange(20)}",
+                fingerprint=f"fp-{rng.randrange(50)}",
+            )
+            for i in range(500)
+        ]
+        async with rollup_engine.begin() as conn:
+            await rollups.apply(conn, rows)
+
+    async with rollup_engine.connect() as conn:
+        stored = await conn.scalar(select(func.count()).select_from(QueryRollup))
+        started = time.perf_counter()
+        groups = await rollups.report(
+            conn, START, START + timedelta(days=1), RollupGroup.CLIENT
+        )
+        day = time.perf_counter() - started
+        started = time.perf_counter()
+        await rollups.report(conn, START, START + timedelta(hours=1))
+        hour = time.perf_counter() - started
+    print(
+        f"\n200000 records -> {stored} rollup rows; reports: day by client "
+        f"{day * 1000:.1f}ms, hour by fingerprint {hour * 1000:.1f}ms"
+    )
+    assert stored <= 289 * 70
+    assert sum(g["count"] for g in groups) == 200000
+    assert len(groups) == 20
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
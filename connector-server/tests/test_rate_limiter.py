@@ -0,0 +1,138 @@
+"""
+Tests for the Redis GCRA rate limiter and its local fallback.
+"""
+import time
+
+import pytest
+from fakeredis import FakeAsyncRedis, FakeServer
+from fastapi.testclient import TestClient
+from redis.asyncio import Redis
+
+from auth.dependencies import get_api_key, get_rate_limiter
+from main import app
+from models.api_key import ApiKey
+from utils.rate_limiter import RateLimiter, TokenBucket
+
+
+def _unreachable_redis() -> Redis:
+    return Redis(host="127.0.0.1", port=1, socket_connect_timeout=0.1)
+
+
+@pytest.mark.asyncio
+async def test_gcra_allows_limit_then_rejects():
+    """Test a burst of exactly ``limit`` requests then a rejection."""
+    redis = FakeAsyncRedis()
+    limiter = RateLimiter(lambda: redis)
+
+    results = [await limiter.hit("abc", 3, 60) for _ in range(4)]
+
+    assert [r.allowed for r in results] == [True, True, True, False]
+    assert [r.remaining for r in results] == [2, 1, 0, 0]
+    assert 19 < results[-1].retry_after <= 20
+    assert results[-1].headers()["Retry-After"] == "20"
+    # Keys are independent
+    assert (await limiter.hit("other", 3, 60)).allowed
+
+
+@pytest.mark.asyncio
+async def test_script_runs_on_the_current_client():
+    """Test a replaced Redis client is used, not the one first registered with."""
+    clients = [FakeAsyncRedis(server=FakeServer())]
+    limiter = RateLimiter(lambda: clients[-1])
+    assert [(await limiter.hit("abc", 1, 60)).allowed for _ in range(2)] == [
+        True,
+        False,
+    ]
+
+    await clients[0].aclose()
+    clients.append(FakeAsyncRedis(server=FakeServer()))
+    assert (await limiter.hit("abc", 1, 60)).allowed
+    assert await clients[1].exists("ratelimit:abc")
+    assert limiter._redis_retry_at == 0.0
+
+
+@pytest.mark.asyncio
+async def test_falls_back_to_local_bucket_when_redis_is_down():
+    """Test requests are still limited per process without Redis."""
+    limiter = RateLimiter(_unreachable_redis, redis_retry_seconds=60)
+
+    results = [await limiter.hit("abc", 2, 60) for _ in range(3)]
+
+    assert [r.allowed for r in results] == [True, True, False]
+    assert limiter._redis_retry_at > time.monotonic()
+
+
+def test_token_bucket_refills():
+    """Test the local bucket refills at limit/window tokens per second."""
+    bucket = TokenBucket(limit=2, window_seconds=1)
+    assert bucket.hit().allowed and bucket.hit().allowed
+    assert not bucket.hit().allowed
+    bucket.updated -= 0.5
+    assert bucket.hit().allowed
+
+
+def test_rate_limit_check_sets_headers(sqlite_engine):
+    """Test the dependency enforces ApiKey.rate_limit and sets headers."""
+    from core.database import get_db_router
+    from core.routing import DatabaseRouter
+
+    redis = FakeAsyncRedis()
+    limiter = RateLimiter(lambda: redis)
+    app.dependency_overrides[get_db_router] = lambda: DatabaseRouter(sqlite_engine)
+    app.dependency_overrides[get_rate_limiter] = lambda: limiter
+    app.dependency_overrides[get_api_key] = lambda: ApiKey(
+        key_id="limited",
+        key_hash="x",
+        client_id="test",
+        scopes='["read"]',
+        rate_limit=2,
+    )
+    try:
+        # One portal (event loop) for all requests; the fake Redis binds to it
+        with TestClient(app) as client:
+            responses = [
+                client.post("/api/v1/query", json={"sql": "SELECT 1 AS one"})
+                for _ in range(3)
+            ]
+    finally:
+        app.dependency_overrides.clear()
+
+    assert [r.status_code for r in responses] == [200, 200, 429]
+    assert responses[0].headers["x-ratelimit-limit"] == "2"
+    assert responses[0].headers["x-ratelimit-remaining"] == "1"
+    assert responses[2].headers["x-ratelimit-remaining"] == "0"
+    assert "retry-after" in responses[2].headers
+
+
+@pytest.mark.slow
+@pytest.mark.asyncio
+async def test_limiter_overhead_benchmark():
+    """Microbenchmark the per-request cost of the limiter.
+
+    fakeredis runs the Lua script in-process, so this measures client and
+    script overhead only; add one network RTT for a real Redis.
+    """
+    iterations = 5000
+    # One shared client, as get_redis() hands out
+    redis = FakeAsyncRedis()
+    redis_limiter = RateLimiter(lambda: redis)
+    local_limiter = RateLimiter(_unreachable_redis, redis_retry_seconds=3600)
+    await local_limiter.hit("warmup", 10, 60)
+
+    timings = {}
+    for name, limiter in (("redis", redis_limiter), ("local", local_limiter)):
+        start = time.perf_counter()
+        for i in range(iterations):
+            await limiter.hit(f"key-{i % 100}", 1_000_000, 60)
+        timings[name] = (time.perf_counter() - start) / iterations * 1e6
+
+    print(
+        f"\nrate limiter overhead: redis(lua)={timings['redis']:.1f}us "
+        f"local={timings['local']:.1f}us per request"
+    )
+    assert timings["local"] < 50
+    assert timings["redis"] < 2000
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,116 @@
+"""
+Tests for the Redis query result cache.
+"""
+import sqlite3
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+from fakeredis import FakeAsyncRedis
+from fastapi.testclient import TestClient
+from redis.asyncio import Redis
+
+from auth.dependencies import get_api_key
+from core.database import get_db_router
+from core.routing import DatabaseRouter
+from main import app
+from models.api_key import ApiKey
+from services.result_cache import QueryResultCache, query_result_cache
+
+
+@pytest.mark.asyncio
+async def test_hit_after_store_and_table_invalidation():
+    """Test a stored result is served until one of its tables is written."""
+    redis = FakeAsyncRedis()
+    cache = QueryResultCache(lambda: redis)
+    sql = "SELECT id, at, price FROM orders JOIN items ON items.id = orders.id"
+
+    lookup = await cache.get(sql, {"a": 1})
+    assert not lookup.hit
+    await cache.set(
+        lookup,
+        ["id", "at", "price"],
+        [(1, datetime(2024, 1, 2, 3, 4), Decimal("9.99"))],
+    )
+
+    hit = await cache.get(sql.replace(" ", "\n  ") + " -- again;", {"a": 1})
+    assert hit.hit
+    assert hit.rows == [[1, "2024-01-02T03:04:00", "9.99"]]
+    assert not (await cache.get(sql, {"a": 2})).hit
+
+    await cache.invalidate_tables(["items"])
+    assert not (await cache.get(sql, {"a": 1})).hit
+    stats = await cache.stats()
+    assert (stats["hits"], stats["misses"], stats["stale"]) == (1, 3, 1)
+
+
+@pytest.mark.asyncio
+async def test_qualified_and_unqualified_names_share_a_version():
+    """Test writes via either table spelling invalidate reads via the other."""
+    redis = FakeAsyncRedis()
+    cache = QueryResultCache(lambda: redis, default_schema="Shop")
+    cases = [
+        ("SELECT * FROM items", ["shop.items"]),
+        ("SELECT * FROM `shop`.`items`", ["items"]),
+        ("SELECT * FROM shop.items", ["`Shop`.`Items`"]),
+    ]
+    for sql, written in cases:
+        lookup = await cache.get(sql)
+        assert lookup.tables == ["shop.items"]
+        await cache.set(lookup, ["id"], [(1,)])
+        assert (await cache.get(sql)).hit
+        await cache.invalidate_tables(written)
+        assert not (await cache.get(sql)).hit
+
+    other = await cache.get("SELECT * FROM archive.items")
+    assert other.tables == ["archive.items"]
+
+
+@pytest.mark.asyncio
+async def test_large_results_and_outages_are_skipped():
+    """Test oversized results are not stored and Redis errors bypass the cache."""
+    cache = QueryResultCache(FakeAsyncRedis, max_rows=2)
+    lookup = await cache.get("SELECT * FROM t")
+    assert not await cache.set(lookup, ["a"], [(1,), (2,), (3,)])
+    assert cache.skipped == 1
+
+    down = QueryResultCache(
+        lambda: Redis(host="127.0.0.1", port=1, socket_connect_timeout=0.1)
+    )
+    assert await down.get("SELECT * FROM t") is None
+    assert down.errors == 1
+
+
+def test_query_endpoint_uses_cache(sqlite_engine, sqlite_url, monkeypatch):
+    """Test a repeated query is answered from the cache with identical rows."""
+    db = sqlite3.connect(sqlite_url.split(":///", 1)[1])
+    db.execute("CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT)")
+    db.executemany("INSERT INTO items VALUES (?, ?)", [(1, "a"), (2, "b")])
+    db.commit()
+    db.close()
+
+    redis = FakeAsyncRedis()
+    monkeypatch.setattr(query_result_cache, "_redis_factory", lambda: redis)
+    # Earlier tests without Redis may have left the cache backing off
+    monkeypatch.setattr(query_result_cache, "_retry_at", 0.0)
+    app.dependency_overrides[get_db_router] = lambda: DatabaseRouter(sqlite_engine)
+    app.dependency_overrides[get_api_key] = lambda: ApiKey(
+        key_id="cache", key_hash="x", client_id="test", scopes='["read"]'
+    )
+    body = {"sql": "SELECT id, name FROM items ORDER BY id"}
+    try:
+        with TestClient(app) as client:
+            first = client.post("/api/v1/query", json=body)
+            second = client.post("/api/v1/query", json=body)
+            bypass = client.post("/api/v1/query", json={**body, "cache": False})
+    finally:
+        app.dependency_overrides.clear()
+
+    assert first.headers["x-cache"] == "MISS"
+    assert second.headers["x-cache"] == "HIT"
+    assert bypass.headers["x-cache"] == "BYPASS"
+    assert first.text == second.text == bypass.text
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,195 @@
+"""
+Tests for read/write routing over SQLite primary and replica stand-ins.
+"""
+import asyncio
+import sqlite3
+
+import httpx
+import pytest
+from fakeredis import FakeAsyncRedis
+from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+
+from auth.dependencies import get_api_key
+from core.database import get_db_router
+from core.routing import DatabaseRouter
+from main import app
+from models.api_key import ApiKey
+from services.audit_logger import query_history_writer
+from services.result_cache import query_result_cache
+from services.sql_analyzer import StatementType
+
+READ, WRITE = StatementType.READ, StatementType.WRITE
+
+
+@pytest.fixture
+def databases(tmp_path):
+    """Primary and two replica engines whose ``items`` rows name the server."""
+    engines = {}
+    for name in ("primary", "replica0", "replica1"):
+        path = tmp_path / f"{name}.db"
+        db = sqlite3.connect(path)
+        db.execute("CREATE TABLE items (id INTEGER PRIMARY KEY, source TEXT)")
+        db.execute("INSERT INTO items (id, source) VALUES (1, ?)", (name,))
+        db.commit()
+        db.close()
+        engines[name] = create_async_engine(
+            f"sqlite+aiosqlite:///{path}", poolclass=NullPool
+        )
+    yield engines, tmp_path
+    for engine in engines.values():
+        engine.sync_engine.dispose()
+
+
+def _router(engines, lags, max_lag=5.0):
+    """Router whose replica lag comes from the ``lags`` dict, keyed by engine."""
+
+    async def probe(engine):
+        lag = lags[engine]
+        if isinstance(lag, Exception):
+            raise lag
+        return lag
+
+    return DatabaseRouter(
+        engines["primary"],
+        [engines["replica0"], engines["replica1"]],
+        max_lag=max_lag,
+        lag_probe=probe,
+    )
+
+
+@pytest.mark.asyncio
+async def test_reads_go_to_least_loaded_replica(databases):
+    """Test writes stay on the primary and reads balance over replicas."""
+    engines, _ = databases
+    router = _router(engines, {engines["replica0"]: 0.0, engines["replica1"]: 1.0})
+    assert router.acquire(READ).target == "primary"  # lag not checked yet
+    await router.check_lag()
+
+    assert router.acquire(WRITE).target == "primary"
+    held = [router.acquire(READ) for _ in range(4)]
+    assert sorted(lease.target for lease in held) == ["replica0"] * 2 + ["replica1"] * 2
+
+    for lease in held:
+        if lease.target == "replica0":
+            lease.release()
+            lease.release()  # idempotent
+    assert [router.acquire(READ).target for _ in range(2)] == ["replica0"] * 2
+
+
+@pytest.mark.asyncio
+async def test_lagging_and_failed_replicas_are_skipped(databases):
+    """Test lag beyond the threshold or a failed probe falls back."""
+    engines, _ = databases
+    lags = {engines["replica0"]: 30.0, engines["replica1"]: 0.5}
+    router = _router(engines, lags, max_lag=5.0)
+    await router.check_lag()
+    assert {router.acquire(READ).target for _ in range(4)} == {"replica1"}
+
+    lags[engines["replica1"]] = ConnectionError("gone")
+    await router.check_lag()
+    assert router.acquire(READ).target == "primary"
+    stats = {s["name"]: s for s in router.stats()}
+    assert stats["replica1"]["error"] == "gone"
+    assert not stats["replica0"]["eligible"]
+
+    lags[engines["replica0"]] = 1.0
+    await router.check_lag()
+    assert router.acquire(READ).target == "replica0"
+
+
+@pytest.mark.asyncio
+async def test_slow_probe_times_out(databases):
+    """Test a hung replica is marked unavailable instead of blocking checks."""
+    engines, _ = databases
+
+    async def probe(engine):
+        await asyncio.sleep(10)
+
+    router = DatabaseRouter(engines["primary"], [engines["replica0"]], lag_probe=probe)
+    await router.check_lag(timeout=0.05)
+    assert router.replicas[0].error == "TimeoutError"
+
+
+def test_query_endpoint_routes_by_statement(databases, monkeypatch):
+    """Test the endpoint reads from a replica and writes to the primary."""
+    engines, tmp_path = databases
+    router = _router(engines, {engines["replica0"]: 0.0, engines["replica1"]: 0.0})
+    asyncio.run(router.check_lag())
+
+    async def submit(record):
+        return True
+
+    monkeypatch.setattr(query_history_writer, "submit", submit)
+    app.dependency_overrides[get_db_router] = lambda: router
+    app.dependency_overrides[get_api_key] = lambda: ApiKey(
+        key_id="rw", key_hash="rw", client_id="rw", scopes='["read", "write"]'
+    )
+    try:
+        client = TestClient(app)
+        reads = [
+            client.post(
+                "/api/v1/query",
+                json={
+                    "sql": "SELECT source FROM items",
+                    "cache": False,
+                },
+            ).json()["source"]
+            for _ in range(4)
+        ]
+        write = client.post(
+            "/api/v1/query",
+            json={
+                "sql": "INSERT INTO items (id, source) VALUES (2, 'api')",
+            },
+        )
+    finally:
+        app.dependency_overrides.clear()
+
+    assert set(reads) == {"replica0", "replica1"}
+    assert write.json() == {"rows_affected": 1}
+    primary = sqlite3.connect(tmp_path / "primary.db")
+    assert primary.execute("SELECT COUNT(*) FROM items").fetchone() == (2,)
+    primary.close()
+    assert all(s["outstanding"] == 0 for s in router.stats())
+
+
+@pytest.mark.asyncio
+async def test_reads_from_replicas_are_not_cached(databases, monkeypatch):
+    """Test only reads served by the primary are stored in the cache."""
+    engines, _ = databases
+
+    async def submit(record):
+        return True
+
+    monkeypatch.setattr(query_history_writer, "submit", submit)
+    redis = FakeAsyncRedis()
+    monkeypatch.setattr(query_result_cache, "_redis_factory", lambda: redis)
+    monkeypatch.setattr(query_result_cache, "_retry_at", 0.0)
+    app.dependency_overrides[get_api_key] = lambda: ApiKey(
+        key_id="r", key_hash="r", client_id="r", scopes='["read"]'
+    )
+    body = {"sql": "SELECT source FROM items"}
+    cache_headers = []
+    transport = httpx.ASGITransport(app=app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://t") as c:
+            # In sync replicas serve the reads, too far behind ones do not
+            for lag in (0.0, 10.0):
+                router = _router(
+                    engines, {engines["replica0"]: lag, engines["replica1"]: lag}
+                )
+                await router.check_lag()
+                app.dependency_overrides[get_db_router] = lambda: router
+                for _ in range(2):
+                    response = await c.post("/api/v1/query", json=body)
+                    cache_headers.append(response.headers["x-cache"])
+    finally:
+        app.dependency_overrides.clear()
+
+    assert cache_headers == ["BYPASS", "BYPASS", "MISS", "HIT"]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,171 @@
+"""
+Tests for per-request phase timings and the Server-Timing header.
+"""
+import json
+import logging
+import sqlite3
+import time
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from auth.dependencies import get_api_key
+from core.database import get_db_router
+from core.routing import DatabaseRouter
+from core.timing import (
+    TimedAsyncQueuePool,
+    end_request,
+    start_request,
+    time_statements,
+    timed,
+)
+from main import app
+from middleware.server_timing import ServerTimingMiddleware
+from models.api_key import ApiKey
+from services.audit_logger import query_history_writer
+
+
+def _phases(header: str) -> dict:
+    return {
+        name: float(dur.split("=")[1])
+        for name, dur in (metric.split(";") for metric in header.split(", "))
+    }
+
+
+def _timing_app(sample_rate: float) -> FastAPI:
+    timing_app = FastAPI()
+    timing_app.add_middleware(ServerTimingMiddleware, sample_rate=sample_rate)
+
+    @timing_app.get("/work")
+    async def work():
+        with timed("auth"):
+            time.sleep(0.005)
+        return {}
+
+    @timing_app.get("/ping")
+    async def ping():
+        return {}
+
+    return timing_app
+
+
+def test_header_reports_phases():
+    """Test sampled requests report each phase and the app total."""
+    response = TestClient(_timing_app(1.0)).get("/work")
+    phases = _phases(response.headers["Server-Timing"])
+    assert list(phases) == ["auth", "app"]
+    assert 5 <= phases["auth"] <= phases["app"]
+
+
+def test_unsampled_requests_are_untouched():
+    """Test a zero sample rate adds no header and records nothing."""
+    response = TestClient(_timing_app(0.0)).get("/work")
+    assert "Server-Timing" not in response.headers
+
+
+def test_query_timings_reach_header_and_log(tmp_path, monkeypatch, caplog):
+    """Test pool, SQL, fetch and serialization timings for a streamed query."""
+    path = tmp_path / "timing.db"
+    db = sqlite3.connect(path)
+    db.execute("CREATE TABLE items (id INTEGER PRIMARY KEY)")
+    db.executemany("INSERT INTO items (id) VALUES (?)", [(i,) for i in range(100)])
+    db.commit()
+    db.close()
+    engine = create_async_engine(
+        f"sqlite+aiosqlite:///{path}", poolclass=TimedAsyncQueuePool
+    )
+    time_statements(engine)
+
+    async def submit(record):
+        return True
+
+    async def api_key():
+        with timed("auth"):
+            return ApiKey(key_id="r", key_hash="r", client_id="r", scopes='["read"]')
+
+    monkeypatch.setattr(query_history_writer, "submit", submit)
+    app.dependency_overrides[get_db_router] = lambda: DatabaseRouter(engine)
+    app.dependency_overrides[get_api_key] = api_key
+    middleware = next(m for m in app.user_middleware if m.cls is ServerTimingMiddleware)
+    monkeypatch.setitem(middleware.options, "log", True)
+    app.middleware_stack = None
+    try:
+        with TestClient(app) as client:
+            with caplog.at_level(logging.INFO, logger="connector.timing"):
+                response = client.post(
+                    "/api/v1/query",
+                    json={
+                        "sql": "SELECT id FROM items",
+                        "fetch_size": 10,
+                        "cache": False,
+                    },
+                )
+            # aiosqlite connections belong to the client's loop; close them there
+            client.portal.call(engine.dispose)
+    finally:
+        app.dependency_overrides.clear()
+        app.middleware_stack = None
+
+    assert len(response.text.splitlines()) == 100
+    assert set(_phases(response.headers["Server-Timing"])) == {
+        "auth",
+        "pool",
+        "sql",
+        "app",
+    }
+    logged = json.loads(
+        next(r for r in caplog.records if r.name == "connector.timing").getMessage()
+    )
+    assert logged["path"] == "/api/v1/query"
+    assert logged["status"] == 200
+    assert logged["phases"]["fetch"]["count"] == 11
+    assert logged["phases"]["serialize"]["count"] == 10
+
+
+@pytest.mark.slow
+@pytest.mark.asyncio
+async def test_timing_overhead_benchmark():
+    """Benchmark the cost of timing hooks and of a sampled request."""
+    loops = 100_000
+    start = time.perf_counter()
+    for _ in range(loops):
+        with timed("sql"):
+            pass
+    unsampled = (time.perf_counter() - start) / loops * 1e6
+
+    token = start_request()
+    start = time.perf_counter()
+    for _ in range(loops):
+        with timed("sql"):
+            pass
+    sampled = (time.perf_counter() - start) / loops * 1e6
+    end_request(token)
+
+    async def per_request(sample_rate: float) -> float:
+        # httpx types ASGI apps more narrowly than Starlette declares them
+        transport = httpx.ASGITransport(
+            app=_timing_app(sample_rate)  # type: ignore[arg-type]
+        )
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://test"
+        ) as client:
+            await client.get("/ping")
+            start = time.perf_counter()
+            for _ in range(2000):
+                await client.get("/ping")
+            return (time.perf_counter() - start) / 2000 * 1e6
+
+    off, on = await per_request(0.0), await per_request(1.0)
+    print(
+        f"\ntimed(): unsampled={unsampled:.2f}us sampled={sampled:.2f}us; "
+        f"request: off={off:.0f}us on={on:.0f}us"
+    )
+    assert unsampled < 5 and sampled < 10
+    assert on - off < 200
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,210 @@
+"""
+Tests for SQL analysis and per-scope statement rules.
+"""
+import sqlite3
+import time
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from auth.dependencies import check_statement_scope, get_api_key
+from core.database import get_db_router
+from core.routing import DatabaseRouter
+from main import app
+from models.api_key import ApiKey
+from services.audit_logger import query_history_writer
+from services.sql_analyzer import StatementType, analyze_sql
+
+
+@pytest.mark.parametrize(
+    "sql, expected",
+    [
+        ("SELECT * FROM items", StatementType.READ),
+        ("with t as (select 1) select * from t", StatementType.READ),
+        ("EXPLAIN SELECT 1", StatementType.READ),
+        ("SELECT 'DROP TABLE x; --' AS s", StatementType.READ),
+        ("SELECT * FROM items FOR UPDATE", StatementType.WRITE),
+        ("INSERT INTO items VALUES (1, 'a')", StatementType.WRITE),
+        ("update items set name = 'x'", StatementType.WRITE),
+        ("DROP TABLE items", StatementType.DDL),
+        ("TRUNCATE items", StatementType.DDL),
+        ("DROP TABLE temp", StatementType.DDL),
+        ("CREATE TEMPORARY TABLE t (id INT)", StatementType.ADMIN),
+        ("create temp table t as select 1", StatementType.ADMIN),
+        ("DROP TEMPORARY TABLE IF EXISTS t", StatementType.ADMIN),
+        ("SELECT * INTO OUTFILE '/tmp/x' FROM items", StatementType.ADMIN),
+        ("GRANT ALL ON *.* TO 'x'", StatementType.ADMIN),
+        ("SELECT @n := count(*) FROM items", StatementType.ADMIN),
+        ("EXPLAIN ANALYZE SELECT * FROM items", StatementType.READ),
+        ("EXPLAIN ANALYZE DELETE FROM items", StatementType.WRITE),
+        ("explain analyze update items set name = 'x'", StatementType.WRITE),
+        ("EXPLAIN FORMAT=TREE DELETE FROM items", StatementType.WRITE),
+        ("DESCRIBE items", StatementType.READ),
+        ("SELECT 1; DROP TABLE items", StatementType.MULTI),
+        ("FROB items", StatementType.UNKNOWN),
+    ],
+)
+def test_classification(sql, expected):
+    """Test statements are classified from tokens, not raw text."""
+    assert analyze_sql(sql).statement_type == expected
+
+
+def test_unsafe_input_is_rejected():
+    """Test input that could hide code has no allowed scope."""
+    for sql in ("SELECT 'open", "/*!50000 DROP TABLE items */ SELECT 1", " ; "):
+        analysis = analyze_sql(sql)
+        assert analysis.error
+        assert analysis.required_scope is None
+
+
+def test_named_locks_are_rejected():
+    """Test GET_LOCK and friends are refused even inside a read."""
+    for sql in ("SELECT GET_LOCK('job', 10)", "do release_lock('job')"):
+        analysis = analyze_sql(sql)
+        assert "named locks" in analysis.error
+        assert analysis.required_scope is None
+    assert analyze_sql("SELECT IS_FREE_LOCK('job')").required_scope == "read"
+
+
+def test_fingerprint_ignores_literals_and_formatting():
+    """Test queries differing only in values share a fingerprint."""
+    first = analyze_sql("SELECT * FROM t WHERE id IN (1, 2, 3) AND name = 'a'")
+    second = analyze_sql("select *\n from t  -- note\n where id in (7) and name='b';")
+    assert first.fingerprint == second.fingerprint
+    assert first.template == "select * from t where id in (?+) and name = ?"
+    assert first.normalized != second.normalized
+
+    rows = analyze_sql("INSERT INTO t (a, b) VALUES (1, 2), (3, 4), (:a, :b)")
+    assert rows.template == "insert into t (a, b) values (?+)"
+
+
+def test_tables():
+    """Test referenced tables, skipping aliases, subqueries and CTE names."""
+    assert analyze_sql(
+        "WITH recent AS (SELECT * FROM orders) SELECT * FROM recent r, users AS u "
+        "JOIN `Shop`.items i ON i.id = r.item_id WHERE u.id = 1"
+    ).tables == ("orders", "shop.items", "users")
+    assert analyze_sql(
+        "INSERT INTO t (a) VALUES (1) ON DUPLICATE KEY UPDATE a = 2"
+    ).tables == ("t",)
+
+
+def test_analysis_is_memoized():
+    """Test repeated SQL text is served from the LRU."""
+    analyze_sql.cache_clear()
+    analyze_sql("SELECT 42")
+    analyze_sql("SELECT 42")
+    info = analyze_sql.cache_info()
+    assert (info.hits, info.misses) == (1, 1)
+
+
+def test_statement_scope_rules():
+    """Test each statement type requires its scope."""
+    read_key = ApiKey(key_id="r", key_hash="r", client_id="c", scopes='["read"]')
+    admin_key = ApiKey(
+        key_id="a", key_hash="a", client_id="c", scopes='["read", "admin"]'
+    )
+    check_statement_scope(analyze_sql("SELECT 1"), read_key)
+    check_statement_scope(analyze_sql("DROP TABLE t"), admin_key)
+    with pytest.raises(HTTPException) as e:
+        check_statement_scope(analyze_sql("DELETE FROM t"), read_key)
+    assert e.value.status_code == 403
+    with pytest.raises(HTTPException) as e:
+        check_statement_scope(analyze_sql("SELECT 1; SELECT 2"), admin_key)
+    assert e.value.status_code == 400
+    for sql in (")", "1)", "?)"):
+        with pytest.raises(HTTPException) as e:
+            check_statement_scope(analyze_sql(sql), admin_key)
+        assert e.value.status_code == 400
+
+
+@pytest.mark.parametrize(
+    "sql, scopes",
+    [
+        ("UPDATE api_keys SET scopes = '[\"admin\"]'", '["read", "write"]'),
+        ("INSERT INTO users (username) VALUES ('x')", '["read", "write"]'),
+        ("SELECT hashed_password FROM users", '["read"]'),
+        ("SELECT key_hash FROM app.API_KEYS", '["read"]'),
+        ("SELECT * FROM items i JOIN query_history h ON h.id = i.id", '["read"]'),
+    ],
+)
+def test_connector_tables_need_admin(sql, scopes):
+    """Test statements on the connector's own tables require the admin scope."""
+    key = ApiKey(key_id="k", key_hash="k", client_id="c", scopes=scopes)
+    with pytest.raises(HTTPException) as e:
+        check_statement_scope(analyze_sql(sql), key)
+    assert e.value.status_code == 403
+    assert "['admin']" in e.value.detail
+
+    admin_key = ApiKey(key_id="a", key_hash="a", client_id="c", scopes='["admin"]')
+    check_statement_scope(analyze_sql(sql), admin_key)
+
+
+def test_write_through_query_endpoint(sqlite_engine, sqlite_url, monkeypatch):
+    """Test a write-scoped key can write and the fingerprint is recorded."""
+    db = sqlite3.connect(sqlite_url.split(":///", 1)[1])
+    db.execute("CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT)")
+    db.commit()
+    db.close()
+
+    submitted = []
+
+    async def submit(record):
+        submitted.append(record)
+        return True
+
+    monkeypatch.setattr(query_history_writer, "submit", submit)
+    app.dependency_overrides[get_db_router] = lambda: DatabaseRouter(sqlite_engine)
+    app.dependency_overrides[get_api_key] = lambda: ApiKey(
+        key_id="w", key_hash="w", client_id="writer", scopes='["read", "write"]'
+    )
+    try:
+        client = TestClient(app)
+        response = client.post(
+            "/api/v1/query",
+            json={
+                "sql": "INSERT INTO items (id, name) VALUES (:id, :name)",
+                "params": {"id": 1, "name": "a"},
+            },
+        )
+        ddl = client.post("/api/v1/query", json={"sql": "DROP TABLE items"})
+    finally:
+        app.dependency_overrides.clear()
+
+    assert response.status_code == 200
+    assert response.json() == {"rows_affected": 1}
+    assert ddl.status_code == 403
+    assert (
+        submitted[0].fingerprint
+        == analyze_sql("insert into items (id, name) values (2, 'b')").fingerprint
+    )
+
+
+@pytest.mark.slow
+def test_analysis_cost_benchmark():
+    """Benchmark analysis cost per query with a cold and a warm LRU."""
+    queries = [
+        "SELECT o.id, o.total, c.name FROM orders o JOIN customers c "
+        "ON c.id = o.customer_id WHERE o.status IN ('paid', 'shipped') "
+        f"AND o.created_at > '2024-01-01' AND o.id > {i} ORDER BY o.id LIMIT 100"
+        for i in range(2000)
+    ]
+    analyze_sql.cache_clear()
+    start = time.perf_counter()
+    for sql in queries:
+        analyze_sql(sql)
+    cold = (time.perf_counter() - start) / len(queries) * 1e6
+
+    start = time.perf_counter()
+    for _ in range(10):
+        for sql in queries:
+            analyze_sql(sql)
+    warm = (time.perf_counter() - start) / (len(queries) * 10) * 1e6
+
+    print(f"\nsql analysis: cold={cold:.1f}us warm={warm:.2f}us per query")
+    assert warm * 10 < cold
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
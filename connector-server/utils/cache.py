@@ -0,0 +1,132 @@
+"""
+In-process caching utilities with cross-process invalidation.
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Generic, Hashable, Optional, Tuple, TypeVar
+
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+logger = logging.getLogger(__name__)
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class TTLCache(Generic[K, V]):
+    """Bounded LRU mapping whose entries expire after a fixed time-to-live.
+
+    Not thread-safe; meant to be used from a single event loop.
+    """
+
+    def __init__(
+        self, maxsize: int, ttl: float, timer: Callable[[], float] = time.monotonic
+    ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._timer = timer
+        self._data: OrderedDict[K, Tuple[float, V]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: K) -> Optional[V]:
+        """Get a live entry, refreshing its LRU position."""
+        item = self._data.get(key)
+        if item is None:
+            self.misses += 1
+            return None
+        expires, value = item
+        if expires <= self._timer():
+            del self._data[key]
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: K, value: V, ttl: Optional[float] = None) -> None:
+        """Store an entry, evicting the least recently used one when full."""
+        self._data[key] = (self._timer() + (self.ttl if ttl is None else ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: K) -> Optional[V]:
+        """Remove an entry if present."""
+        item = self._data.pop(key, None)
+        return item[1] if item else None
+
+    def clear(self) -> None:
+        """Remove all entries."""
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class InvalidationBus:
+    """Broadcast cache invalidations to every worker over Redis pub/sub.
+
+    Each process registers its caches by name and runs ``listen()`` as a
+    background task. Invalidating drops the local entry immediately and
+    publishes ``<name>:<key>`` so every other worker and replica drops it
+    too. If the subscription is lost, registered caches are cleared since
+    messages may have been missed; TTLs bound staleness in the meantime.
+    """
+
+    def __init__(
+        self,
+        redis_factory: Callable[[], Redis],
+        channel: str = "connector:cache-invalidate",
+        retry_seconds: float = 1.0,
+    ):
+        self._redis_factory = redis_factory
+        self.channel = channel
+        self.retry_seconds = retry_seconds
+        self._caches: Dict[str, TTLCache[Any, Any]] = {}
+
+    def register(self, name: str, cache: TTLCache[Any, Any]) -> None:
+        """Register a cache so remote invalidations reach it."""
+        self._caches[name] = cache
+
+    async def ainvalidate(self, name: str, key: str) -> None:
+        """Drop a key locally and publish the invalidation."""
+        self._drop(name, key)
+        try:
+            await self._redis_factory().publish(self.channel, f"{name}:{key}")
+        except (RedisError, OSError) as e:
+            logger.warning("Cache invalidation publish failed: %s", e)
+
+    async def listen(self) -> None:
+        """Apply invalidations published by other processes until cancelled."""
+        while True:
+            try:
+                pubsub = self._redis_factory().pubsub(ignore_subscribe_messages=True)
+                try:
+                    await pubsub.subscribe(self.channel)
+                    # Anything cached while unsubscribed may be stale
+                    self._clear_all()
+                    async for message in pubsub.listen():
+                        data = message["data"]
+                        if isinstance(data, bytes):
+                            data = data.decode()
+                        name, _, key = data.partition(":")
+                        self._drop(name, key)
+                finally:
+                    await pubsub.aclose()
+            except (RedisError, OSError) as e:
+                logger.warning("Cache invalidation listener disconnected: %s", e)
+                self._clear_all()
+                await asyncio.sleep(self.retry_seconds)
+
+    def _drop(self, name: str, key: str) -> None:
+        cache = self._caches.get(name)
+        if cache is not None:
+            cache.pop(key)
+
+    def _clear_all(self) -> None:
+        for cache in self._caches.values():
+            cache.clear()
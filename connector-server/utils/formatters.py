@@ -0,0 +1,46 @@
+"""
+Data formatting helpers for query results.
+"""
+import base64
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from typing import Any, Iterable, Sequence
+from uuid import UUID
+
+import orjson
+
+
+def json_default(value: Any) -> Any:
+    """Convert database values that the json module cannot encode natively."""
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, timedelta):
+        return value.total_seconds()
+    if isinstance(value, Decimal):
+        # Keep full precision; floats would silently round DECIMAL columns
+        return str(value)
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return base64.b64encode(bytes(value)).decode("ascii")
+    if isinstance(value, UUID):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def ndjson_rows(columns: Sequence[str], rows: Iterable[Sequence[Any]]) -> bytes:
+    """Encode rows as NDJSON, one object per row keyed by ``columns``.
+
+    orjson writes datetime, date, time and UUID values natively in the same
+    ISO 8601 form as ``json_default``; Decimal, bytes and timedelta still go
+    through ``json_default``. Rows are encoded straight from the driver
+    tuples, without building a model per row.
+    """
+    dumps = orjson.dumps
+    option = orjson.OPT_APPEND_NEWLINE
+    # orjson only accepts exact str keys, not subclasses such as quoted_name
+    columns = [str(name) for name in columns]
+    # orjson over-allocates each result, so append to one buffer instead of
+    # holding every line until a join
+    output = bytearray()
+    for row in rows:
+        output += dumps(dict(zip(columns, row)), default=json_default, option=option)
+    return bytes(output)
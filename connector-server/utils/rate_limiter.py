@@ -0,0 +1,149 @@
+"""
+Rate limiting utilities.
+
+The primary limiter is GCRA (generic cell rate algorithm) evaluated by a Lua
+script inside Redis, so every request costs exactly one atomic round trip and
+all workers and replicas share one budget per key. If Redis is unreachable the
+limiter degrades to a per-process token bucket until Redis recovers.
+"""
+import math
+import time
+from collections import OrderedDict
+from typing import Callable, NamedTuple, Optional
+
+from redis.asyncio import Redis
+from redis.commands.core import AsyncScript
+from redis.exceptions import RedisError
+
+# KEYS[1]: bucket key. ARGV[1]: limit, ARGV[2]: window in milliseconds.
+# Returns {allowed, remaining, retry_after_ms, reset_after_ms}.
+GCRA_SCRIPT = """
+local limit = tonumber(ARGV[1])
+local period = tonumber(ARGV[2])
+local emission = period / limit
+local clock = redis.call('TIME')
+local now = clock[1] * 1000 + math.floor(clock[2] / 1000)
+
+local tat = tonumber(redis.call('GET', KEYS[1]))
+if not tat or tat < now then
+    tat = now
+end
+
+local new_tat = tat + emission
+local diff = now - (new_tat - period)
+if diff < 0 then
+    return {0, 0, math.ceil(-diff), math.ceil(tat - now)}
+end
+
+redis.call('SET', KEYS[1], tostring(new_tat), 'PX', math.ceil(new_tat - now))
+return {1, math.floor(diff / emission), 0, math.ceil(new_tat - now)}
+"""
+
+
+class RateLimitResult(NamedTuple):
+    """Outcome of a rate limit check."""
+
+    allowed: bool
+    limit: int
+    remaining: int
+    retry_after: float
+    reset_after: float
+
+    def headers(self) -> dict[str, str]:
+        """Build the X-RateLimit-* response headers."""
+        headers = {
+            "X-RateLimit-Limit": str(self.limit),
+            "X-RateLimit-Remaining": str(self.remaining),
+            "X-RateLimit-Reset": str(math.ceil(self.reset_after)),
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(math.ceil(self.retry_after))
+        return headers
+
+
+class TokenBucket:
+    """In-process token bucket used while Redis is unavailable."""
+
+    def __init__(self, limit: int, window_seconds: float):
+        self.limit = limit
+        self.rate = limit / window_seconds
+        self.tokens = float(limit)
+        self.updated = time.monotonic()
+
+    def hit(self) -> RateLimitResult:
+        """Consume a token if one is available."""
+        now = time.monotonic()
+        self.tokens = min(self.limit, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+        allowed = self.tokens >= 1
+        if allowed:
+            self.tokens -= 1
+        return RateLimitResult(
+            allowed=allowed,
+            limit=self.limit,
+            remaining=int(self.tokens),
+            retry_after=0.0 if allowed else (1 - self.tokens) / self.rate,
+            reset_after=(self.limit - self.tokens) / self.rate,
+        )
+
+
+class RateLimiter:
+    """GCRA rate limiter backed by Redis with a local token bucket fallback."""
+
+    def __init__(
+        self,
+        redis_factory: Callable[[], Redis],
+        key_prefix: str = "ratelimit:",
+        redis_retry_seconds: float = 5.0,
+        max_local_buckets: int = 10000,
+    ):
+        self._redis_factory = redis_factory
+        self._key_prefix = key_prefix
+        self._redis_retry_seconds = redis_retry_seconds
+        self._redis_retry_at = 0.0
+        self._script: Optional[AsyncScript] = None
+        self._max_local_buckets = max_local_buckets
+        self._local: OrderedDict[str, TokenBucket] = OrderedDict()
+
+    async def hit(self, key: str, limit: int, window_seconds: int) -> RateLimitResult:
+        """Count one request against ``key`` and report whether it is allowed."""
+        if time.monotonic() >= self._redis_retry_at:
+            try:
+                return await self._hit_redis(key, limit, window_seconds)
+            except (RedisError, OSError):
+                # Skip Redis for a while instead of paying a timeout per request
+                self._redis_retry_at = time.monotonic() + self._redis_retry_seconds
+        return self._hit_local(key, limit, window_seconds)
+
+    async def _hit_redis(
+        self, key: str, limit: int, window_seconds: int
+    ) -> RateLimitResult:
+        redis = self._redis_factory()
+        if self._script is None:
+            self._script = redis.register_script(GCRA_SCRIPT)
+        # Run on the current client: the one registered with may since have
+        # been closed and replaced (close_redis, a new event loop in tests)
+        allowed, remaining, retry_after_ms, reset_after_ms = await self._script(
+            keys=[self._key_prefix + key],
+            args=[limit, window_seconds * 1000],
+            client=redis,
+        )
+        return RateLimitResult(
+            allowed=bool(allowed),
+            limit=limit,
+            remaining=int(remaining),
+            retry_after=retry_after_ms / 1000,
+            reset_after=reset_after_ms / 1000,
+        )
+
+    def _hit_local(self, key: str, limit: int, window_seconds: int) -> RateLimitResult:
+        bucket = self._local.get(key)
+        if bucket is None or bucket.limit != limit:
+            bucket = TokenBucket(limit, window_seconds)
+            self._local[key] = bucket
+            if len(self._local) > self._max_local_buckets:
+                self._local.popitem(last=False)
+        else:
+            self._local.move_to_end(key)
+        return bucket.hit()
@@ -0,0 +1,86 @@
+"""
+Mergeable latency sketch for percentile rollups.
+"""
+import math
+from typing import Dict, Iterable, Optional
+
+import msgpack
+
+
+class LatencySketch:
+    """Log-bucketed histogram with bounded relative error (DDSketch style).
+
+    A value ``v`` is counted in bin ``ceil(log(v) / log(gamma))`` with
+    ``gamma = (1 + a) / (1 - a)``, so every quantile read back is within
+    ``relative_accuracy`` (``a``) of a value that was added. Sketches with
+    the same accuracy merge by adding bin counts, which is what lets
+    per-bucket rollups answer percentiles over any time range. Values at or
+    below ``min_value`` are counted as zero.
+    """
+
+    min_value = 1e-6
+
+    def __init__(self, relative_accuracy: float = 0.01):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy must be between 0 and 1")
+        self.relative_accuracy = relative_accuracy
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self.bins: Dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+
+    def add(self, value: float, count: int = 1) -> None:
+        """Count ``value`` (in seconds) ``count`` times."""
+        if value <= self.min_value:
+            self.zero_count += count
+        else:
+            index = math.ceil(math.log(value) / self._log_gamma)
+            self.bins[index] = self.bins.get(index, 0) + count
+        self.count += count
+
+    def update(self, values: Iterable[float]) -> None:
+        for value in values:
+            self.add(value)
+
+    def merge(self, other: "LatencySketch") -> None:
+        """Add the counts of ``other``, which must use the same accuracy."""
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Cannot merge sketches with different accuracy")
+        bins = self.bins
+        get = bins.get
+        for index, count in other.bins.items():
+            bins[index] = get(index, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Approximate ``q``-quantile (0 <= q <= 1); None when empty."""
+        if not 0 <= q <= 1:
+            raise ValueError("q must be between 0 and 1")
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if seen > rank:
+            return 0.0
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if seen > rank:
+                # Midpoint of (gamma^(i-1), gamma^i] in relative terms
+                return 2 * self._gamma**index / (self._gamma + 1)
+        return 2 * self._gamma ** max(self.bins) / (self._gamma + 1)
+
+    def to_bytes(self) -> bytes:
+        return msgpack.packb(
+            {"a": self.relative_accuracy, "z": self.zero_count, "b": self.bins}
+        )
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "LatencySketch":
+        payload = msgpack.unpackb(data, strict_map_key=False)
+        sketch = cls(payload["a"])
+        sketch.bins = payload["b"]
+        sketch.zero_count = payload["z"]
+        sketch.count = sketch.zero_count + sum(sketch.bins.values())
+        return sketch
@@ -25,25 +25,52 @@ CREATE TABLE api_keys (
     expires_at TIMESTAMP NULL,
     is_active BOOLEAN DEFAULT TRUE,
     rate_limit INT DEFAULT 1000,
+    max_execution_ms INT NULL,
     last_used TIMESTAMP NULL,
     INDEX idx_key_hash (key_hash),
-    INDEX idx_client_id (client_id)
+    INDEX idx_client_id (client_id, id)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
--- Query history table
+-- Query history table, range-partitioned by day on executed_at (UTC).
+-- The connector splits daily partitions off p_future ahead of time and
+-- drops expired ones (CONNECTOR_HISTORY_RETENTION_DAYS). Partitioned InnoDB
+-- tables cannot have foreign keys and every unique key must contain
+-- executed_at, hence no user_id foreign key and the composite primary key.
 CREATE TABLE query_history (
-    id INT AUTO_INCREMENT PRIMARY KEY,
+    id INT AUTO_INCREMENT,
     user_id VARCHAR(50),
+    client_id VARCHAR(100),
     connection_id VARCHAR(100),
     query TEXT NOT NULL,
+    fingerprint VARCHAR(32),
     execution_time FLOAT,
     row_count INT DEFAULT 0,
     status ENUM('success', 'error') DEFAULT 'success',
     error_message TEXT,
-    executed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    INDEX idx_user_id (user_id),
-    INDEX idx_executed_at (executed_at),
-    FOREIGN KEY (user_id) REFERENCES users(username) ON DELETE SET NULL
+    executed_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, executed_at),
+    INDEX idx_user_id (user_id, executed_at, id),
+    INDEX idx_executed_at (executed_at, id),
+    INDEX idx_client_executed_at (client_id, executed_at, id),
+    INDEX idx_fingerprint (fingerprint)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+PARTITION BY RANGE COLUMNS (executed_at) (
+    PARTITION p_future VALUES LESS THAN (MAXVALUE)
+);
+
+-- Query performance rollups, maintained as query history is written
+CREATE TABLE query_rollups (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    bucket_start DATETIME NOT NULL,
+    dimension VARCHAR(16) NOT NULL,
+    `key` VARCHAR(100) NOT NULL DEFAULT '',
+    count INT NOT NULL DEFAULT 0,
+    error_count INT NOT NULL DEFAULT 0,
+    total_time DOUBLE NOT NULL DEFAULT 0,
+    max_time DOUBLE NOT NULL DEFAULT 0,
+    sketch BLOB NOT NULL,
+    UNIQUE KEY uq_query_rollup (bucket_start, dimension, `key`),
+    INDEX idx_query_rollup_key (dimension, `key`, bucket_start)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
 -- User permissions table
@@ -0,0 +1,15 @@
+-- ./database/scripts/api-key-execution-budget.sql
+-- Add the per-key query execution budget to an existing install, matching
+-- init/01-init-schema.sql:
+--
+--   docker exec -i mysql-db mysql -u root -p"$MYSQL_ROOT_PASSWORD" connector_db \
+--       < database/scripts/api-key-execution-budget.sql
+--
+-- NULL keeps CONNECTOR_QUERY_MAX_EXECUTION_MS; 0 means no budget. Adding a
+-- nullable column is an instant change.
+
+USE connector_db;
+
+ALTER TABLE api_keys
+    ADD COLUMN max_execution_ms INT NULL AFTER rate_limit,
+    ALGORITHM=INSTANT;
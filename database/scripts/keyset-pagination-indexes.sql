@@ -0,0 +1,23 @@
+-- ./database/scripts/keyset-pagination-indexes.sql
+-- Widen the listing indexes of an existing install to the composite keys
+-- that keyset (cursor) pagination seeks on, matching init/01-init-schema.sql:
+--
+--   docker exec -i mysql-db mysql -u root -p"$MYSQL_ROOT_PASSWORD" connector_db \
+--       < database/scripts/keyset-pagination-indexes.sql
+--
+-- InnoDB builds the new indexes in place; reads and writes continue.
+
+USE connector_db;
+
+ALTER TABLE api_keys
+    DROP INDEX idx_client_id,
+    ADD INDEX idx_client_id (client_id, id),
+    ALGORITHM=INPLACE, LOCK=NONE;
+
+ALTER TABLE query_history
+    DROP INDEX idx_user_id,
+    DROP INDEX idx_executed_at,
+    ADD INDEX idx_user_id (user_id, executed_at, id),
+    ADD INDEX idx_executed_at (executed_at, id),
+    ADD INDEX idx_client_executed_at (client_id, executed_at, id),
+    ALGORITHM=INPLACE, LOCK=NONE;
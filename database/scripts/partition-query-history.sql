@@ -0,0 +1,37 @@
+-- ./database/scripts/partition-query-history.sql
+-- Convert an existing, unpartitioned query_history table to the daily
+-- range-partitioned layout of init/01-init-schema.sql. This rebuilds the
+-- table, so run it in a maintenance window:
+--
+--   docker exec -i mysql-db mysql -u root -p"$MYSQL_ROOT_PASSWORD" connector_db \
+--       < database/scripts/partition-query-history.sql
+--
+-- Until it has run, the connector prunes history with chunked DELETEs
+-- (CONNECTOR_HISTORY_RETENTION_MODE=auto). Afterwards its next maintenance
+-- run splits daily partitions off p_future; the first of them also holds
+-- all older rows until it expires.
+
+USE connector_db;
+
+SET @fk = (
+    SELECT CONSTRAINT_NAME FROM information_schema.REFERENTIAL_CONSTRAINTS
+    WHERE CONSTRAINT_SCHEMA = DATABASE() AND TABLE_NAME = 'query_history'
+    LIMIT 1
+);
+SET @sql = IF(
+    @fk IS NULL, 'DO 0',
+    CONCAT('ALTER TABLE query_history DROP FOREIGN KEY ', @fk)
+);
+PREPARE stmt FROM @sql;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+
+ALTER TABLE query_history
+    MODIFY executed_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    DROP PRIMARY KEY,
+    ADD PRIMARY KEY (id, executed_at);
+
+ALTER TABLE query_history
+PARTITION BY RANGE COLUMNS (executed_at) (
+    PARTITION p_future VALUES LESS THAN (MAXVALUE)
+);